@@ -0,0 +1,105 @@
+'''
+Benchmarks system build, per-round stepping and ensemble scaling on synthetic networks of growing size.
+
+Results are written as JSON, so runs from two commits can be compared:
+    python -m benchmarks.bench --output new.json
+    python -m benchmarks.bench --output new.json --compare old.json
+'''
+
+import sys
+import json
+import time
+import subprocess
+from pathlib import Path
+from typing import List, Dict, Callable, Optional, Any
+
+import typer
+
+from lincoln import __version__
+from lincoln.model import system, ensemble
+
+app = typer.Typer()
+
+def river(n: int) -> Dict[str, Any]:
+    '''Configuration data for a chain of n storage nodes, each with its own inflow tributary, draining to one outlet (2n + 1 nodes).'''
+    nodes, edges = {}, []
+    for i in range(0, n):
+        nodes[f'inflow_{i}'] = {'tag': 'inflow', 'seasons': ['wet', 'dry'], 'generators': ['uniform', 'uniform'], 'parameters': [[2, 12], [0, 4]]}
+        nodes[f'dam_{i}'] = {'tag': 'storage', 'initial': 5, 'capacity': 15, 'policy': {'type': 'zones', 'storages': [0, 5, 10], 'releases': [0, 3, 6]}}
+        edges += [[f'inflow_{i}', f'dam_{i}'], [f'dam_{i}', f'dam_{i + 1}' if i < n - 1 else 'outlet']]
+    nodes['outlet'] = {'tag': 'outlet'}
+    return {'node': nodes, 'system': {'node_order': list(nodes.keys()), 'edges': edges}}
+
+def best(f: Callable[[], Any], repeat: int = 3, number: int = 1) -> float:
+    '''Best (least disturbed) average time of number calls, in seconds.'''
+    times = []
+    for _ in range(0, repeat):
+        start = time.perf_counter()
+        for _ in range(0, number):
+            f()
+        times.append((time.perf_counter() - start) / number)
+    return min(times)
+
+def bench_build(n: int) -> Dict[str, Any]:
+    data = river(n)
+    return {'benchmark': 'build', 'nodes': 2 * n + 1, 'seconds': best(lambda: system.factory(data))}
+
+def bench_step(n: int, rounds: int = 10) -> Dict[str, Any]:
+    '''One round through System.step, and (where the recursion limit allows) through the recursive outlet send() chain.'''
+    stepped, sent = system.factory(river(n)), system.factory(river(n))
+    stepped.seed(0)
+    sent.seed(0)
+    result = {'benchmark': 'step', 'nodes': 2 * n + 1, 'seconds': best(lambda: stepped.step('wet'), number=rounds)}
+    result['send_seconds'] = best(lambda: sent.nodes['outlet'].send('wet'), number=rounds) if 2 * n < sys.getrecursionlimit() // 2 else None
+    return result
+
+def bench_ensemble(n: int, runs: int, workers: int, rounds: int = 10) -> Dict[str, Any]:
+    data = river(n)
+    seasons = ensemble.cycle_seasons(data, rounds)
+    seconds = best(lambda: ensemble.run_ensemble(data, seasons, runs, 0, workers), repeat=1)
+    return {'benchmark': 'ensemble', 'nodes': 2 * n + 1, 'runs': runs, 'rounds': rounds, 'workers': workers, 'seconds': seconds}
+
+def run(sizes: List[int], runs: List[int], workers: List[int]) -> Dict[str, Any]:
+    results = [bench_build(n) for n in sizes] + [bench_step(n) for n in sizes]
+    results += [bench_ensemble(sizes[0], r, w) for r in runs for w in workers]
+    return {'version': __version__, 'commit': _commit(), 'python': sys.version.split()[0], 'results': results}
+
+def compare(new: Dict[str, Any], old: Dict[str, Any], tolerance: float) -> List[str]:
+    '''Returns a description of each benchmark that is slower than the old result by more than the tolerance (ex: 0.1 = 10%).'''
+    key = lambda r: tuple((k, v) for k, v in sorted(r.items()) if not k.endswith('seconds'))
+    baseline = {key(r): r for r in old['results']}
+    slower = []
+    for r in new['results']:
+        if key(r) in baseline and r['seconds'] > baseline[key(r)]['seconds'] * (1 + tolerance):
+            slower.append(f'{dict(key(r))}: {baseline[key(r)]["seconds"]:.6f}s -> {r["seconds"]:.6f}s')
+    return slower
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+@app.command()
+def main(sizes: List[int] = typer.Option([10, 100, 1000], '--size', help='Number of storage nodes in each synthetic network.'),
+         runs: List[int] = typer.Option([100, 1000], '--runs', help='Ensemble sizes.'),
+         workers: List[int] = typer.Option([1, 2], '--workers', help='Ensemble worker process counts.'),
+         output: Optional[str] = typer.Option(None, '--output', '-o', help='JSON results file, printed if not provided.'),
+         baseline: Optional[str] = typer.Option(None, '--compare', help='JSON results file of an earlier run to compare against.'),
+         tolerance: float = typer.Option(0.1, '--tolerance', help='Allowed slowdown before a comparison fails (0.1 = 10%).')) -> None:
+    '''Run the benchmarks.'''
+    results = run(sizes, runs, workers)
+    text = json.dumps(results, indent=4)
+    if output:
+        Path(output).write_text(text)
+    else:
+        typer.echo(text)
+    if baseline:
+        slower = compare(results, json.loads(Path(baseline).read_text()), tolerance)
+        for line in slower:
+            typer.echo(f'slower: {line}', err=True)
+        if slower:
+            raise typer.Exit(code=1)
+
+if __name__ == '__main__':
+    app()
@@ -12,11 +12,11 @@ __version__  = '0.1.0'
     FILE_ERROR,
     TOML_ERROR, 
     SYSTEM_ERROR,
-    # DB_READ_ERROR, 
-    # DB_WRITE_ERROR, 
-    # JSON_ERROR,
+    DB_READ_ERROR, 
+    DB_WRITE_ERROR, 
+    JSON_ERROR,
     NOT_IMPLEMENTED_ERROR
-) = range(6) # [0,7]
+) = range(9) # [0,8]
 
 # Error desciptions
 ERRORS = {
@@ -24,7 +24,8 @@ ERRORS = {
     FILE_ERROR: 'configuration file error',
     TOML_ERROR: 'TOML decode error',
     SYSTEM_ERROR: 'system object configuration error',
-    # DB_READ_ERROR: 'database read error',
-    # DB_WRITE_ERROR: 'database write error',
+    DB_READ_ERROR: 'database read error',
+    DB_WRITE_ERROR: 'database write error',
+    JSON_ERROR: 'JSON decode error',
     NOT_IMPLEMENTED_ERROR: 'not implemented error'
 }
\ No newline at end of file
@@ -0,0 +1,61 @@
+'''
+Caches the validated, compiled system (and the configuration file [game] data, the scoreboard settings) in the
+game directory, keyed by a hash of the configuration file.
+'''
+
+import pickle
+import hashlib
+from pathlib import Path
+from typing import Optional, Tuple, Dict, Any
+
+from lincoln import __version__
+from lincoln.controller import config
+from lincoln.model import system
+from lincoln.model.system import System
+from lincoln.utilities import atomic_write
+
+CACHE_FILE = '.system.cache'
+
+def content_hash(config_file: Path) -> str:
+    '''Hash of the configuration file contents (and the lincoln version, which determines how the file is compiled).'''
+    return hashlib.sha256(__version__.encode() + config_file.read_bytes()).hexdigest()
+
+def load_system(directory: Path, config_file: Path) -> System:
+    '''Returns the (cached) system, see: load_game.'''
+    return load_game(directory, config_file)[0]
+
+def load_game(directory: Path, config_file: Path) -> Tuple[System, Optional[Dict[str, Any]]]:
+    '''
+    Returns the cached system and [game] data (None if the file has none) if the configuration file is unchanged
+    since they were cached. Otherwise the file is parsed, validated and compiled and the result is cached.
+    '''
+    key = content_hash(config_file)
+    cached = read_cache(directory, key)
+    if cached is not None:
+        # fresh inflow streams, so every game from the cache does not replay the same inflows.
+        cached[0].seed(None)
+        return cached
+    data = config.load_configuration_data(config_file)
+    compiled = system.factory(data)
+    write_cache(directory, key, compiled, data.get('game'))
+    return compiled, data.get('game')
+
+def read_cache(directory: Path, key: str) -> Optional[Tuple[System, Optional[Dict[str, Any]]]]:
+    '''Returns the cached system and [game] data, None if there is no cache, it was built from different data or can not be read.'''
+    try:
+        with directory.joinpath(CACHE_FILE).open('rb') as f:
+            entry = pickle.load(f)
+        # entries written by an older layout are stale too.
+        if not isinstance(entry, tuple) or len(entry) != 3 or entry[0] != key:
+            return None
+        return entry[1], entry[2]
+    # a missing, stale or corrupt cache is rebuilt (other errors are bugs, and are raised).
+    except (pickle.UnpicklingError, EOFError, OSError, ImportError):
+        return None
+
+def write_cache(directory: Path, key: str, compiled: System, game: Optional[Dict[str, Any]] = None) -> None:
+    try:
+        atomic_write(directory.joinpath(CACHE_FILE), pickle.dumps((key, compiled, game), protocol=pickle.HIGHEST_PROTOCOL))
+    except (OSError, pickle.PicklingError, AttributeError, TypeError):
+        # the cache is an optimization, systems that can not be cached (e.g. lambda release policies) are rebuilt each time.
+        pass
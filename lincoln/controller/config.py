@@ -3,7 +3,6 @@ Provides config file functionality, using a toml configuration file.
 '''
 
 import shutil
-import tomli
 from pathlib import Path
 from typing import Optional, Dict, Any
 
@@ -16,19 +15,27 @@ DEFAULT_SYSTEM_FILE = str(Path('lincoln/examples/lincoln.toml'))
 class ConfigurationError(Exception):
     pass
 
-def init_app(directory: Path, configfile: Optional[Path] = None) -> int:
+def init_app(directory: Path, configfile: Optional[Path] = None) -> Dict[str, Any]:
     '''Initialize application'''
-    return configure_new_app(directory, configfile) if configfile is not None else configure_existing_app(directory)
+    return load_configuration_data(init_config_file(directory, configfile))
+
+def init_config_file(directory: Path, configfile: Optional[Path] = None) -> Path:
+    '''Initialize application directory, returns the game configuration file (without reading it).'''
+    return configure_new_config_file(directory, configfile) if configfile is not None else configure_existing_config_file(directory)
 
 def configure_new_app(directory: Path, config_file: Path) -> Dict[str, Any]:
-    configure_directory(directory, True)
-    file = move_config_file(directory, config_file)
-    return load_configuration_data(file)
+    return load_configuration_data(configure_new_config_file(directory, config_file))
 
 def configure_existing_app(directory: Path) -> Dict[str, Any]:
+    return load_configuration_data(configure_existing_config_file(directory))
+
+def configure_new_config_file(directory: Path, config_file: Path) -> Path:
+    configure_directory(directory, True)
+    return move_config_file(directory, config_file)
+
+def configure_existing_config_file(directory: Path) -> Path:
     configure_directory(directory, False)
-    file = find_config_file(directory)
-    return load_configuration_data(file)
+    return find_config_file(directory)
 
 @exception_handler(ConfigurationError, 1)
 def configure_directory(directory: Path, new: bool = True) -> None:
@@ -58,6 +65,7 @@ def find_config_file(directory: Path) -> Path:
 
 @exception_handler(ConfigurationError, 3) 
 def load_configuration_data(config_file: Path) -> Dict[str, Any]:
+    import tomli
     try:           
         with config_file.open('rb') as f:
             data = tomli.load(f)
@@ -1,20 +1,174 @@
 '''
 Manages the simulation of the system for the length of a game.
+
+Games are scored with running aggregates of each node's storage, spill, release and outflow (totals, counts of
+rounds with a non-zero value, minimums, maximums and last values), updated once per round as vectors over the nodes.
+Scoring rules, objectives (win criteria) and anti-objectives (lose criteria) are evaluated from these aggregates,
+so scoring a round costs the same in the first and the thousandth round (the round history is never rescanned).
+
+ex (configuration file):
+    [game]
+    mode = 'rounds'    # 'rounds': play the number of rounds, then win if the objectives are met.
+                       # 'objective': win as soon as the objectives are met (lose if the rounds run out).
+                       # 'survival': play until an anti-objective is met (rounds = 0 for no limit).
+    rounds = 20
+    rules = [{node = 'outlet', variable = 'outflow', comparison = '>=', value = 5, points = 1}]
+    objectives = [{node = 'outlet', variable = 'outflow', aggregate = 'total', comparison = '>=', value = 100}]
+    anti_objectives = [{node = 'lincoln_dam', variable = 'storage', aggregate = 'min', comparison = '<', value = 1}]
 '''
-from dataclasses import dataclass
-from typing import List
+import operator
+import numpy as np
+
+from dataclasses import dataclass, field
+from typing import List, Dict, Any
 
 from lincoln.model.system import System
+from lincoln.utilities import exception_handler
+
+VARIABLES = ['storage', 'spill', 'release', 'outflow']
+AGGREGATES = ['total', 'mean', 'count', 'min', 'max', 'last']
+COMPARISONS = {'<': operator.lt, '<=': operator.le, '=': operator.eq, '>=': operator.ge, '>': operator.gt}
+MODES = ['rounds', 'objective', 'survival']
+
+class ScoringError(Exception):
+    pass
+
+@dataclass
+class Aggregates:
+    '''Running aggregates of each variable, arrays indexed by node (system store index).'''
+    rounds: int = 0
+    total: Dict[str, np.ndarray] = field(default_factory=lambda: {})
+    count: Dict[str, np.ndarray] = field(default_factory=lambda: {})
+    '''Rounds with a non-zero value (ex: spill count).'''
+    min: Dict[str, np.ndarray] = field(default_factory=lambda: {})
+    max: Dict[str, np.ndarray] = field(default_factory=lambda: {})
+    last: Dict[str, np.ndarray] = field(default_factory=lambda: {})
+
+    def update(self, values: Dict[str, np.ndarray]) -> None:
+        '''Adds a round, O(nodes) and independent of the number of rounds played.'''
+        if self.rounds == 0:
+            for k, v in values.items():
+                self.total[k], self.count[k], self.min[k], self.max[k] = np.zeros_like(v), np.zeros(len(v), dtype=np.int64), v.copy(), v.copy()
+        for k, v in values.items():
+            self.total[k] += v
+            self.count[k] += v != 0
+            np.minimum(self.min[k], v, out=self.min[k])
+            np.maximum(self.max[k], v, out=self.max[k])
+            self.last[k] = v.copy()
+        self.rounds += 1
+
+    def serialize(self) -> Dict[str, Any]:
+        '''JSON data (arrays as lists).'''
+        return {'rounds': self.rounds, **{a: {k: v.tolist() for k, v in getattr(self, a).items()} for a in ['total', 'count', 'min', 'max', 'last']}}
+    @staticmethod
+    def deserialize(data: Dict[str, Any]) -> 'Aggregates':
+        arrays = {a: {k: np.asarray(v, dtype=np.int64 if a == 'count' else float) for k, v in data[a].items()} for a in ['total', 'count', 'min', 'max', 'last']}
+        return Aggregates(data['rounds'], **arrays)
+
+    def get(self, aggregate: str, variable: str, i: int) -> float:
+        if self.rounds == 0:
+            return 0.0
+        if aggregate == 'mean':
+            return self.total[variable][i].item() / self.rounds
+        return getattr(self, aggregate)[variable][i].item()
 
 @dataclass
-class Game:
-    system: System
-    # configurations
-    seasons: List[str]
-    
-# nodes: scoring (<, =, > etc rules with points), objectives (win criteria) / anti-objectives (e.g. dont loose criteria)
-# objectives -> cummulative or by round
-# modes -> number of rounds, first to objective, last to loose
-
-# game state variable: while playing = True, where playing is updated by examining objectives / anti-objectives
-# node ; objective /anti-objective object with state variable has_met_requirement
+class Rule:
+    '''Awards points for each round the node variable meets the comparison (ex: outlet outflow >= 5).'''
+    node: str
+    variable: str
+    comparison: str
+    value: float
+    points: float = 1
+    hits: int = 0
+    '''Number of rounds the rule was met.'''
+
+@dataclass
+class Criterion:
+    '''Met when an aggregate of a node variable meets the comparison (ex: total outlet outflow >= 100).'''
+    node: str
+    variable: str
+    aggregate: str
+    comparison: str
+    value: float
+
+    def met(self, aggregates: Aggregates, i: int) -> bool:
+        return aggregates.rounds > 0 and COMPARISONS[self.comparison](aggregates.get(self.aggregate, self.variable, i), self.value)
+
+@dataclass
+class Scoreboard:
+    mode: str = 'rounds'
+    rounds: int = 0
+    '''Number of rounds in the game, 0 for no limit.'''
+    rules: List[Rule] = field(default_factory=lambda: [])
+    objectives: List[Criterion] = field(default_factory=lambda: [])
+    anti_objectives: List[Criterion] = field(default_factory=lambda: [])
+    aggregates: Aggregates = field(default_factory=Aggregates)
+    score: float = 0
+    status: str = 'playing'
+    '''playing, won, lost or finished (the rounds are over, there are no objectives).'''
+
+    @staticmethod
+    @exception_handler(ScoringError, 14)
+    def deserialize(data: Dict[str, Any]) -> 'Scoreboard':
+        '''Builds the scoreboard from the configuration file "game" data.'''
+        try:
+            board = Scoreboard(data.get('mode', 'rounds'), data.get('rounds', 0),
+                               [Rule(**r) for r in data.get('rules', [])],
+                               [Criterion(**c) for c in data.get('objectives', [])],
+                               [Criterion(**c) for c in data.get('anti_objectives', [])])
+        except TypeError as e:
+            raise ScoringError(f'The game scoring data is not valid: {e}.')
+        board.validate()
+        return board
+
+    def validate(self) -> None:
+        if self.mode not in MODES:
+            raise ScoringError(f'The game mode: {self.mode} must be one of: {MODES}.')
+        for item in self.rules + self.objectives + self.anti_objectives:
+            if item.variable not in VARIABLES or item.comparison not in COMPARISONS:
+                raise ScoringError(f'The game scoring variable: {item.variable} must be one of: {VARIABLES}, and comparison: {item.comparison} one of: {list(COMPARISONS)}.')
+            if isinstance(item, Criterion) and item.aggregate not in AGGREGATES:
+                raise ScoringError(f'The game objective aggregate: {item.aggregate} must be one of: {AGGREGATES}.')
+
+    @exception_handler(ScoringError, 14)
+    def update(self, system: System, outflows: Dict[str, float]) -> str:
+        '''Scores the round just completed by system.step (which returned the outlet outflows), returns the game status.'''
+        if self.status != 'playing':
+            return self.status
+        store, m = system.store, system.store.size
+        # the flow each node sent downstream in the round (the outlet outflows are among them).
+        last = system.cache.last
+        outflow = np.array([last.get(name, 0) for name in system.plan.names], dtype=float)
+        self.aggregates.update({'storage': store.storage[:m], 'spill': store.spill[:m], 'release': store.release[:m], 'outflow': outflow})
+        ids = self._ids(system)
+        for rule in self.rules:
+            if COMPARISONS[rule.comparison](self.aggregates.last[rule.variable][ids(rule.node)].item(), rule.value):
+                rule.hits += 1
+                self.score += rule.points
+        lost = any(c.met(self.aggregates, ids(c.node)) for c in self.anti_objectives)
+        won = bool(self.objectives) and all(c.met(self.aggregates, ids(c.node)) for c in self.objectives)
+        over = self.rounds > 0 and self.aggregates.rounds >= self.rounds
+        if lost:
+            self.status = 'lost'
+        elif won and self.mode == 'objective':
+            self.status = 'won'
+        elif over:
+            self.status = ('won' if won else 'lost') if self.objectives and self.mode != 'survival' else 'finished'
+        return self.status
+
+    def progress(self) -> Dict[str, Any]:
+        '''The game progress (score, status, rule hits and aggregates) as JSON data, the rules come from the configuration file.'''
+        return {'score': self.score, 'status': self.status, 'hits': [rule.hits for rule in self.rules], 'aggregates': self.aggregates.serialize()}
+    def restore(self, progress: Dict[str, Any]) -> None:
+        '''Continues from saved progress (see: Scoreboard.progress).'''
+        self.score, self.status, self.aggregates = progress['score'], progress['status'], Aggregates.deserialize(progress['aggregates'])
+        for rule, hits in zip(self.rules, progress['hits']):
+            rule.hits = hits
+
+    def _ids(self, system: System):
+        def ids(name: str) -> int:
+            if name not in system.plan.ids:
+                raise ScoringError(f'The game scoring data refers to a {name} node, which is not in the system.')
+            return system.plan.ids[name]
+        return ids
@@ -1,29 +1,133 @@
 '''Manipulates model.'''
+import json
 import tomli
 from pathlib import Path
-from dataclasses import dataclass
-from typing import List, Tuple, Dict, Any
+from dataclasses import dataclass, field
+from typing import List, Tuple, Dict, Any, Callable, Awaitable, Optional
 
-from lincoln.utilities import exception_handler
-from lincoln import SUCCESS, FILE_ERROR, TOML_ERROR
+from lincoln.utilities import exception_handler, atomic_write
+from lincoln import SUCCESS, FILE_ERROR, TOML_ERROR, DB_WRITE_ERROR
 from lincoln.model.system import System
 from lincoln.model import system, node
+from lincoln.model.snapshot import Snapshot
+from lincoln.model.policies import PromptPolicy, FixedRelease
+from lincoln.controller.game import Scoreboard
+from lincoln.data.database import LogWriter
 #import ..model.system
 
 # load game -> load_config.
 # play game -> play_round.
 # tear down.
 
+SNAPSHOT_FILE = 'game.snapshot'
+SCORE_FILE = 'game.score.json'
+LOG_FILE = 'game.jsonl'
+
+Decide = Callable[[str, float, float, str], Awaitable[float]]
+'''Async player decision: decide(node name, available water, spill, season) -> release.'''
+
 @dataclass
 class Game:
-    directory: Path
+    directory: Optional[Path]
+    '''Game directory, the game is saved here after each round (not saved if None).'''
     configfile: Path
-    dbfile: Path
+    dbfile: Optional[Path]
+    '''Round log (see: database.LogWriter), one record is appended for each round played (not logged if None).'''
     system: system.System
+    scoreboard: Optional[Scoreboard] = None
+    '''Scores each round, if the game has scoring rules or objectives.'''
+    logged: int = SUCCESS
+    '''Return code of the last round log write (see: lincoln.ERRORS), the game goes on if a round can not be logged.'''
+    _log: Optional[LogWriter] = field(default=None, repr=False)
     
-    def play(self):
-        # maybe calls play round.
-        pass
+    async def play(self, decide: Decide, rounds: int = 1) -> List[Dict[str, int]]:
+        '''
+        Plays rounds, awaiting a player decision for each storage node with an interactive (prompt) release policy,
+        so a server can play many games at once. Returns the outlet flows of each round.
+        '''
+        results = []
+        for _ in range(0, rounds):
+            season = self.season
+            for name in self.players:
+                dam = self.system.nodes[name]
+                available, spill = dam.available(sum(self.system.request(k, season) for k in dam.senders))
+                release = await decide(name, available, spill, season)
+                # the decision is routed (and cached) now, so the step below does not prompt for it.
+                dam.policy = FixedRelease(release)
+                try:
+                    self.system.request(name, season)
+                finally:
+                    dam.policy = PromptPolicy()
+            results.append(self.system.step(season))
+            self.score(results[-1])
+            self.save()
+            self.logged = self.log(season, results[-1])
+        return results
+
+    @property
+    def seasons(self) -> List[str]:
+        '''Seasons named by the inflow nodes, in the order they are played.'''
+        return list(dict.fromkeys(season for v in self.system.nodes.values() if v.tag == node.Tag.inflow for season in v._data['seasons']))
+    @property
+    def season(self) -> str:
+        '''Season of the current round.'''
+        seasons = self.seasons
+        return seasons[self.system.round % len(seasons)]
+    @property
+    def players(self) -> List[str]:
+        '''Storage nodes with interactive release decisions, in evaluation order.'''
+        names = [self.system.plan.names[i] for i in self.system.plan.order]
+        return [k for k in names if self.system.nodes[k].tag == node.Tag.storage and isinstance(self.system.nodes[k].policy, PromptPolicy)]
+
+    def play_round(self) -> Dict[str, int]:
+        '''Plays the current round and saves the game, returns the outlet flows.'''
+        season = self.season
+        outflows = self.system.step(season)
+        self.score(outflows)
+        self.save()
+        self.logged = self.log(season, outflows)
+        return outflows
+
+    def score(self, outflows: Dict[str, int]) -> None:
+        if self.scoreboard is not None:
+            self.scoreboard.update(self.system, outflows)
+
+    def log(self, season: str, outflows: Dict[str, int]) -> int:
+        '''Appends the round just played to the round log, returns SUCCESS or DB_WRITE_ERROR.'''
+        if self.dbfile is None:
+            return SUCCESS
+        if self._log is None:
+            try:
+                # flushed every record, so the log keeps up with the saved game.
+                self._log = LogWriter(self.dbfile, flush_every=1)
+            except OSError:
+                return DB_WRITE_ERROR
+        record = {'round': self.system.round - 1, 'season': season, 'outflow': outflows,
+                  'storage': {k: v.storage for k, v in self.system.nodes.items() if v.tag == node.Tag.storage}}
+        if self.scoreboard is not None:
+            record.update(score=self.scoreboard.score, status=self.scoreboard.status)
+        return self._log.write(record)
+    def close(self) -> None:
+        if self._log is not None:
+            self._log.close()
+
+    def save(self) -> None:
+        '''Writes a snapshot of the game state to the game directory.'''
+        if self.directory is None:
+            return
+        # a game is never resumed from a partially written snapshot.
+        atomic_write(self.directory.joinpath(SNAPSHOT_FILE), self.system.snapshot().to_bytes())
+        if self.scoreboard is not None:
+            atomic_write(self.directory.joinpath(SCORE_FILE), json.dumps(self.scoreboard.progress()).encode())
+    def resume(self) -> bool:
+        '''Restores the game state saved in the game directory, returns False if there is no saved game.'''
+        path = self.directory.joinpath(SNAPSHOT_FILE)
+        if not path.exists():
+            return False
+        self.system.restore(Snapshot.from_bytes(path.read_bytes()))
+        if self.scoreboard is not None and self.directory.joinpath(SCORE_FILE).exists():
+            self.scoreboard.restore(json.loads(self.directory.joinpath(SCORE_FILE).read_text()))
+        return True
 
 # def load(directory: Path) -> int:
 #     configs = [f for f in directory.glob('*.toml')]
@@ -0,0 +1,160 @@
+'''
+Asyncio game server, hosting many game sessions in one process.
+
+Every session plays a fork of one compiled system (see: System.fork), so a new session costs a copy of the node
+state, not a rebuild. Clients talk to the server over a TCP connection, one JSON object per line:
+
+    client: {"op": "new"}                          -> server: {"session": "1", "round": 0, "storage": {...}}
+    client: {"op": "join", "session": "1"}         -> server: {"session": "1", "round": 3, "storage": {...}}
+    client: {"op": "play", "rounds": 2}
+        server: {"decide": "lincoln_dam", "available": 12.0, "spill": 0, "season": "", "round": 3}
+        client: {"op": "release", "amount": 4}
+        server: {"round": 3, "outflow": {...}, "storage": {...}}   (once per round, with "score" and "status" if scored)
+    client: {"op": "quit"}
+
+Sessions outlive their connections, a player can join a session again from a new connection. Player decisions
+are awaited without blocking the other sessions.
+'''
+
+import json
+import math
+import typer
+import asyncio
+import itertools
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Any
+
+from lincoln.model.node import Tag
+from lincoln.model.system import System
+from lincoln.controller.game import Scoreboard
+from lincoln.controller.model_control import Game, LOG_FILE
+
+class ProtocolError(Exception):
+    pass
+
+@dataclass
+class Server:
+    system: System
+    '''Compiled system, each session plays a fork of it.'''
+    configfile: Path
+    directory: Optional[Path] = None
+    '''Sessions are saved in sub directories of this directory after each round (not saved if None).'''
+    scoring: Optional[Dict[str, Any]] = None
+    '''Configuration file "game" scoring data, each session is scored if it is provided.'''
+    games: Dict[str, Game] = field(default_factory=lambda: {})
+    locks: Dict[str, asyncio.Lock] = field(default_factory=lambda: {}, repr=False)
+    '''One player at a time, if several connections join a session.'''
+    _ids: Any = field(default_factory=lambda: itertools.count(1), repr=False)
+
+    def new_game(self) -> str:
+        '''Starts a session with fresh inflow streams, returns its id.'''
+        session = str(next(self._ids))
+        forked = self.system.fork()
+        forked.seed(None)
+        directory = self.directory.joinpath(f'session-{session}') if self.directory is not None else None
+        if directory is not None:
+            directory.mkdir(parents=True, exist_ok=True)
+        scoreboard = Scoreboard.deserialize(self.scoring) if self.scoring is not None else None
+        self.games[session], self.locks[session] = Game(directory, self.configfile, directory.joinpath(LOG_FILE) if directory is not None else None, forked, scoreboard), asyncio.Lock()
+        return session
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> asyncio.AbstractServer:
+        '''Starts listening (port 0 picks a free port), serve with: await server.serve_forever().'''
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''Serves one connection, playing the session it creates or joins.'''
+        session: Optional[str] = None
+        try:
+            while True:
+                try:
+                    message = await receive(reader)
+                    if message is None or message.get('op') == 'quit':
+                        break
+                    session = await self.dispatch(session, message, reader, writer)
+                except ProtocolError as e:
+                    await send(writer, {'error': str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        # the game failed (ex: a scoring rule for a node that is not in the system), the player is told before the connection is closed.
+        except typer.Exit as e:
+            cause = e.__context__ if e.__context__ is not None else e
+            await _report(writer, f'{type(cause).__name__}: {cause}')
+        except Exception as e:
+            await _report(writer, f'{type(e).__name__}: {e}')
+        finally:
+            writer.close()
+
+    async def dispatch(self, session: Optional[str], message: Dict[str, Any], reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[str]:
+        '''Handles a message, returns the session played by the connection.'''
+        match message.get('op'):
+            case 'new':
+                session = self.new_game()
+            case 'join':
+                if message.get('session') not in self.games:
+                    raise ProtocolError(f'There is no session: {message.get("session")}.')
+                session = message['session']
+            case 'play':
+                if session is None:
+                    raise ProtocolError('Start ("new") or "join" a session before playing.')
+                if not isinstance(message.get('rounds', 1), int):
+                    raise ProtocolError('The number of rounds to play must be an integer.')
+                game = self.games[session]
+                async with self.locks[session]:
+                    for _ in range(0, message.get('rounds', 1)):
+                        t = game.system.round
+                        outflows = (await game.play(decider(game, reader, writer)))[0]
+                        await send(writer, {'round': t, 'outflow': outflows, 'storage': storages(game), **scores(game)})
+                return session
+            case op:
+                raise ProtocolError(f'Unknown op: {op}, use one of: new, join, play, quit.')
+        await send(writer, {'session': session, 'round': self.games[session].system.round, 'storage': storages(self.games[session])})
+        return session
+
+def decider(game: Game, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    '''Asks the connected player for each release decision.'''
+    async def decide(name: str, available: float, spill: float, season: str) -> float:
+        while True:
+            await send(writer, {'decide': name, 'available': available, 'spill': spill, 'season': season, 'round': game.system.round})
+            try:
+                message = await receive(reader)
+            except ProtocolError:
+                message = {}
+            if message is None:
+                raise ConnectionError('The player disconnected before deciding.')
+            amount = message.get('amount')
+            # json accepts NaN and Infinity, and bools are ints.
+            if message.get('op') == 'release' and isinstance(amount, (int, float)) and not isinstance(amount, bool) and math.isfinite(amount):
+                return amount
+            await send(writer, {'error': 'Send a release decision: {"op": "release", "amount": <number>}.'})
+    return decide
+
+def scores(game: Game) -> Dict[str, Any]:
+    return {'score': game.scoreboard.score, 'status': game.scoreboard.status} if game.scoreboard is not None else {}
+
+def storages(game: Game) -> Dict[str, float]:
+    return {k: v.storage for k, v in game.system.nodes.items() if v.tag == Tag.storage}
+
+async def receive(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    '''Next message, None if the connection is closed.'''
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        message = json.loads(line)
+    except json.JSONDecodeError:
+        raise ProtocolError('Messages must be one JSON object per line.')
+    if not isinstance(message, dict):
+        raise ProtocolError('Messages must be one JSON object per line.')
+    return message
+
+async def _report(writer: asyncio.StreamWriter, error: str) -> None:
+    try:
+        await send(writer, {'error': error})
+    except ConnectionError:
+        pass
+
+async def send(writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+    writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+    await writer.drain()
@@ -0,0 +1,301 @@
+'''
+Sharded ensembles: a coordinator splits an ensemble's runs into shards (contiguous blocks of run indices), workers
+(on this or other machines) summarize the shards (see: analytics.Summary), and the coordinator merges the results.
+
+Inflow streams are keyed by run index, and shard summaries are merged in shard order, so the merged result for a
+seed is the same however the shards were assigned, retried or timed (and equals analytics.summarize with a block
+size of the shard size). Shards are handed out over one of two transports:
+
+TCP (the coordinator listens, one JSON object per line as in the game server):
+    worker: {"op": "ready"}
+        coordinator: {"op": "shard", "shard": 0, "first_run": 0, "runs": 100, "job": {...}}   (or {"op": "done"})
+        worker: {"op": "result", "shard": 0, "summary": {...}}  (or {"op": "failed", "shard": 0, "error": "..."})
+    A shard whose worker fails, disconnects or sends no result within the timeout (it is disconnected) is handed
+    out again.
+
+Shared filesystem queue (a directory every machine can reach):
+    job.json          the job, written by the coordinator.
+    queue/<i>.json    shards waiting for a worker, claimed by an (atomic) rename into: claimed/<i>.json
+    done/<i>.json     shard summaries, written atomically by the workers.
+    failed/<i>.json   shards that failed more than the allowed retries.
+    A failed shard is returned to the queue by its worker, a claim older than the timeout (its worker died) is
+    returned to the queue by the coordinator.
+
+Pickles are never exchanged, results are JSON (see: Summary.serialize).
+'''
+
+import os
+import json
+import time
+import socket
+import asyncio
+import hashlib
+
+from pathlib import Path
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Deque, Any, Optional, Tuple
+
+from lincoln.model import analytics, system
+from lincoln.model.analytics import Summary
+from lincoln.model.ensemble import BatchSystem
+from lincoln.controller.server import receive, send
+from lincoln.utilities import exception_handler, atomic_write
+
+class ShardError(Exception):
+    pass
+
+@dataclass
+class Shard:
+    index: int
+    first_run: int
+    runs: int
+    attempts: int = 0
+    '''Number of failed attempts.'''
+
+@dataclass
+class Coordinator:
+    job: Dict[str, Any]
+    '''Configuration data, seasons, seed, demand and release (see: job), shared by every shard.'''
+    shards: List[Shard]
+    retries: int = 2
+    '''Failed attempts allowed for each shard, before the ensemble fails.'''
+    results: Dict[int, Summary] = field(default_factory=lambda: {})
+    queue: Deque[Shard] = field(default_factory=deque, repr=False)
+    error: Optional[str] = None
+
+    def __post_init__(self):
+        if not self.queue and not self.results:
+            self.queue.extend(self.shards)
+
+    @staticmethod
+    def split(job: Dict[str, Any], runs: int, size: int, retries: int = 2) -> 'Coordinator':
+        '''Splits the runs into shards of (at most) size runs.'''
+        if size < 1:
+            raise ShardError(f'The shard size: {size} must be at least 1 run.')
+        return Coordinator(job, [Shard(i, start, min(size, runs - start)) for i, start in enumerate(range(0, runs, size))], retries)
+
+    @property
+    def finished(self) -> bool:
+        return self.error is not None or len(self.results) == len(self.shards)
+
+    def claim(self) -> Optional[Shard]:
+        '''Next waiting shard, None if every shard is finished or in progress.'''
+        return self.queue.popleft() if self.queue and self.error is None else None
+
+    def complete(self, index: int, summary: Summary) -> None:
+        # a shard can be completed twice (ex: by a worker that was presumed dead), the results are identical.
+        self.results[index] = summary
+
+    def fail(self, shard: Shard, reason: str) -> None:
+        '''Returns a shard to the queue, or fails the ensemble if it has no retries left.'''
+        if shard.index in self.results:
+            return
+        shard.attempts += 1
+        if shard.attempts > self.retries:
+            self.error = f'Shard {shard.index} (runs {shard.first_run} to {shard.first_run + shard.runs - 1}) failed {shard.attempts} times, last: {reason}'
+        else:
+            self.queue.appendleft(shard)
+
+    @exception_handler(ShardError, 16)
+    def merged(self) -> Summary:
+        '''The shard summaries, merged in shard order.'''
+        if self.error is not None:
+            raise ShardError(self.error)
+        if len(self.results) != len(self.shards):
+            raise ShardError(f'Only {len(self.results)} of the {len(self.shards)} shards are finished.')
+        return analytics.merge(self.results[i] for i in range(0, len(self.shards)))
+
+def job(data: Dict[str, Any], seasons: List[str], seed: int, demand: Optional[Dict[str, float]] = None, release: Optional[float] = None) -> Dict[str, Any]:
+    return dict(data=data, seasons=seasons, seed=seed, demand=demand, release=release)
+
+_COMPILED: Dict[str, BatchSystem] = {}
+'''Systems compiled by this worker process, by a hash of the configuration data.'''
+
+def summarize(job: Dict[str, Any], first_run: int, runs: int) -> Summary:
+    '''Summarizes a shard, the system is compiled once per job (per worker process).'''
+    key = hashlib.sha256(json.dumps(job['data'], sort_keys=True, default=str).encode()).hexdigest()
+    if key not in _COMPILED:
+        _COMPILED[key] = BatchSystem.compile(system.factory(job['data']))
+    return analytics.summarize_block(_COMPILED[key], job['seasons'], runs, job['seed'], job['demand'], job['release'], first_run)
+
+# TCP transport
+
+async def coordinate(coordinator: Coordinator, host: str = '127.0.0.1', port: int = 0, listening=None, timeout: float = 600) -> Summary:
+    '''
+    Serves shards to workers until every shard is finished (or one fails), returns the merged summary.
+    listening is called with the (host, port) address once the coordinator is accepting workers, a worker that
+    does not return its shard's result within timeout seconds is presumed lost (as in: collect).
+    '''
+    changed, connections = asyncio.Condition(), set()
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        shard: Optional[Shard] = None
+        connections.add(asyncio.current_task())
+        try:
+            while await receive(reader) is not None:
+                async with changed:
+                    while (shard := coordinator.claim()) is None and not coordinator.finished:
+                        await changed.wait()
+                if shard is None:
+                    await send(writer, {'op': 'done'})
+                    break
+                await send(writer, {'op': 'shard', 'shard': shard.index, 'first_run': shard.first_run, 'runs': shard.runs, 'job': coordinator.job})
+                try:
+                    message = await asyncio.wait_for(receive(reader), timeout)
+                except TimeoutError:
+                    async with changed:
+                        coordinator.fail(shard, f'no result within the {timeout:g} second timeout')
+                        shard = None
+                        changed.notify_all()
+                    break
+                async with changed:
+                    if message is not None and message.get('op') == 'result' and message.get('shard') == shard.index:
+                        coordinator.complete(shard.index, Summary.deserialize(message['summary']))
+                    else:
+                        coordinator.fail(shard, message.get('error', 'no result') if message else 'the worker disconnected')
+                    shard = None
+                    changed.notify_all()
+        except Exception as e:
+            if shard is not None:
+                async with changed:
+                    coordinator.fail(shard, f'the worker connection failed: {e}')
+                    changed.notify_all()
+        # the ensemble finished, a worker that did not say it is ready in time is disconnected.
+        except asyncio.CancelledError:
+            pass
+        finally:
+            connections.discard(asyncio.current_task())
+            writer.close()
+    # shard summaries are a few kilobytes per node, larger than the default line limit.
+    server = await asyncio.start_server(handle, host, port, limit=2 ** 26)
+    async with server:
+        if listening is not None:
+            listening(server.sockets[0].getsockname()[:2])
+        async with changed:
+            await changed.wait_for(lambda: coordinator.finished)
+        # the connected workers are told the ensemble is done, so they stop cleanly.
+        if connections:
+            _, late = await asyncio.wait(list(connections), timeout=5)
+            for task in late:
+                task.cancel()
+            await asyncio.gather(*late)
+    return coordinator.merged()
+
+def work(host: str, port: int, attempts: int = 50, wait: float = 0.1) -> int:
+    '''Summarizes shards for a TCP coordinator until it is done, returns the number of shards summarized.'''
+    for _ in range(0, attempts):
+        try:
+            connection = socket.create_connection((host, port))
+            break
+        # the coordinator may not be listening yet.
+        except ConnectionRefusedError:
+            time.sleep(wait)
+    else:
+        raise ShardError(f'Could not connect to a coordinator at: {host}:{port}.')
+    count = 0
+    with connection, connection.makefile('rwb') as stream:
+        def message(m: Dict[str, Any]) -> None:
+            stream.write(json.dumps(m, separators=(',', ':')).encode() + b'\n')
+            stream.flush()
+        while True:
+            try:
+                message({'op': 'ready'})
+                line = stream.readline()
+            # the coordinator finished (or stopped) without telling this worker.
+            except ConnectionError:
+                return count
+            reply = json.loads(line) if line else {'op': 'done'}
+            if reply.get('op') != 'shard':
+                return count
+            try:
+                summary = summarize(reply['job'], reply['first_run'], reply['runs'])
+            except Exception as e:
+                message({'op': 'failed', 'shard': reply['shard'], 'error': f'{type(e).__name__}: {e}'})
+                continue
+            try:
+                message({'op': 'result', 'shard': reply['shard'], 'summary': summary.serialize()})
+            # the coordinator timed out waiting for this worker, its shard was handed out again.
+            except ConnectionError:
+                return count
+            count += 1
+
+# shared filesystem transport
+
+QUEUE, CLAIMED, DONE, FAILED = 'queue', 'claimed', 'done', 'failed'
+
+def enqueue(coordinator: Coordinator, directory: Path) -> None:
+    '''Writes the job and its shards to a (new or empty) queue directory.'''
+    for name in [QUEUE, CLAIMED, DONE, FAILED]:
+        directory.joinpath(name).mkdir(parents=True, exist_ok=True)
+    _write(directory.joinpath('job.json'), {**coordinator.job, 'shards': len(coordinator.shards), 'retries': coordinator.retries})
+    for shard in coordinator.shards:
+        _write(directory.joinpath(QUEUE, f'{shard.index}.json'), asdict(shard))
+
+def collect(coordinator: Coordinator, directory: Path, timeout: float = 600, poll: float = 0.1) -> Summary:
+    '''Waits for the queued shards, returning stale claims (older than timeout seconds) to the queue, returns the merged summary.'''
+    while not coordinator.finished:
+        for path in directory.joinpath(DONE).glob('*.json'):
+            index = int(path.stem)
+            if index not in coordinator.results:
+                coordinator.complete(index, Summary.deserialize(json.loads(path.read_text())))
+        for path in directory.joinpath(FAILED).glob('*.json'):
+            coordinator.error = json.loads(path.read_text())['error']
+        for path in directory.joinpath(CLAIMED).glob('*.json'):
+            try:
+                stale = time.time() - path.stat().st_mtime > timeout
+                if stale and int(path.stem) not in coordinator.results:
+                    _requeue(directory, path, Shard(**json.loads(path.read_text())), f'the worker did not finish within {timeout} seconds', coordinator.retries)
+            # finished (or requeued) since it was listed.
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+        if not coordinator.finished:
+            time.sleep(poll)
+    return coordinator.merged()
+
+def work_queue(directory: Path, poll: float = 0.1) -> int:
+    '''Summarizes shards from a queue directory until every shard is done (or failed), returns the number summarized.'''
+    job = json.loads(directory.joinpath('job.json').read_text())
+    count = 0
+    while True:
+        claimed = _claim(directory)
+        if claimed is None:
+            finished = len(list(directory.joinpath(DONE).glob('*.json'))) >= job['shards']
+            if finished or any(directory.joinpath(FAILED).glob('*.json')):
+                return count
+            # shards in progress elsewhere may still be returned to the queue.
+            time.sleep(poll)
+            continue
+        path, shard = claimed
+        try:
+            summary = summarize(job, shard.first_run, shard.runs)
+        except Exception as e:
+            _requeue(directory, path, shard, f'{type(e).__name__}: {e}', job['retries'])
+            continue
+        _write(directory.joinpath(DONE, f'{shard.index}.json'), summary.serialize())
+        path.unlink(missing_ok=True)
+        count += 1
+
+def _claim(directory: Path) -> Optional[Tuple[Path, Shard]]:
+    for path in sorted(directory.joinpath(QUEUE).glob('*.json'), key=lambda p: int(p.stem)):
+        claim = directory.joinpath(CLAIMED, path.name)
+        try:
+            # rename is atomic, only one worker claims each shard.
+            os.rename(path, claim)
+        except FileNotFoundError:
+            continue
+        os.utime(claim)
+        return claim, Shard(**json.loads(claim.read_text()))
+    return None
+
+def _requeue(directory: Path, claim: Path, shard: Shard, reason: str, retries: int) -> None:
+    shard.attempts += 1
+    if shard.attempts > retries:
+        _write(directory.joinpath(FAILED, claim.name), {**asdict(shard), 'error': f'Shard {shard.index} failed {shard.attempts} times, last: {reason}'})
+        claim.unlink(missing_ok=True)
+    else:
+        # the claim is moved (not copied) back, so it is never claimed while its old claim is still being removed.
+        _write(claim, asdict(shard))
+        os.replace(claim, directory.joinpath(QUEUE, claim.name))
+
+def _write(path: Path, data: Dict[str, Any]) -> None:
+    atomic_write(path, json.dumps(data).encode())
@@ -1,7 +1,8 @@
 import json
 import configparser
+import numpy as np
 from pathlib import Path
-from typing import List, Dict, NamedTuple, Any
+from typing import List, Dict, NamedTuple, Iterator, Optional, Any
 
 from lincoln import DB_WRITE_ERROR, DB_READ_ERROR, JSON_ERROR, SUCCESS
 
@@ -45,13 +46,106 @@ class DBHandler:
             return DB([], DB_READ_ERROR)
     
     def write_db(self, entries: List[Dict[str, Any]]) -> DB:
+        '''Rewrites the whole database, use a LogWriter to record rounds as they are played.'''
         try:
             with self._db_path.open('w') as db:
                 # indent just for readability
-                # need to check how this appends.
                 json.dump(entries, db, indent=4)
-            return DB
-        except:
-            pass
-    
-    
\ No newline at end of file
+            return DB(entries, SUCCESS)
+        except (OSError, TypeError):
+            return DB(entries, DB_WRITE_ERROR)
+
+class LogWriter:
+    '''
+    Append only log, one compact JSON record per line (JSONL).
+
+    Each write costs O(1) regardless of the length of the log. Records are buffered and flushed every
+    flush_every records (and on close). Opening a log that ends with a partially written record (e.g.
+    after a crash) drops the partial record, so writes resume after the last complete record.
+
+    ex:
+        with LogWriter(path) as log:
+            log.write({'round': 0, 'storage': 3})
+    '''
+    def __init__(self, log_path: Path, flush_every: int = 64) -> None:
+        self._log_path = log_path
+        self._flush_every = flush_every
+        self._pending = 0
+        _truncate_partial_record(log_path)
+        self._log = log_path.open('a', encoding='utf-8')
+
+    def __enter__(self) -> 'LogWriter':
+        return self
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, record: Dict[str, Any]) -> int:
+        try:
+            self._log.write(json.dumps(record, separators=(',', ':'), default=_to_json) + '\n')
+            self._pending += 1
+            if self._pending >= self._flush_every:
+                self.flush()
+            return SUCCESS
+        except (OSError, TypeError):
+            return DB_WRITE_ERROR
+    def flush(self) -> None:
+        self._log.flush()
+        self._pending = 0
+    def close(self) -> None:
+        if not self._log.closed:
+            self.flush()
+            self._log.close()
+
+def read_log(log_path: Path, start: int = 0) -> Iterator[Dict[str, Any]]:
+    '''Lazily iterates over the log records (from the start-th record), stops at a partially written record.'''
+    with log_path.open('r', encoding='utf-8') as log:
+        for i, line in enumerate(log):
+            if not line.endswith('\n'):
+                return
+            if i < start:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                return
+
+def last_record(log_path: Path, chunk: int = 4096) -> Optional[Dict[str, Any]]:
+    '''Returns the last complete log record (None if there is none), reading back from the end of the file.'''
+    if not log_path.exists():
+        return None
+    with log_path.open('rb') as log:
+        end = log.seek(0, 2)
+        position, tail = end, b''
+        while position > 0 and tail.count(b'\n') < 2:
+            position = max(0, position - chunk)
+            log.seek(position)
+            tail = log.read(end - position)
+    lines = tail[:tail.rfind(b'\n')].split(b'\n') if b'\n' in tail else []
+    try:
+        return json.loads(lines[-1]) if lines and lines[-1] else None
+    except json.JSONDecodeError:
+        return None
+
+def _truncate_partial_record(log_path: Path) -> None:
+    if not log_path.exists():
+        return
+    with log_path.open('rb+') as log:
+        end = log.seek(0, 2)
+        position = end
+        while position > 0:
+            start = max(0, position - 4096)
+            log.seek(start)
+            i = log.read(position - start).rfind(b'\n')
+            if i >= 0:
+                log.truncate(start + i + 1)
+                return
+            position = start
+        log.truncate(0)
+
+def _to_json(value: Any) -> Any:
+    '''Converts numpy values to JSON types.'''
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable.')
@@ -0,0 +1,67 @@
+'''
+Columnar on-disk store for simulation traces.
+
+Each variable (storage, release, ...) is a (runs, rounds, nodes) .npy file that is memory mapped, plus a small
+metadata.json header. Simulations write blocks of runs directly into the files, and readers slice by run, round
+or node without loading the rest of the file, so traces can be much larger than memory.
+'''
+
+import json
+import numpy as np
+
+from pathlib import Path
+from dataclasses import dataclass
+from typing import List, Dict, Iterator, Tuple, Union, Optional, Any
+
+METADATA_FILE = 'metadata.json'
+VARIABLES = ['inflow', 'spill', 'release', 'outflow', 'storage']
+
+@dataclass
+class TraceStore:
+    directory: Path
+    names: List[str]
+    '''Node names, in the order they appear in the last axis of each array.'''
+    runs: int
+    rounds: int
+    variables: Dict[str, np.memmap]
+
+    @staticmethod
+    def create(directory: Path, names: List[str], runs: int, rounds: int, variables: List[str] = VARIABLES, dtype: str = 'float64') -> 'TraceStore':
+        '''Creates (or overwrites) a store of zeros, sized for runs x rounds x len(names).'''
+        directory.mkdir(parents=True, exist_ok=True)
+        metadata = {'names': list(names), 'runs': runs, 'rounds': rounds, 'variables': list(variables), 'dtype': dtype}
+        directory.joinpath(METADATA_FILE).write_text(json.dumps(metadata, indent=4))
+        arrays = {v: np.lib.format.open_memmap(directory.joinpath(f'{v}.npy'), mode='w+', dtype=dtype, shape=(runs, rounds, len(names))) for v in variables}
+        return TraceStore(directory, list(names), runs, rounds, arrays)
+
+    @staticmethod
+    def open(directory: Path, mode: str = 'r') -> 'TraceStore':
+        '''Opens an existing store, use mode: 'r+' to write into it.'''
+        metadata = json.loads(directory.joinpath(METADATA_FILE).read_text())
+        arrays = {v: np.load(directory.joinpath(f'{v}.npy'), mmap_mode=mode) for v in metadata['variables']}
+        return TraceStore(directory, metadata['names'], metadata['runs'], metadata['rounds'], arrays)
+
+    def write(self, traces: Any, first_run: int = 0) -> None:
+        '''Writes a block of runs (any object with a (runs, rounds, nodes) array attribute for each variable, ex: ensemble.Traces).'''
+        for v, array in self.variables.items():
+            block = getattr(traces, v)
+            array[first_run:first_run + block.shape[0]] = block
+    def flush(self) -> None:
+        for array in self.variables.values():
+            array.flush()
+
+    def read(self, variable: str, runs: Union[slice, List[int]] = slice(None), rounds: Union[slice, List[int]] = slice(None), nodes: Optional[List[str]] = None) -> np.ndarray:
+        '''Reads a (runs, rounds, nodes) slice into memory, only the requested data is read from disk.'''
+        # one axis at a time: two lists would otherwise be indexed in pairs, not as their cross product.
+        array = self.variables[variable][runs][:, rounds]
+        if nodes is not None:
+            array = array[..., [self.names.index(name) for name in nodes]]
+        return np.array(array)
+    def node(self, name: str) -> Dict[str, np.ndarray]:
+        '''Returns (runs, rounds) memory mapped views of each variable for a single node, nothing is read until the views are used.'''
+        i = self.names.index(name)
+        return {v: array[:, :, i] for v, array in self.variables.items()}
+    def blocks(self, variable: str, size: int = 1024) -> Iterator[Tuple[int, np.ndarray]]:
+        '''Iterates over (first run, block) pairs of up to size runs, to process a variable in bounded memory.'''
+        for start in range(0, self.runs, size):
+            yield start, np.array(self.variables[variable][start:start + size])
@@ -0,0 +1,219 @@
+'''
+Streaming water resources metrics for ensemble simulations.
+
+A Summary is updated one round at a time from the (runs, nodes) state arrays emitted by BatchSystem.stream, so
+summarizing an ensemble uses memory proportional to the number of nodes (and the runs in a block), not the
+number of rounds or runs. Summaries of separate blocks of runs (or workers) are merged into one.
+
+For each node, delivery is the release of storage nodes, the diversion of outflow nodes and the outflow of the other nodes. With a demand for
+the node (a delivery target each round), a round fails if the delivery is below the demand, and:
+    reliability:   fraction of rounds that do not fail.
+    resilience:    fraction of failed rounds followed by a round that does not fail (in the same run).
+    vulnerability: mean shortfall (demand - delivery) of the failed rounds.
+Spill frequency is the fraction of rounds with spill, storage moments are exact (Chan et al. parallel variance)
+and storage quantiles come from a mergeable log bucket sketch (DDSketch), accurate to a relative error.
+'''
+
+import os
+import numpy as np
+
+from collections import deque
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import List, Dict, Deque, Iterable, Sequence, Any, Optional, Union
+
+from lincoln.model import system
+from lincoln.model.node import Tag
+from lincoln.model.ensemble import BatchSystem
+
+@dataclass
+class Moments:
+    '''Count, mean and sum of squared deviations (M2) for each node, merged with Chan's parallel algorithm.'''
+    count: int
+    mean: np.ndarray
+    m2: np.ndarray
+
+    @staticmethod
+    def empty(nodes: int) -> 'Moments':
+        return Moments(0, np.zeros(nodes), np.zeros(nodes))
+
+    def update(self, values: np.ndarray) -> None:
+        '''Adds a (samples, nodes) array of values.'''
+        self.merge(Moments(len(values), values.mean(axis=0), ((values - values.mean(axis=0)) ** 2).sum(axis=0)))
+    def merge(self, other: 'Moments') -> None:
+        n = self.count + other.count
+        if n == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / n
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / n
+        self.count = n
+
+    @property
+    def variance(self) -> np.ndarray:
+        return self.m2 / self.count if self.count else np.full_like(self.mean, np.nan)
+
+@dataclass
+class QuantileSketch:
+    '''
+    Log bucket (DDSketch) quantile sketch for each node: values are counted in buckets (gamma^(k - 1), gamma^k],
+    so quantiles are within the relative accuracy. Values at or below the smallest bucket are counted as zero.
+    Memory is fixed by the accuracy and value range, and sketches merge by adding their counts.
+    '''
+    accuracy: float
+    smallest: float
+    zeros: np.ndarray
+    counts: np.ndarray
+    '''(nodes, buckets) counts.'''
+
+    @staticmethod
+    def empty(nodes: int, accuracy: float = 0.01, smallest: float = 1e-3, largest: float = 1e9) -> 'QuantileSketch':
+        gamma = (1 + accuracy) / (1 - accuracy)
+        buckets = int(np.ceil(np.log(largest / smallest) / np.log(gamma))) + 1
+        return QuantileSketch(accuracy, smallest, np.zeros(nodes, dtype=np.int64), np.zeros((nodes, buckets), dtype=np.int64))
+
+    @property
+    def gamma(self) -> float:
+        return (1 + self.accuracy) / (1 - self.accuracy)
+
+    def update(self, values: np.ndarray) -> None:
+        '''Adds a (samples, nodes) array of (non-negative) values.'''
+        nodes, buckets = self.counts.shape
+        small = values <= self.smallest
+        self.zeros += small.sum(axis=0)
+        k = np.ceil(np.log(np.maximum(values, self.smallest) / self.smallest) / np.log(self.gamma)).astype(np.int64)
+        k = np.clip(k, 0, buckets - 1) + np.arange(0, nodes) * buckets
+        self.counts += np.bincount(k[~small], minlength=nodes * buckets).reshape(nodes, buckets)
+    def merge(self, other: 'QuantileSketch') -> None:
+        self.zeros += other.zeros
+        self.counts += other.counts
+
+    def quantile(self, q: float) -> np.ndarray:
+        '''Approximate q quantile (0 <= q <= 1) of each node's values.'''
+        totals = self.zeros + self.counts.sum(axis=1)
+        ranks = q * np.maximum(totals - 1, 0)
+        cumulative = self.zeros[:, None] + np.cumsum(self.counts, axis=1)
+        k = (cumulative <= ranks[:, None]).sum(axis=1)
+        # bucket k holds (smallest * gamma^(k - 1), smallest * gamma^k], estimated by its (relative) midpoint.
+        estimate = self.smallest * 2 * self.gamma ** k / (self.gamma + 1)
+        return np.where(ranks < self.zeros, 0.0, estimate)
+
+@dataclass
+class Summary:
+    '''Streaming metrics for each node of a system (see module docstring).'''
+    names: List[str]
+    demand: np.ndarray
+    '''Delivery target of each node, NaN for nodes without a demand.'''
+    storage: Moments
+    quantiles: QuantileSketch
+    rounds: int = 0
+    '''Node rounds summarized (runs x rounds).'''
+    spills: Optional[np.ndarray] = None
+    failures: Optional[np.ndarray] = None
+    recoveries: Optional[np.ndarray] = None
+    shortfall: Optional[np.ndarray] = None
+    _failed: Optional[np.ndarray] = field(default=None, repr=False)
+    '''Failures in the last round of each run in the current block.'''
+
+    @staticmethod
+    def empty(names: List[str], demand: Optional[Dict[str, float]] = None, accuracy: float = 0.01) -> 'Summary':
+        demand = demand if demand else {}
+        m = len(names)
+        return Summary(list(names), np.array([demand.get(name, np.nan) for name in names], dtype=float), Moments.empty(m),
+                       QuantileSketch.empty(m, accuracy), 0, np.zeros(m, dtype=np.int64), np.zeros(m, dtype=np.int64),
+                       np.zeros(m, dtype=np.int64), np.zeros(m))
+
+    def update(self, t: int, state: Dict[str, np.ndarray], delivery: np.ndarray) -> None:
+        '''Adds a round of (runs, nodes) state arrays, t = 0 starts a new block of runs.'''
+        failed = delivery < self.demand # False where there is no demand (NaN).
+        if t == 0:
+            self._failed = np.zeros_like(failed)
+        self.rounds += len(delivery)
+        self.spills += (state['spill'] > 0).sum(axis=0)
+        self.failures += failed.sum(axis=0)
+        self.recoveries += (self._failed & ~failed).sum(axis=0)
+        self.shortfall += np.where(failed, self.demand - delivery, 0).sum(axis=0)
+        self.storage.update(state['storage'])
+        self.quantiles.update(state['storage'])
+        self._failed = failed
+    def merge(self, other: 'Summary') -> None:
+        self.rounds += other.rounds
+        self.spills += other.spills
+        self.failures += other.failures
+        self.recoveries += other.recoveries
+        self.shortfall += other.shortfall
+        self.storage.merge(other.storage)
+        self.quantiles.merge(other.quantiles)
+
+    def serialize(self) -> Dict[str, Any]:
+        '''JSON compatible data (ex: to send the summary of a shard of runs to a coordinator), floats are exact.'''
+        return dict(names=self.names, demand=self.demand.tolist(), rounds=self.rounds,
+                    storage=dict(count=self.storage.count, mean=self.storage.mean.tolist(), m2=self.storage.m2.tolist()),
+                    quantiles=dict(accuracy=self.quantiles.accuracy, smallest=self.quantiles.smallest, zeros=self.quantiles.zeros.tolist(), counts=self.quantiles.counts.tolist()),
+                    **{k: getattr(self, k).tolist() for k in ['spills', 'failures', 'recoveries', 'shortfall']})
+    @staticmethod
+    def deserialize(data: Dict[str, Any]) -> 'Summary':
+        storage, quantiles = data['storage'], data['quantiles']
+        return Summary(data['names'], np.array(data['demand'], dtype=float),
+                       Moments(storage['count'], np.array(storage['mean'], dtype=float), np.array(storage['m2'], dtype=float)),
+                       QuantileSketch(quantiles['accuracy'], quantiles['smallest'], np.array(quantiles['zeros'], dtype=np.int64), np.array(quantiles['counts'], dtype=np.int64)),
+                       data['rounds'], *[np.array(data[k], dtype=np.int64) for k in ['spills', 'failures', 'recoveries']], np.array(data['shortfall'], dtype=float))
+
+    def table(self, quantiles: Sequence[float] = (0.05, 0.5, 0.95)) -> List[Dict[str, Any]]:
+        '''One row of metrics per node.'''
+        rows = []
+        sketched = {q: self.quantiles.quantile(q) for q in quantiles}
+        for i, name in enumerate(self.names):
+            failures, rounds = self.failures[i].item(), max(self.rounds, 1)
+            demanded = not np.isnan(self.demand[i])
+            rows.append(dict(node=name,
+                             reliability=1 - failures / rounds if demanded else None,
+                             resilience=self.recoveries[i].item() / failures if demanded and failures else None,
+                             vulnerability=self.shortfall[i].item() / failures if demanded and failures else None,
+                             spill_frequency=self.spills[i].item() / rounds,
+                             storage_mean=self.storage.mean[i].item(),
+                             storage_std=np.sqrt(self.storage.variance[i]).item(),
+                             **{f'storage_p{round(100 * q)}': sketched[q][i].item() for q in quantiles}))
+        return rows
+
+def summarize_block(batch: BatchSystem, seasons: List[str], runs: int, seed: int, demand: Optional[Dict[str, float]] = None,
+                    release: Optional[Union[float, Dict[str, float]]] = None, first_run: int = 0) -> Summary:
+    '''Summarizes a block of runs as they are simulated.'''
+    summary = Summary.empty(batch.names, demand)
+    released = np.array([tag in (Tag.storage, Tag.outflow) for tag in batch.tags])
+    for t, state in batch.stream(seasons, runs, seed, release, first_run):
+        summary.update(t, state, np.where(released, state['release'], state['outflow']))
+    return summary
+
+def summarize(data: Dict[str, Any], seasons: List[str], runs: int, seed: int, demand: Optional[Dict[str, float]] = None, workers: Optional[int] = None,
+              release: Optional[Union[float, Dict[str, float]]] = None, block: int = 1000) -> Summary:
+    '''
+    Simulates and summarizes an ensemble in blocks of runs, across a pool of processes (as in ensemble.run_ensemble).
+    Memory is bounded by the block size, the summary is the same for any number of workers.
+    '''
+    blocks = [(data, seasons, min(block, runs - start), seed, demand, release, start) for start in range(0, runs, block)]
+    if workers == 1:
+        return merge(_summarize_block(*b) for b in blocks)
+    workers = workers if workers else os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # a bounded number of blocks in flight, merged in run order as they finish, so memory does not grow with runs.
+        pending: Deque[Future] = deque()
+        def results():
+            for b in blocks:
+                pending.append(pool.submit(_summarize_block, *b))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        return merge(results())
+
+def merge(summaries: Iterable[Summary]) -> Summary:
+    '''Merges the summaries (of consecutive blocks of runs) in order, into the first one.'''
+    summaries = iter(summaries)
+    merged = next(summaries)
+    for summary in summaries:
+        merged.merge(summary)
+    return merged
+
+def _summarize_block(data: Dict[str, Any], seasons: List[str], runs: int, seed: int, demand, release, first_run: int) -> Summary:
+    return summarize_block(BatchSystem.compile(system.factory(data)), seasons, runs, seed, demand, release, first_run)
@@ -0,0 +1,207 @@
+'''
+Batch (Monte Carlo) simulation of a system, steps many runs at once using numpy arrays.
+'''
+
+import os
+import numpy as np
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Dict, Tuple, Iterator, Any, Union, Optional
+
+from lincoln.data.traces import TraceStore, VARIABLES
+from lincoln.model import generators, system
+from lincoln.model.node import Tag
+from lincoln.model.policies import Policy, FixedRelease
+from lincoln.model.system import System
+
+@dataclass
+class Traces:
+    '''Simulated node states. Each array has shape: (runs, rounds, nodes), with nodes in system network order.'''
+    names: List[str]
+    '''Node names, in the order they appear in the last axis of each array.'''
+    inflow: np.ndarray
+    '''Flow into each node (generated flow for inflow nodes).'''
+    spill: np.ndarray
+    '''Flow that exceeds storage capacity, sent downstream without a release decision.'''
+    release: np.ndarray
+    '''Flow released by a decision (diverted out of the system by outflow nodes).'''
+    outflow: np.ndarray
+    '''Total flow sent downstream.'''
+    storage: np.ndarray
+    '''Storage at the end of each round.'''
+
+    def node(self, name: str) -> Dict[str, np.ndarray]:
+        '''Returns the (runs, rounds) arrays for a single node.'''
+        i = self.names.index(name)
+        return {k: getattr(self, k)[:, :, i] for k in VARIABLES}
+
+    @staticmethod
+    def concatenate(blocks: List['Traces']) -> 'Traces':
+        '''Joins blocks of runs, in the order provided.'''
+        return Traces(blocks[0].names, *[np.concatenate([getattr(b, k) for b in blocks], axis=0) for k in VARIABLES])
+
+@dataclass
+class BatchSystem:
+    '''Array backed copy of a system.'''
+    system: System
+    names: List[str]
+    tags: List[Tag]
+    order: List[int]
+    '''Node indices in topological (upstream to downstream) order.'''
+    senders: List[np.ndarray]
+    '''Indices of the nodes that send flow to each node.'''
+    capacity: np.ndarray
+    '''Storage capacity of storage nodes, diversion capacity of outflow nodes.'''
+    initial: np.ndarray
+    factor: np.ndarray
+    '''Flow scaling factor of transfer nodes.'''
+    policies: Dict[int, Policy]
+    '''Release policy of each storage node, by node index.'''
+    inflows: Dict[int, Dict[str, List[Any]]]
+    '''Seasons, generators and generator parameters of each inflow node, by node index.'''
+
+    @staticmethod
+    def compile(system: System) -> 'BatchSystem':
+        '''Converts a system (built by the system.factory) into arrays.'''
+        names, plan = system.plan.names, system.plan
+        m = len(names)
+        senders = [np.array(plan.senders[i], dtype=np.intp) for i in range(0, m)]
+        # node state is already held in arrays (index = plan id) by the system's node store.
+        store = system.store
+        capacity, initial, factor, policies = store.capacity[:m].copy(), store.initial[:m].copy(), store.factor[:m].copy(), dict(store.policies)
+        tags = [system.nodes[name].tag for name in names]
+        inflows = {i: {k: list(store.data[i][k]) for k in ['seasons', 'generators', 'parameters']} for i in range(0, m) if tags[i] == Tag.inflow}
+        return BatchSystem(system, list(names), tags, plan.order, senders, capacity, initial, factor, policies, inflows)
+
+    def sample(self, seasons: List[str], runs: int, seed: int, first_run: int = 0) -> np.ndarray:
+        '''
+        Draws inflows for each run and round, returns a (runs, rounds, nodes) array (zero for non-inflow nodes).
+
+        Draws come from the same (run, node, season) streams used by System.seed, so run r here is identical to
+        a scalar System seeded with: system.seed(seed, run=first_run + r).
+        '''
+        draws = np.zeros((runs, len(seasons), len(self.names)))
+        for i, data in self.inflows.items():
+            for j, season in enumerate(data['seasons']):
+                rounds = [t for t in range(0, len(seasons)) if seasons[t] == season]
+                if not rounds:
+                    continue
+                for r in range(0, runs):
+                    rng = generators.stream(seed, first_run + r, i, j)
+                    # a new generator for each run, so generators with state start each run fresh.
+                    draws[r, rounds, i] = generators.build(data['generators'][j], data['parameters'][j])(rng=rng, size=len(rounds))
+        return draws
+
+    def run(self, seasons: List[str], runs: int, seed: int, release: Optional[Union[float, Dict[str, float]]] = None, first_run: int = 0) -> Traces:
+        '''
+        Simulates runs x rounds, vectorized across runs.
+
+        Parameters
+        ----------
+        seasons: List[str]
+            the season of each round.
+        runs: int
+            number of realizations.
+        seed: int
+            seed for the inflow streams.
+        release: float | Dict[str, float], optional
+            fixed release for every storage node, or a mapping of storage node names to fixed releases.
+            By default each storage node's own policy is used. Requests are limited to the water available in storage.
+        first_run: int
+            run index of the first realization, used to simulate a block of a larger ensemble.
+        '''
+        shape = (runs, len(seasons), len(self.names))
+        traces = Traces(self.names, np.zeros(shape), np.zeros(shape), np.zeros(shape), np.zeros(shape), np.zeros(shape))
+        for t, state in self.stream(seasons, runs, seed, release, first_run):
+            for k in VARIABLES:
+                getattr(traces, k)[:, t, :] = state[k]
+        return traces
+
+    def stream(self, seasons: List[str], runs: int, seed: int, release: Optional[Union[float, Dict[str, float]]] = None, first_run: int = 0) -> Iterator[Tuple[int, Dict[str, np.ndarray]]]:
+        '''
+        Simulates runs x rounds (see: BatchSystem.run), yielding (round, state) after each round, where state has
+        a (runs, nodes) array for each variable. Only the current round is held in memory, the arrays are reused
+        for the next round (copy them to keep them).
+        '''
+        m = len(self.names)
+        policies = dict(self.policies)
+        if release is not None:
+            policies.update({i: FixedRelease(release.get(self.names[i], 0) if isinstance(release, dict) else release) for i in policies})
+        draws = self.sample(seasons, runs, seed, first_run)
+        state = {k: np.zeros((runs, m)) for k in VARIABLES}
+        inflows, spills, releases, outflows = state['inflow'], state['spill'], state['release'], state['outflow']
+        storage = np.tile(self.initial, (runs, 1))
+        for t in range(0, len(seasons)):
+            for i in self.order:
+                match self.tags[i]:
+                    case Tag.inflow:
+                        inflow = draws[:, t, i]
+                        outflow = inflow
+                    case Tag.storage:
+                        inflow = outflows[:, self.senders[i]].sum(axis=1)
+                        spill = np.maximum(0, storage[:, i] + inflow - self.capacity[i])
+                        available = storage[:, i] + inflow - spill
+                        released = np.clip(policies[i].release(available, spill, seasons[t]), 0, available)
+                        storage[:, i] = available - released
+                        spills[:, i], releases[:, i] = spill, released
+                        outflow = spill + released
+                    case Tag.transfer:
+                        inflow = outflows[:, self.senders[i]].sum(axis=1)
+                        outflow = inflow * self.factor[i]
+                    case Tag.outflow:
+                        inflow = outflows[:, self.senders[i]].sum(axis=1)
+                        # diverted out of the system (recorded as the release), up to the capacity.
+                        releases[:, i] = np.minimum(inflow, self.capacity[i])
+                        outflow = inflow - releases[:, i]
+                    case Tag.outlet:
+                        inflow = outflows[:, self.senders[i]].sum(axis=1)
+                        outflow = inflow
+                    case other:
+                        raise NotImplementedError(f'Batch simulation of {other} nodes is not implemented.')
+                inflows[:, i], outflows[:, i] = inflow, outflow
+            state['storage'][:] = storage
+            yield t, state
+
+def simulate(system: System, seasons: List[str], runs: int, seed: int, release: Optional[Union[float, Dict[str, float]]] = None) -> Traces:
+    '''Compiles the system and simulates an ensemble of runs.'''
+    return BatchSystem.compile(system).run(seasons, runs, seed, release)
+
+def cycle_seasons(data: Dict[str, Any], rounds: int) -> List[str]:
+    '''Cycles through the seasons named by the configuration file inflow nodes (in the order they first appear) for the number of rounds.'''
+    names = list(dict.fromkeys(season for v in data['node'].values() if v.get('tag') == Tag.inflow for season in v['seasons']))
+    return [names[t % len(names)] for t in range(0, rounds)]
+
+def run_ensemble(data: Dict[str, Any], seasons: List[str], runs: int, seed: int, workers: Optional[int] = None, release: Optional[Union[float, Dict[str, float]]] = None,
+                 store: Optional[Path] = None, block: Optional[int] = None) -> Union[Traces, TraceStore]:
+    '''
+    Simulates an ensemble of runs across a pool of processes.
+
+    Runs are split into contiguous blocks, each worker builds the system from the configuration data and simulates
+    its blocks. Inflow streams are keyed by run index (not by worker), and blocks are merged in run order, so the
+    output for a seed is identical for any number of workers.
+
+    If a store directory is provided, workers write their blocks directly into a (memory mapped) TraceStore, which
+    is returned instead of in memory Traces. Use block to limit the number of runs each worker holds in memory.
+    '''
+    workers = workers if workers else os.cpu_count() or 1
+    # several blocks per worker, so a slow block does not hold up the pool.
+    size = block if block else max(1, -(-runs // (workers * 4)))
+    if store is not None:
+        TraceStore.create(store, system.factory(data).plan.names, runs, len(seasons)).flush()
+    blocks = [(data, seasons, min(size, runs - start), seed, release, start, store) for start in range(0, runs, size)]
+    if workers == 1:
+        results = [_run_block(*b) for b in blocks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run_block, *zip(*blocks)))
+    return TraceStore.open(store) if store is not None else Traces.concatenate(results)
+
+def _run_block(data: Dict[str, Any], seasons: List[str], runs: int, seed: int, release, first_run: int, store: Optional[Path] = None) -> Optional[Traces]:
+    traces = BatchSystem.compile(system.factory(data)).run(seasons, runs, seed, release, first_run)
+    if store is None:
+        return traces
+    out = TraceStore.open(store, mode='r+')
+    out.write(traces, first_run)
+    out.flush()
@@ -1,9 +1,147 @@
 '''
 Inflow generator functions.
+
+Generators are registered by name, and referenced by that name in the inflow node "generators" data.
+A generator is a function: f(*parameters, rng, size), or a class built from the parameters with a
+__call__(rng, size) method (for generators that keep state between draws). Each call returns a single
+draw (size=None) or an array of draws, taking the same values from rng either way.
+
+Other packages can add generators through the "lincoln.generators" entry point group, ex (pyproject.toml):
+    [project.entry-points."lincoln.generators"]
+    weibull = "mypackage.inflows:weibull_generator"
 '''
 
-from random import randint
+import numpy as np
+
+from pathlib import Path
+from functools import partial, lru_cache
+from importlib.metadata import entry_points
+from typing import List, Dict, Any, Callable, Optional
+
+ENTRY_POINT_GROUP = 'lincoln.generators'
+
+REGISTRY: Dict[str, Callable[..., Any]] = {}
+
+def register(name: str):
+    '''Creates a @register(name) annotation, which adds a generator function or class to the registry.'''
+    def decorator(f):
+        REGISTRY[name] = f
+        return f
+    return decorator
+
+def get(name: str) -> Optional[Callable[..., Any]]:
+    '''Returns the registered generator, loading entry point plugins if it is not found. None if there is no such generator.'''
+    if name not in REGISTRY:
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            if entry_point.name not in REGISTRY:
+                REGISTRY[entry_point.name] = entry_point.load()
+    return REGISTRY.get(name)
+
+def build(name: str, parameters: List[Any]) -> Callable[..., Any]:
+    '''
+    Binds generator parameters, returns a callable: f(rng, size).
+
+    Raises
+    ----------
+    KeyError
+        if no generator is registered by the name.
+    TypeError, ValueError
+        if the parameters do not match the generator arguments.
+    '''
+    f = get(name)
+    if f is None:
+        raise KeyError(name)
+    return f(*parameters) if isinstance(f, type) else partial(f, *parameters)
+
+def draw(name: str, parameters: List[Any], size: int, seed: int = None) -> np.ndarray:
+    '''Draws an array of inflows, in one vectorized call.'''
+    return build(name, parameters)(rng=np.random.default_rng(seed), size=size)
+
+def stream(seed: int, run: int = 0, node: int = 0, season: int = 0) -> np.random.Generator:
+    '''
+    Returns an independent random number stream for a single (run, node, season) combination.
+
+    Streams are keyed by position rather than drawn from a shared generator, so the draws a node sees
+    do not depend on the order in which nodes (or runs) are evaluated.
+    '''
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(run, node, season)))
+
+def _result(draws, size):
+    return draws.item() if size is None else draws
+
+@register('uniform')
+def uniform_generator(min=2, max=12, rng: np.random.Generator = None, size=None):
+    '''Generates random integer(s) on range: [min, max] (inclusive).'''
+    rng = np.random.default_rng() if rng is None else rng
+    return _result(np.asarray(rng.integers(min, max, endpoint=True, size=size)), size)
+
+@register('normal')
+def normal_generator(mean, std, rng: np.random.Generator = None, size=None):
+    '''Generates normally distributed inflow(s), truncated at zero.'''
+    rng = np.random.default_rng() if rng is None else rng
+    return _result(np.maximum(0, rng.normal(mean, std, size=size)), size)
+
+@register('lognormal')
+def lognormal_generator(mean, sigma, rng: np.random.Generator = None, size=None):
+    '''Generates lognormally distributed inflow(s), mean and sigma are parameters of the underlying normal distribution.'''
+    rng = np.random.default_rng() if rng is None else rng
+    return _result(np.asarray(rng.lognormal(mean, sigma, size=size)), size)
+
+@register('gamma')
+def gamma_generator(shape, scale, rng: np.random.Generator = None, size=None):
+    '''Generates gamma distributed inflow(s).'''
+    rng = np.random.default_rng() if rng is None else rng
+    return _result(np.asarray(rng.gamma(shape, scale, size=size)), size)
+
+@register('ar1')
+class AR1Generator:
+    '''
+    Lag one autoregressive inflows: x[t] = mean + phi * (x[t - 1] - mean) + std * sqrt(1 - phi^2) * e[t], truncated at zero.
+
+    The series starts from a draw of its stationary distribution and continues between calls, so draws are
+    autocorrelated across the rounds of a season.
+    '''
+    def __init__(self, mean, std, phi):
+        if not -1 < phi < 1:
+            raise ValueError(f'The ar1 generator phi parameter: {phi} must be on the range (-1, 1).')
+        self.mean, self.std, self.phi = mean, std, phi
+        self._previous = None
+
+    def __call__(self, rng: np.random.Generator = None, size=None):
+        rng = np.random.default_rng() if rng is None else rng
+        e = rng.standard_normal(size=1 if size is None else size)
+        x = np.empty_like(e)
+        previous, innovation = self._previous, self.std * np.sqrt(1 - self.phi ** 2)
+        for t in range(0, e.size):
+            previous = self.mean + self.std * e[t] if previous is None else self.mean + self.phi * (previous - self.mean) + innovation * e[t]
+            x[t] = previous
+        self._previous = previous
+        return _result(np.maximum(0, x[0] if size is None else x), size)
+
+    @property
+    def state(self):
+        '''Last value of the (untruncated) series, None before the first draw.'''
+        return self._previous
+    @state.setter
+    def state(self, value) -> None:
+        self._previous = value
+
+@register('resample')
+class ResampleGenerator:
+    '''Resamples (with replacement) a historical series of inflows, from a text or csv file with one value per line (first column).'''
+    def __init__(self, path):
+        self.series = _load_series(str(path))
+
+    def __call__(self, rng: np.random.Generator = None, size=None):
+        rng = np.random.default_rng() if rng is None else rng
+        return _result(np.asarray(rng.choice(self.series, size=size)), size)
 
-def uniform_generator(min=2, max=12):
-    '''Generates random integer on range: [min, max] (inclusive).'''
-    return randint(a=min, b=max)
\ No newline at end of file
+@lru_cache(maxsize=None)
+def _load_series(path: str) -> np.ndarray:
+    try:
+        series = np.loadtxt(Path(path), delimiter=',', ndmin=2)[:, 0]
+    except (OSError, ValueError):
+        raise ValueError(f'The historical inflow series file: {path} could not be read.')
+    if series.size == 0:
+        raise ValueError(f'The historical inflow series file: {path} is empty.')
+    return series
@@ -0,0 +1,68 @@
+'''
+Opt-in per node instrumentation: wall time, call counts and flow totals.
+
+Enabling a profiler swaps each node to an instrumented subclass, whose route method (used by System.step,
+System.request and the recursive send() chain) records into the profiler held by the node store. Disabling it
+restores the node class, so nodes have no instrumentation cost unless it is enabled.
+'''
+
+from time import perf_counter
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Any
+
+from lincoln.model.node import Node, Tag
+
+_INSTRUMENTED: Dict[type, type] = {}
+
+@dataclass
+class Counters:
+    '''Totals for a single node, since profiling was enabled.'''
+    calls: int = 0
+    seconds: float = 0.0
+    '''Time spent in the node itself (not in its senders).'''
+    inflow: float = 0
+    '''Flow into the node (generated flow for inflow nodes).'''
+    spill: float = 0
+    release: float = 0
+    outflow: float = 0
+
+@dataclass
+class Profiler:
+    counters: Dict[str, Counters] = field(default_factory=lambda: {})
+
+    def attach(self, name: str, node: Node) -> None:
+        '''Instruments the node's route method, recording into the counters for name.'''
+        self.counters.setdefault(name, Counters())
+        node._store.profiler = self
+        node.__class__ = _instrumented(type(node))
+
+    @staticmethod
+    def detach(node: Node) -> None:
+        '''Restores the node class route method.'''
+        if getattr(type(node), '_instrumented', False):
+            node.__class__ = type(node).__bases__[0]
+            node._store.profiler = None
+
+    def table(self) -> List[Dict[str, Any]]:
+        '''One row per node: {node, calls, seconds, inflow, spill, release, outflow}.'''
+        return [dict(node=name, **asdict(c)) for name, c in self.counters.items()]
+
+def _instrumented(cls: type) -> type:
+    '''Returns (and caches) the instrumented subclass of a node class.'''
+    if cls not in _INSTRUMENTED:
+        def route(self, inflow, season: str = ''):
+            start = perf_counter()
+            outflow = cls.route(self, inflow, season)
+            seconds = perf_counter() - start
+            counters = self._store.profiler.counters[self._store.names[self._index]]
+            counters.seconds += seconds
+            counters.calls += 1
+            counters.inflow += outflow if self._tag == Tag.inflow else inflow
+            counters.outflow += outflow
+            if self._tag == Tag.storage:
+                counters.spill += self.spill
+            if self._tag in (Tag.storage, Tag.outflow):
+                counters.release += self.release
+            return outflow
+        _INSTRUMENTED[cls] = type(cls.__name__, (cls,), {'__slots__': (), '_instrumented': True, 'route': route, '__module__': cls.__module__})
+    return _INSTRUMENTED[cls]
@@ -1,13 +1,13 @@
 '''Contains game elements'''
 
-import typer
+import numpy as np
 
 from enum import Enum
-from functools import partial
-from dataclasses import dataclass, field
-from typing import List, Set, Dict, Any, Callable, Protocol
+from typing import List, Dict, Tuple, Any, Callable, Optional, Union, Protocol
 
-from lincoln.model import generators
+from lincoln.model import generators, policies
+from lincoln.model.policies import Policy, PromptPolicy
+from lincoln.model.store import NodeStore
 from lincoln.utilities import exception_handler
 
 class Tag(str, Enum):
@@ -23,13 +23,23 @@ class Tag(str, Enum):
     outlet = 'outlet'
     '''Downstream most node.'''
 
+TAGS: List[Tag] = list(Tag)
+'''Node store tag codes are indices into this list.'''
+
 def factory(**kwargs):
+    '''Builds a stand alone node (with its own node store).'''
+    return build('', kwargs)
+
+def build(name: str, data: Dict[str, Any], store: Optional[NodeStore] = None):
+    '''Builds a node, appended to the store (a new store if None).'''
     constructors = {
         'inflow': InflowNode.deserialize,
         'storage': StorageNode.deserialize,
+        'transfer': TransferNode.deserialize,
+        'outflow': OutflowNode.deserialize,
         'outlet' : OutletNode.deserialize
     }
-    return constructors[kwargs['tag']](kwargs)
+    return constructors[data['tag']](data, store, name)
 
 class NodeValidationError(Exception):
     pass
@@ -46,6 +56,8 @@ class Node(Protocol):
         '''Sends flow downstream.'''
     def request_inflow(self) -> int:
         '''Requests inflows from sender nodes, if any. Initializes a chain reaction that sends flows to node.'''
+    def route(self, inflow: int, season: str = '') -> int:
+        '''Routes an inflow (already collected from senders) through the node, returns the flow sent downstream. Does not call sender nodes.'''
     
     def serialize(self) -> Dict[str, Any]:
         '''Convert object into dictionary for storage.'''
@@ -63,37 +75,110 @@ class Reciever(Protocol):
     def remove_sender(self, sender_name: str) -> None:
         '''Removes connection to upstream sender.'''
 
-@dataclass
-class InflowNode:
-    '''Sender only node.'''
-    _data: Dict[str, Any]
-    _generators: Dict[str, Callable[..., int]]
+class _View:
+    '''Base of the node classes, a node is a lightweight view of its entry (index) in a node store.'''
+    __slots__ = ('_store', '_index')
+    _tag: Tag
+
+    def _attach(self, name: str, store: Optional[NodeStore], **values) -> NodeStore:
+        store = NodeStore(1) if store is None else store
+        self._store, self._index = store, store.append(name, TAGS.index(self._tag), self, **values)
+        return store
 
     @property
+    def name(self) -> str:
+        return self._store.names[self._index]
+    @property
     def tag(self) -> Tag:
-        return Tag.inflow
+        return self._tag
+    @property
+    def senders(self) -> Dict[str, Node]:
+        store = self._store
+        return {store.names[j]: store.views[j] for j in store.senders_of(self._index)}
+
+    @exception_handler(NodeValidationError, 9)
+    def add_sender(self, kvpair: Dict[str, Node]) -> None:
+        system = self._store.system
+        for name, sender in kvpair.items():
+            if system is not None:
+                # the plan and network of a system must follow its connections (see: System.add_edge).
+                if sender._store is not self._store or sender.name != name:
+                    raise NodeValidationError(f'The {name} node is not a node of the system, add it with System.add_node before connecting it to {self.name}.')
+                system.add_edge(name, self.name)
+                continue
+            if sender._store is not self._store:
+                # nodes must share a store to be connected, the smaller store is moved into the larger one.
+                small, large = sorted([sender._store, self._store], key=lambda s: s.size)
+                large.merge(small)
+            self._store.names[sender._index] = name
+            self._store.add_sender(self._index, sender._index)
+    def remove_sender(self, sender: Union[str, Dict[str, Node]]) -> None:
+        '''Removes the connection to a sender, by name or {name: node} pairs.'''
+        names = [sender] if isinstance(sender, str) else list(sender.keys())
+        system = self._store.system
+        for name, node in self.senders.items():
+            if name in names:
+                if system is not None:
+                    system.remove_edge(name, self.name)
+                else:
+                    self._store.remove_sender(self._index, node._index)
+
+    def request_inflow(self, season: str = ''):
+        return sum([node.send(season) for node in self.senders.values()])
+
+class InflowNode(_View):
+    '''Sender only node.'''
+    __slots__ = ()
+    _tag = Tag.inflow
+
+    def __init__(self, _data: Dict[str, Any], _generators: Dict[str, Callable[..., int]], _rngs: Optional[Dict[str, np.random.Generator]] = None, store: Optional[NodeStore] = None, name: str = '') -> None:
+        store = self._attach(name, store)
+        store.data[self._index], store.generators[self._index], store.rngs[self._index] = _data, _generators, _rngs if _rngs is not None else {}
+    def __repr__(self) -> str:
+        return f'InflowNode(_data={self._data})'
+
+    @property
+    def _data(self) -> Dict[str, Any]:
+        return self._store.data[self._index]
+    @property
+    def _generators(self) -> Dict[str, Callable[..., int]]:
+        return self._store.generators[self._index]
+    @_generators.setter
+    def _generators(self, value: Dict[str, Callable[..., int]]) -> None:
+        self._store.generators[self._index] = value
+    @property
+    def _rngs(self) -> Dict[str, np.random.Generator]:
+        return self._store.rngs[self._index]
+    @_rngs.setter
+    def _rngs(self, value: Dict[str, np.random.Generator]) -> None:
+        self._store.rngs[self._index] = value
     @property
     def senders(self) -> Dict[str, Node]:
         '''This node generates its own inflows and has not senders.'''
         return {}
     
     def serialize(self) -> Dict[str, Any]:
-        return self._data.update(self.senders) 
+        return {**self._data, 'senders': [k for k in self.senders.keys()]}
     @staticmethod
     @exception_handler(NodeValidationError, 9)
-    def deserialize(data: Dict[str, Any]) -> 'InflowNode':
+    def deserialize(data: Dict[str, Any], store: Optional[NodeStore] = None, name: str = '') -> 'InflowNode':
         '''Builds object from dictionary of object data.'''
         InflowNode.validate_keys(data)
         InflowNode.validate_data(data)
+        return InflowNode(data, InflowNode._build_generators(data), {season: np.random.default_rng() for season in data['seasons']}, store, name)
+
+    @staticmethod
+    def _build_generators(data: Dict[str, Any]) -> Dict[str, Callable[..., int]]:
+        '''Builds a generator for each season, from the generators registered in the generators module.'''
         genies: Dict[str, Callable[..., int]] = {}
         for i in range(0, len(data['generators'])):
-            # TODO: #2 add plugin architecture for generators.
-            match data['generators'][i]:
-                case 'uniform':
-                    genies[data['seasons'][i]] = partial(generators.uniform_generator, min=data['parameters'][i][0], max=data['parameters'][i][1])
-                case other:
-                    raise NodeValidationError(f'\"{data["generators"][i]}\" is not an implemented inflow node generator.')
-        return InflowNode(data, genies)
+            try:
+                genies[data['seasons'][i]] = generators.build(data['generators'][i], data['parameters'][i])
+            except KeyError:
+                raise NodeValidationError(f'\"{data["generators"][i]}\" is not an implemented inflow node generator.')
+            except (TypeError, ValueError) as e:
+                raise NodeValidationError(f'The \"{data["generators"][i]}\" inflow node generator parameters: {data["parameters"][i]} are not valid. {e}')
+        return genies
     
     @staticmethod
     @exception_handler(KeyError, 10)
@@ -109,39 +194,87 @@ class InflowNode:
         if len(set([len(data['seasons']), len(data['generators']), len(data['parameters'])])) != 1:
             raise NodeValidationError('There is not a one-to-one mapping between the provided inflow node generators, seasons, and generator parameters.')
     
+    @exception_handler(NodeValidationError, 9)
+    def update(self, changes: Dict[str, Any]) -> None:
+        '''Changes the seasons, generators or generator parameters. Streams of existing seasons are kept.'''
+        data = {**self._data, **changes}
+        InflowNode.validate_keys(data)
+        InflowNode.validate_data(data)
+        genies = InflowNode._build_generators(data)
+        rngs = self._rngs
+        self._store.data[self._index] = data
+        self._generators, self._rngs = genies, {season: rngs[season] if season in rngs else np.random.default_rng() for season in data['seasons']}
+
+    def seed(self, seed: int, run: int = 0, index: int = 0) -> None:
+        '''Seeds one random stream per season, keyed by the run and the node's index in the system network. Restarts any generator state.'''
+        self._generators = InflowNode._build_generators(self._data)
+        self._rngs = {season: generators.stream(seed, run, index, i) for i, season in enumerate(self._data['seasons'])}
+
     def request_inflow(self, season: str = '') -> int:
         return self.send(season)          
     def send(self, season: str = '') -> int:  
         '''Generates an inflow that is sent to downstream connections.'''
-        return self.generators[season]()
+        return self.route(0, season)
+    def route(self, inflow: int = 0, season: str = '') -> int:
+        return self._generators[season](rng=self._rngs.get(season))
     
-@dataclass
-class StorageNode:
+class StorageNode(_View):
     '''Node with storage'''
-    storage: int
-    capacity: int
-    _initial: int
-    _senders: Set[str] = field(default_factory=lambda: {})
-    
+    __slots__ = ()
+    _tag = Tag.storage
+
+    def __init__(self, storage: float, capacity: float, _initial: float, _senders: Optional[Dict[str, Node]] = None, policy: Optional[Policy] = None, store: Optional[NodeStore] = None, name: str = '') -> None:
+        store = self._attach(name, store, capacity=capacity, storage=storage, initial=_initial)
+        store.policies[self._index] = policy if policy is not None else PromptPolicy()
+        self.add_sender(_senders if _senders is not None else {})
+    def __repr__(self) -> str:
+        return f'StorageNode(storage={self.storage}, capacity={self.capacity}, _initial={self._initial}, policy={self.policy})'
+
     @property
-    def tag(self) -> Tag:
-        return Tag.storage
+    def storage(self) -> float:
+        return self._store.storage[self._index].item()
+    @storage.setter
+    def storage(self, value: float) -> None:
+        self._store.storage[self._index] = value
     @property
-    def senders(self) -> Dict[str, Node]:
-        return self._senders
+    def capacity(self) -> float:
+        return self._store.capacity[self._index].item()
+    @capacity.setter
+    def capacity(self, value: float) -> None:
+        self._store.capacity[self._index] = value
+    @property
+    def _initial(self) -> float:
+        return self._store.initial[self._index].item()
+    @property
+    def policy(self) -> Policy:
+        '''Makes release decisions, the interactive prompt by default.'''
+        return self._store.policies[self._index]
+    @policy.setter
+    def policy(self, value: Policy) -> None:
+        self._store.policies[self._index] = value
+    @property
+    def spill(self) -> float:
+        '''Flow spilled in the last round.'''
+        return self._store.spill[self._index].item()
+    @property
+    def release(self) -> float:
+        '''Flow released in the last round.'''
+        return self._store.release[self._index].item()
     
     def serialize(self):
         return {
             'tag': 'storage',
             'storage': self._initial,
             'capacity': self.capacity,
+            'policy': self.policy.serialize(),
             'senders': [k for k in self.senders.keys()]
         }
     @staticmethod
-    def deserialize(data: Dict[str, Any]):
+    def deserialize(data: Dict[str, Any], store: Optional[NodeStore] = None, name: str = ''):
         StorageNode.validate_keys(data)
         StorageNode.validate_data(data)
-        return StorageNode(storage=data['initial'], capacity=data['capacity'], _initial=data['initial'])
+        policy = policies.factory(data['policy']) if 'policy' in data else PromptPolicy()
+        return StorageNode(storage=data['initial'], capacity=data['capacity'], _initial=data['initial'], policy=policy, store=store, name=name)
     
     @staticmethod
     @exception_handler(KeyError, 10)
@@ -157,35 +290,160 @@ class StorageNode:
         if data['initial'] < 0 or data['capacity'] < 0:
             raise NodeValidationError(f'The initial: {data["initial"]}, and capacity: {data["capacity"]} storage parameters must be set to positive integer values, with initial \u2264 capacity storage.')
         
-    def add_sender(self, kvpair: Dict[str, Node]) -> None:
-        self._senders.update(kvpair)
-    def remove_sender(self, kvpair: Dict[str, Node]) -> None:
-        self._senders.remove(kvpair)
+    def update(self, changes: Dict[str, Any]) -> None:
+        '''Changes the initial storage, capacity, current storage or policy.'''
+        data = {'tag': 'storage', 'initial': self._initial, 'capacity': self.capacity, **changes}
+        StorageNode.validate_keys(data)
+        StorageNode.validate_data(data)
+        store, i = self._store, self._index
+        store.initial[i], store.capacity[i] = data['initial'], data['capacity']
+        if 'storage' in changes:
+            store.storage[i] = changes['storage']
+        if 'policy' in changes:
+            store.policies[i] = policies.factory(changes['policy'])
 
-    def request_inflow(self, season: str = ''):
-        return sum([node.send(season) for node in self.senders.values()])
     def send(self, season: str = '') -> int:
-        inflows = self.request_inflow(season)
-        spill = max(0, self.storage + inflows - self.capacity)
-        # put in some sort of decision object, that provides table and deals with prompt.
-        if spill:
-            release = typer.prompt(f'{spill} units have spilled. How much more would you like to release? [0, {self.storage}]')
-        else:
-            release = typer.prompt(f'How much would you like to release? [0, {self.storage}]')
-        self.storage = self.storage + inflows - spill - release
-        return release
-
-@dataclass
-class OutletNode:
-    '''Node at outlet of system with no operations (i.e., inflow = outflow).'''
-    _senders: Dict[str, Node] = field(default_factory=lambda: {})
-    
+        return self.route(self.request_inflow(season), season)
+    def available(self, inflows: int) -> Tuple[float, float]:
+        '''Water available for release and the flow spilled (storage above capacity), given this round's inflows.'''
+        storage = self._store.storage[self._index].item()
+        spill = max(0, storage + inflows - self._store.capacity[self._index].item())
+        return storage + inflows - spill, spill
+    def route(self, inflows: int, season: str = '') -> int:
+        store, i = self._store, self._index
+        available, spill = self.available(inflows)
+        release = np.clip(store.policies[i].release(available, spill, season), 0, available).item()
+        store.storage[i], store.spill[i], store.release[i] = available - release, spill, release
+        # spilled water leaves the reservoir along with the release.
+        return spill + release
+
+class TransferNode(_View):
+    '''Node that aggregates the flow of its senders and rescales it (i.e., outflow = factor * inflow).'''
+    __slots__ = ()
+    _tag = Tag.transfer
+
+    def __init__(self, factor: float = 1, _senders: Optional[Dict[str, Node]] = None, store: Optional[NodeStore] = None, name: str = '') -> None:
+        self._attach(name, store, factor=factor)
+        self.add_sender(_senders if _senders is not None else {})
+    def __repr__(self) -> str:
+        return f'TransferNode(factor={self.factor})'
+
     @property
-    def tag(self) -> Tag:
-        return Tag.outlet
+    def factor(self) -> float:
+        return self._store.factor[self._index].item()
+    @factor.setter
+    def factor(self, value: float) -> None:
+        self._store.factor[self._index] = value
+
+    def serialize(self):
+        return {
+            'tag': 'transfer',
+            'factor': self.factor,
+            'senders': [k for k in self.senders.keys()]
+        }
+    @staticmethod
+    def deserialize(data: Dict[str, Any], store: Optional[NodeStore] = None, name: str = ''):
+        TransferNode.validate_keys(data)
+        TransferNode.validate_data(data)
+        return TransferNode(factor=data['factor'], store=store, name=name)
+
+    @staticmethod
+    @exception_handler(KeyError, 10)
+    def validate_keys(data: Dict[str, Any]):
+        for key in ['tag', 'factor']:
+            if key not in data.keys():
+                raise KeyError(f'{key} data is missing from the transfer node data.')
+
+    @staticmethod
+    @exception_handler(NodeValidationError, 9)
+    def validate_data(data: Dict[str, Any]):
+        if data['factor'] < 0:
+            raise NodeValidationError(f'The transfer node factor: {data["factor"]} must be a non-negative value.')
+
+    def update(self, changes: Dict[str, Any]) -> None:
+        '''Changes the factor.'''
+        data = {'tag': 'transfer', 'factor': self.factor, **changes}
+        TransferNode.validate_keys(data)
+        TransferNode.validate_data(data)
+        self.factor = data['factor']
+
+    def send(self, season: str = '') -> int:
+        return self.route(self.request_inflow(season), season)
+    def route(self, inflow: int, season: str = '') -> int:
+        return inflow * self._store.factor[self._index].item()
+
+class OutflowNode(_View):
+    '''Node that diverts flow out of the system (ex: a pipeline), up to its capacity, and sends the rest downstream.'''
+    __slots__ = ()
+    _tag = Tag.outflow
+
+    def __init__(self, capacity: float, _senders: Optional[Dict[str, Node]] = None, store: Optional[NodeStore] = None, name: str = '') -> None:
+        self._attach(name, store, capacity=capacity)
+        self.add_sender(_senders if _senders is not None else {})
+    def __repr__(self) -> str:
+        return f'OutflowNode(capacity={self.capacity})'
+
     @property
-    def senders(self) -> Dict[str, Node]:
-        return self._senders
+    def capacity(self) -> float:
+        return self._store.capacity[self._index].item()
+    @capacity.setter
+    def capacity(self, value: float) -> None:
+        self._store.capacity[self._index] = value
+    @property
+    def release(self) -> float:
+        '''Flow diverted out of the system in the last round.'''
+        return self._store.release[self._index].item()
+
+    def serialize(self):
+        return {
+            'tag': 'outflow',
+            'capacity': self.capacity,
+            'senders': [k for k in self.senders.keys()]
+        }
+    @staticmethod
+    def deserialize(data: Dict[str, Any], store: Optional[NodeStore] = None, name: str = ''):
+        OutflowNode.validate_keys(data)
+        OutflowNode.validate_data(data)
+        return OutflowNode(capacity=data['capacity'], store=store, name=name)
+
+    @staticmethod
+    @exception_handler(KeyError, 10)
+    def validate_keys(data: Dict[str, Any]):
+        for key in ['tag', 'capacity']:
+            if key not in data.keys():
+                raise KeyError(f'{key} data is missing from the outflow node data.')
+
+    @staticmethod
+    @exception_handler(NodeValidationError, 9)
+    def validate_data(data: Dict[str, Any]):
+        if data['capacity'] < 0:
+            raise NodeValidationError(f'The outflow node capacity: {data["capacity"]} must be a non-negative value.')
+
+    def update(self, changes: Dict[str, Any]) -> None:
+        '''Changes the capacity.'''
+        data = {'tag': 'outflow', 'capacity': self.capacity, **changes}
+        OutflowNode.validate_keys(data)
+        OutflowNode.validate_data(data)
+        self.capacity = data['capacity']
+
+    def send(self, season: str = '') -> int:
+        return self.route(self.request_inflow(season), season)
+    def route(self, inflow: int, season: str = '') -> int:
+        store, i = self._store, self._index
+        diverted = min(inflow, store.capacity[i].item())
+        store.release[i] = diverted
+        return inflow - diverted
+
+class OutletNode(_View):
+    '''Node at outlet of system with no operations (i.e., inflow = outflow).'''
+    __slots__ = ()
+    _tag = Tag.outlet
+
+    def __init__(self, _senders: Optional[Dict[str, Node]] = None, store: Optional[NodeStore] = None, name: str = '') -> None:
+        self._attach(name, store)
+        self.add_sender(_senders if _senders is not None else {})
+    def __repr__(self) -> str:
+        return f'OutletNode(senders={list(self.senders.keys())})'
     
     def serialize(self):
         return {
@@ -193,15 +451,16 @@ class OutletNode:
             'senders': [k for k in self.senders.keys()]
         }
     @staticmethod
-    def deserialize(data: Dict[str, Any]):
-        return OutletNode()
-    
-    def add_sender(self, kvpair: Dict[str, Node]) -> None:
-        self._senders.update(kvpair)
-    def remove_sender(self, kvpair: Dict[str, Node]) -> None:
-        self._senders.remove(kvpair)
+    def deserialize(data: Dict[str, Any], store: Optional[NodeStore] = None, name: str = ''):
+        return OutletNode(store=store, name=name)
         
-    def request_inflow(self, season: str = ''):
-        return sum([node.send(season) for node in self.senders.values()])
+    @exception_handler(NodeValidationError, 9)
+    def update(self, changes: Dict[str, Any]) -> None:
+        '''Outlet nodes have no parameters.'''
+        if changes:
+            raise NodeValidationError(f'Outlet nodes have no parameters, the changes: {changes} can not be applied.')
+
     def send(self, season: str = ''):
-        return self.request_inflow(season)
\ No newline at end of file
+        return self.request_inflow(season)
+    def route(self, inflow: int, season: str = '') -> int:
+        return inflow
\ No newline at end of file
@@ -0,0 +1,122 @@
+'''
+Stochastic dynamic programming (SDP) release policies for storage nodes.
+
+The solver finds the release for each season and available storage that maximizes the expected discounted sum of
+an objective's rewards, given the season inflow distributions of the storage node's (inflow node) senders.
+Storage is discretized on a grid from 0 to capacity (step 1 by default, exact for integer games), and the
+Bellman backups are vectorized over the grid:
+
+    W[k](a) = max over r in [0, a] of: reward(r, season k) + discount * V[k + 1](a - r)
+    V[k](s) = E over inflows q of season k: W[k](available(s, q)) - spill_penalty * spill(s, q)
+
+where s is the storage at the start of a round, a the water available after inflows and spill (as in StorageNode.route),
+and the seasons repeat in cycle. The argmax of W is returned as a ReleaseTable policy, and solutions are cached
+by problem, so solving the same node again is free.
+'''
+
+import numpy as np
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Tuple, Any
+
+from lincoln.model import generators
+from lincoln.model.node import Node, Tag
+from lincoln.model.policies import ReleaseTable
+from lincoln.utilities import exception_handler
+
+class SolverError(Exception):
+    pass
+
+@dataclass
+class Objective:
+    '''Reward for each round: -(shortage)^2 - spill_penalty * spill, where the shortage is the release below the season's target.'''
+    targets: Dict[str, float]
+    default: float = 0
+    '''Target release for seasons without a target.'''
+    spill_penalty: float = 0
+
+    def reward(self, release: np.ndarray, season: str) -> np.ndarray:
+        return -np.maximum(0, self.targets.get(season, self.default) - release) ** 2
+
+@dataclass
+class Solution:
+    policy: ReleaseTable
+    values: Dict[str, np.ndarray]
+    '''Expected discounted reward of each (start of round) storage on the grid, by season.'''
+    iterations: int
+
+CACHE_SIZE = 64
+'''Solutions kept in memory, the least recently used are dropped first (so a long running server does not grow).'''
+_CACHE: 'OrderedDict[Any, Solution]' = OrderedDict()
+
+@exception_handler(SolverError, 13)
+def solve(dam: Node, objective: Objective, discount: float = 0.95, step: float = 1, samples: int = 10000, seed: int = 0,
+          tolerance: float = 1e-6, max_iterations: int = 10000) -> Solution:
+    '''
+    Solves for the release policy of a storage node, whose senders must all be inflow nodes.
+
+    Inflow distributions are exact for the uniform generator, other generators are sampled (samples draws per season,
+    seeded by seed) and rounded to the storage grid. Stateful generators (ex: ar1) are treated as independent draws.
+    '''
+    if dam.tag != Tag.storage:
+        raise SolverError('Release policies can only be solved for storage nodes.')
+    if not 0 < discount < 1:
+        raise SolverError(f'The discount factor: {discount} must be on the range (0, 1).')
+    inflows = list(dam.senders.values())
+    if not inflows or any(v.tag != Tag.inflow for v in inflows):
+        raise SolverError(f'The {dam.name} storage node must receive flow only from inflow nodes to be solved.')
+    seasons = list(dict.fromkeys(season for v in inflows for season in v._data['seasons']))
+    pmfs = [(season, *_season_pmf(inflows, season, step, samples, seed)) for season in seasons]
+    key = (dam.capacity, step, discount, repr(objective), tolerance, max_iterations, tuple((k, q.tobytes(), p.tobytes()) for k, q, p in pmfs))
+    if key in _CACHE:
+        _CACHE.move_to_end(key)
+        return _CACHE[key]
+    _CACHE[key] = _solve(int(dam.capacity // step), step, pmfs, objective, discount, tolerance, max_iterations)
+    if len(_CACHE) > CACHE_SIZE:
+        _CACHE.popitem(last=False)
+    return _CACHE[key]
+
+def _solve(n: int, step: float, pmfs: List[Tuple[str, np.ndarray, np.ndarray]], objective: Objective, discount: float, tolerance: float, max_iterations: int) -> Solution:
+    '''Value iteration over the cycle of seasons, on a storage grid of n + 1 points.'''
+    grid = np.arange(0, n + 1)
+    # transfers[a, r]: storage left after releasing r of a available (-1 if r > a).
+    transfers = grid[:, None] - grid[None, :]
+    feasible = transfers >= 0
+    rewards = [np.where(feasible, objective.reward(grid * step, season)[None, :], -np.inf) for season, _, _ in pmfs]
+    # available storage and spill for each start of round storage (rows) and inflow (columns).
+    totals = [grid[:, None] + q[None, :] for _, q, _ in pmfs]
+    available = [np.minimum(t, n) for t in totals]
+    penalties = [objective.spill_penalty * step * np.maximum(0, t - n) for t in totals]
+    values, decisions = [np.zeros(n + 1) for _ in pmfs], [np.zeros(n + 1, dtype=int) for _ in pmfs]
+    for iteration in range(1, max_iterations + 1):
+        change = 0.0
+        for k in reversed(range(0, len(pmfs))):
+            later = values[(k + 1) % len(pmfs)]
+            q = rewards[k] + discount * later[np.maximum(transfers, 0)]
+            decisions[k] = q.argmax(axis=1)
+            w = q[grid, decisions[k]]
+            v = ((w[available[k]] - penalties[k]) * pmfs[k][2][None, :]).sum(axis=1)
+            change, values[k] = max(change, np.abs(v - values[k]).max()), v
+        if change < tolerance:
+            break
+    policy = ReleaseTable(step, {season: (decisions[k] * step).tolist() for k, (season, _, _) in enumerate(pmfs)})
+    return Solution(policy, {season: values[k] for k, (season, _, _) in enumerate(pmfs)}, iteration)
+
+def _season_pmf(inflows: List[Node], season: str, step: float, samples: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    '''Distribution of the total inflow in a season, as (grid index, probability) arrays.'''
+    pmf = np.ones(1)
+    for v in inflows:
+        if season not in v._data['seasons']:
+            continue
+        j = v._data['seasons'].index(season)
+        name, parameters = v._data['generators'][j], v._data['parameters'][j]
+        if name == 'uniform' and step == 1:
+            counts = np.zeros(int(parameters[1]) + 1)
+            counts[int(parameters[0]):] = 1
+        else:
+            draws = generators.build(name, parameters)(rng=generators.stream(seed, 0, v._index, j), size=samples)
+            counts = np.bincount(np.rint(np.asarray(draws) / step).astype(int))
+        pmf = np.convolve(pmf, counts / counts.sum())
+    q = np.flatnonzero(pmf)
+    return q, pmf[q]
@@ -0,0 +1,175 @@
+'''
+Release decision policies for storage nodes.
+
+Policies are called with the water available in storage (after spill) and return the requested release.
+Except for the interactive prompt, every policy works on integers or numpy arrays, so the same policy
+object is used by the scalar node send() chain and the batch (ensemble) simulation.
+'''
+
+import numpy as np
+
+from importlib import import_module
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Callable, Protocol
+
+from lincoln.utilities import exception_handler
+
+class PolicyValidationError(Exception):
+    pass
+
+class Policy(Protocol):
+    def release(self, available, spill, season: str = ''):
+        '''Returns the requested release, given the water available in storage and the flow that spilled this round.'''
+    def serialize(self) -> Dict[str, Any]:
+        '''Convert object into dictionary for storage.'''
+
+@exception_handler(PolicyValidationError, 11)
+def factory(data: Dict[str, Any]) -> Policy:
+    '''Builds a policy from the data in a storage node "policy" table.'''
+    constructors = {
+        'prompt': PromptPolicy.deserialize,
+        'fixed': FixedRelease.deserialize,
+        'rule_curve': RuleCurve.deserialize,
+        'zones': ZoneTable.deserialize,
+        'table': ReleaseTable.deserialize,
+        'callable': CallablePolicy.deserialize
+    }
+    if 'type' not in data or data['type'] not in constructors:
+        raise PolicyValidationError(f'The storage node policy type must be one of: {list(constructors.keys())}.')
+    return constructors[data['type']](data)
+
+@dataclass
+class PromptPolicy:
+    '''Asks the player for each release decision.'''
+
+    def serialize(self) -> Dict[str, Any]:
+        return {'type': 'prompt'}
+    @staticmethod
+    def deserialize(data: Dict[str, Any]) -> 'PromptPolicy':
+        return PromptPolicy()
+
+    def release(self, available, spill, season: str = '') -> int:
+        if isinstance(available, np.ndarray):
+            raise NotImplementedError('Interactive release decisions can not be used for batch simulations, use a headless policy.')
+        import typer
+        if spill:
+            return typer.prompt(f'{spill:g} units have spilled. How much more would you like to release? [0, {available:g}]', type=int)
+        return typer.prompt(f'How much would you like to release? [0, {available:g}]', type=int)
+
+@dataclass
+class FixedRelease:
+    '''Releases the same amount every round (limited to the available water by the storage node).'''
+    amount: float
+
+    def serialize(self) -> Dict[str, Any]:
+        return {'type': 'fixed', 'release': self.amount}
+    @staticmethod
+    @exception_handler(KeyError, 10)
+    def deserialize(data: Dict[str, Any]) -> 'FixedRelease':
+        if 'release' not in data:
+            raise KeyError('release data is missing from the fixed release policy data.')
+        return FixedRelease(data['release'])
+
+    def release(self, available, spill, season: str = ''):
+        return self.amount
+
+@dataclass
+class RuleCurve:
+    '''Releases any water above a target storage, targets may vary by season.'''
+    targets: Dict[str, float]
+    default: float = 0
+
+    def serialize(self) -> Dict[str, Any]:
+        return {'type': 'rule_curve', 'targets': dict(self.targets), 'target': self.default}
+    @staticmethod
+    def deserialize(data: Dict[str, Any]) -> 'RuleCurve':
+        return RuleCurve(data.get('targets', {}), data.get('target', 0))
+
+    def release(self, available, spill, season: str = ''):
+        return np.maximum(0, available - self.targets.get(season, self.default))
+
+@dataclass
+class ZoneTable:
+    '''
+    Storage zone table: releases[i] is requested when the available storage is in the zone starting at storages[i].
+
+    ex:
+        ZoneTable(storages=[0, 5, 10], releases=[0, 1, 3])
+        releases 0 below 5 units of storage, 1 between 5 and 10 units of storage and 3 at or above 10 units.
+    '''
+    storages: List[float]
+    releases: List[float]
+    _storages: np.ndarray = field(init=False, repr=False)
+    _releases: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._storages, self._releases = np.asarray(self.storages), np.asarray(self.releases)
+
+    def serialize(self) -> Dict[str, Any]:
+        return {'type': 'zones', 'storages': list(self.storages), 'releases': list(self.releases)}
+    @staticmethod
+    @exception_handler(PolicyValidationError, 11)
+    def deserialize(data: Dict[str, Any]) -> 'ZoneTable':
+        storages, releases = data.get('storages', []), data.get('releases', [])
+        if len(storages) == 0 or len(storages) != len(releases):
+            raise PolicyValidationError('The zone table policy requires one release for each storage zone.')
+        if storages[0] != 0 or any(storages[i] >= storages[i + 1] for i in range(0, len(storages) - 1)):
+            raise PolicyValidationError(f'The zone table storages: {storages} must start at 0 and be increasing.')
+        return ZoneTable(storages, releases)
+
+    def release(self, available, spill, season: str = ''):
+        zones = np.searchsorted(self._storages, available, side='right') - 1
+        return self._releases[np.maximum(zones, 0)]
+
+@dataclass
+class ReleaseTable:
+    '''
+    Release lookup table by season, with one release for each available storage on a grid: 0, step, 2 * step, ...
+    The available storage is rounded to the nearest grid point. Built by the optimize module solver, ex:
+        ReleaseTable(step=1, releases={'wet': [0, 1, 1, 2], 'dry': [0, 0, 1, 1]})
+        releases 1 unit in the wet season, when 2 units are available.
+    '''
+    step: float
+    releases: Dict[str, List[float]]
+    _releases: Dict[str, np.ndarray] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._releases = {season: np.asarray(r) for season, r in self.releases.items()}
+
+    def serialize(self) -> Dict[str, Any]:
+        return {'type': 'table', 'step': self.step, 'releases': {season: list(r) for season, r in self.releases.items()}}
+    @staticmethod
+    @exception_handler(PolicyValidationError, 11)
+    def deserialize(data: Dict[str, Any]) -> 'ReleaseTable':
+        step, releases = data.get('step', 1), data.get('releases', {})
+        if step <= 0 or not releases or any(len(r) == 0 for r in releases.values()):
+            raise PolicyValidationError('The release table policy requires a positive storage step and a list of releases for each season.')
+        return ReleaseTable(step, releases)
+
+    def release(self, available, spill, season: str = ''):
+        if season not in self._releases:
+            return np.zeros_like(available)
+        table = self._releases[season]
+        return table[np.clip(np.rint(np.asarray(available) / self.step).astype(int), 0, len(table) - 1)]
+
+@dataclass
+class CallablePolicy:
+    '''Wraps a function: f(available, spill, season) -> release.'''
+    function: Callable[..., Any]
+    path: str = ''
+    '''Import path ("module:attribute") of the function, if it was loaded from configuration data.'''
+
+    def serialize(self) -> Dict[str, Any]:
+        return {'type': 'callable', 'function': self.path}
+    @staticmethod
+    @exception_handler(PolicyValidationError, 11)
+    def deserialize(data: Dict[str, Any]) -> 'CallablePolicy':
+        path = data.get('function', '')
+        module, _, attribute = path.partition(':')
+        try:
+            return CallablePolicy(getattr(import_module(module), attribute), path)
+        except (ImportError, AttributeError, ValueError):
+            raise PolicyValidationError(f'The callable policy function: \"{path}\" could not be imported, use the form: \"module:function\".')
+
+    def release(self, available, spill, season: str = ''):
+        return self.function(available, spill, season)
@@ -0,0 +1,90 @@
+'''
+Compact binary snapshots of system state: node storages, the round index, flows already computed in the round, the
+flows of the last completed round and the inflow random stream (and stateful generator) states.
+
+A snapshot does not contain the system structure (nodes, network, policies), it is restored into a system built
+from the same configuration (checked with a key computed from the node names). Layout (little endian):
+
+    header:  magic (4 bytes) | format version (uint8) | round (int64) | key (uint32) | nodes (uint32) | streams (uint32)
+    nodes:   storage, spill, release, flow, last (float64 arrays, one entry per node; flow is NaN if not yet computed
+             this round, last is NaN if the node sent no flow in the last completed round)
+    streams: one STREAM record for each inflow node season
+
+Version 1 snapshots (without the last round's flows) are still read, as if no round was completed.
+'''
+
+import zlib
+import struct
+import numpy as np
+
+from dataclasses import dataclass
+from typing import List
+
+from lincoln.utilities import exception_handler
+
+MAGIC = b'LNSN'
+VERSION = 2
+HEADER = struct.Struct('<4sBqIII')
+STREAM = np.dtype([('node', '<u4'), ('season', '<u4'), ('state', '<u8', 2), ('inc', '<u8', 2), ('has_uint32', 'u1'), ('uinteger', '<u4'), ('generator', '<f8')])
+'''PCG64 stream state (128 bit integers as low, high words) and generator state (NaN if the generator is stateless) of an inflow node season.'''
+
+class SnapshotError(Exception):
+    pass
+
+@dataclass(frozen=True)
+class Snapshot:
+    '''Immutable system state, the arrays are read only so a snapshot can be shared by any number of forks.'''
+    round: int
+    key: int
+    '''Identifies the system the snapshot was taken from (see: names_key).'''
+    storage: np.ndarray
+    spill: np.ndarray
+    release: np.ndarray
+    flow: np.ndarray
+    last: np.ndarray
+    '''Flows of the last completed round (see: FlowCache.last).'''
+    streams: np.ndarray
+
+    def to_bytes(self) -> bytes:
+        header = HEADER.pack(MAGIC, VERSION, self.round, self.key, len(self.storage), len(self.streams))
+        return b''.join([header] + [a.astype('<f8').tobytes() for a in [self.storage, self.spill, self.release, self.flow, self.last]] + [self.streams.tobytes()])
+    @staticmethod
+    @exception_handler(SnapshotError, 12)
+    def from_bytes(data: bytes) -> 'Snapshot':
+        '''Reads a snapshot without copying its arrays.'''
+        try:
+            magic, version, t, key, m, n = HEADER.unpack_from(data)
+        except struct.error:
+            raise SnapshotError('The snapshot data is truncated.')
+        if magic != MAGIC or version not in [1, VERSION]:
+            raise SnapshotError(f'The data is not a version {VERSION} lincoln snapshot.')
+        k = 4 if version == 1 else 5
+        if len(data) != HEADER.size + k * 8 * m + STREAM.itemsize * n:
+            raise SnapshotError('The snapshot data is truncated.')
+        arrays = [np.frombuffer(data, dtype='<f8', count=m, offset=HEADER.size + 8 * m * i) for i in range(0, k)]
+        if version == 1:
+            last = np.full(m, np.nan)
+            last.flags.writeable = False
+            arrays.append(last)
+        streams = np.frombuffer(data, dtype=STREAM, count=n, offset=HEADER.size + k * 8 * m)
+        return Snapshot(t, key, *arrays, streams)
+
+def names_key(names: List[str]) -> int:
+    return zlib.crc32('\0'.join(names).encode())
+
+def pack_stream(node: int, season: int, rng: np.random.Generator, generator_state) -> tuple:
+    '''STREAM record for a numpy random generator (PCG64 bit generator).'''
+    state = rng.bit_generator.state
+    if state['bit_generator'] != 'PCG64':
+        raise SnapshotError(f'Only PCG64 random streams can be saved in a snapshot, not: {state["bit_generator"]}.')
+    split = lambda x: (x & 0xFFFFFFFFFFFFFFFF, x >> 64)
+    return (node, season, split(state['state']['state']), split(state['state']['inc']), state['has_uint32'], state['uinteger'],
+            np.nan if generator_state is None else generator_state)
+
+def unpack_stream(record: np.void) -> np.random.Generator:
+    '''New numpy random generator, in the state of a STREAM record.'''
+    join = lambda words: int(words[0]) | (int(words[1]) << 64)
+    bit_generator = np.random.PCG64()
+    bit_generator.state = {'bit_generator': 'PCG64', 'state': {'state': join(record['state']), 'inc': join(record['inc'])},
+                           'has_uint32': int(record['has_uint32']), 'uinteger': int(record['uinteger'])}
+    return np.random.Generator(bit_generator)
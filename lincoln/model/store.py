@@ -0,0 +1,157 @@
+'''
+Compact struct of arrays storage for system nodes.
+
+A NodeStore holds the state of every node in a system in typed arrays (tag codes, capacity, transfer factor,
+storage, initial storage, last spill and release) plus compressed sparse row (CSR) sender indices. The node classes in the node
+module are lightweight views (a store and an index) over one store, so stepping a system touches a few
+contiguous arrays instead of one heap object (and dictionaries) per node, and the arrays can be used directly
+by vectorized code.
+'''
+
+import copy
+import numpy as np
+
+from typing import List, Dict, Set, Tuple, Callable, Optional, Any
+
+class NodeStore:
+    def __init__(self, size: int = 0) -> None:
+        '''Creates an empty store, with room for size nodes before its arrays need to grow.'''
+        self.size = 0
+        '''Number of nodes in the store, arrays may be longer (use: array[:size]).'''
+        self.names: List[str] = []
+        self.views: List[Any] = []
+        '''Node view objects, by index.'''
+        self.tags = np.zeros(size, dtype=np.int8)
+        self.capacity = np.zeros(size)
+        '''Storage capacity of storage nodes, diversion capacity of outflow nodes.'''
+        self.factor = np.ones(size)
+        '''Flow scaling factor of transfer nodes.'''
+        self.storage = np.zeros(size)
+        self.initial = np.zeros(size)
+        self.spill = np.zeros(size)
+        self.release = np.zeros(size)
+        self.indptr = np.zeros(1, dtype=np.intp)
+        '''CSR row pointers, the senders of node i are: indices[indptr[i]:indptr[i + 1]] (plus any uncompacted edits).'''
+        self.indices = np.zeros(0, dtype=np.intp)
+        self._added: Dict[int, List[int]] = {}
+        self._removed: Set[Tuple[int, int]] = set()
+        # object data, only held for the node types that use it.
+        self.policies: Dict[int, Any] = {}
+        self.data: Dict[int, Dict[str, Any]] = {}
+        self.generators: Dict[int, Dict[str, Callable[..., Any]]] = {}
+        self.rngs: Dict[int, Dict[str, np.random.Generator]] = {}
+        self.profiler = None
+        self.system = None
+        '''System the nodes belong to (None for stand alone nodes), connections are then edited through the system.'''
+
+    def append(self, name: str, tag: int, view: Any, capacity: float = 0, storage: float = 0, initial: float = 0, factor: float = 1) -> int:
+        '''Adds a node, returns its index.'''
+        if self.size == len(self.tags):
+            self._grow(max(8, 2 * len(self.tags)))
+        i = self.size
+        self.size += 1
+        self.names.append(name)
+        self.views.append(view)
+        self.tags[i], self.capacity[i], self.storage[i], self.initial[i], self.spill[i], self.release[i], self.factor[i] = tag, capacity, storage, initial, 0, 0, factor
+        return i
+
+    def _grow(self, length: int) -> None:
+        for attribute in ['tags', 'capacity', 'factor', 'storage', 'initial', 'spill', 'release']:
+            old = getattr(self, attribute)
+            new = np.zeros(length, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, attribute, new)
+
+    def set_senders(self, senders: List[List[int]]) -> None:
+        '''Replaces all sender connections, senders[i] lists the indices of the nodes sending flow to node i.'''
+        self.indptr = np.concatenate([[0], np.cumsum([len(s) for s in senders])]).astype(np.intp)
+        self.indices = np.fromiter((j for s in senders for j in s), dtype=np.intp, count=int(self.indptr[-1]))
+        self._added, self._removed = {}, set()
+
+    def senders_of(self, i: int) -> List[int]:
+        base = self.indices[self.indptr[i]:self.indptr[i + 1]].tolist() if i + 1 < len(self.indptr) else []
+        if self._removed:
+            base = [j for j in base if (i, j) not in self._removed]
+        return base + self._added.get(i, [])
+    def add_sender(self, i: int, j: int) -> None:
+        '''Connects node j as a sender to node i.'''
+        if (i, j) in self._removed:
+            self._removed.discard((i, j))
+        elif j not in self.senders_of(i):
+            self._added.setdefault(i, []).append(j)
+    def remove_sender(self, i: int, j: int) -> None:
+        if j in self._added.get(i, []):
+            self._added[i].remove(j)
+        elif j in self.senders_of(i):
+            self._removed.add((i, j))
+    def compact(self) -> None:
+        '''Folds sender edits into the CSR arrays.'''
+        if self._added or self._removed:
+            self.set_senders([self.senders_of(i) for i in range(0, self.size)])
+
+    def remove(self, i: int) -> None:
+        '''
+        Removes an unconnected node, renumbering the nodes after it (linear in the size of the store).
+        The removed node's view is moved to a store of its own, so it remains usable.
+        '''
+        self.compact()
+        view = self.views[i]
+        orphan = NodeStore(1)
+        orphan.append(self.names[i], self.tags[i], view, self.capacity[i], self.storage[i], self.initial[i], self.factor[i])
+        for attribute in ['policies', 'data', 'generators', 'rngs']:
+            values = getattr(self, attribute)
+            if i in values:
+                getattr(orphan, attribute)[0] = values[i]
+            setattr(self, attribute, {k - 1 if k > i else k: v for k, v in values.items() if k != i})
+        for attribute in ['tags', 'capacity', 'factor', 'storage', 'initial', 'spill', 'release']:
+            array = getattr(self, attribute)
+            array[i:self.size - 1] = array[i + 1:self.size]
+        self.size -= 1
+        self.names.pop(i)
+        self.views.pop(i)
+        for k in range(i, self.size):
+            self.views[k]._index = k
+        self.indptr = np.delete(self.indptr, i + 1)
+        self.indices = np.where(self.indices > i, self.indices - 1, self.indices)
+        view._store, view._index = orphan, 0
+
+    def merge(self, other: 'NodeStore') -> int:
+        '''Moves every node of another store into this one (re-pointing their views), returns the index offset of the moved nodes.'''
+        offset = self.size
+        for j in range(0, other.size):
+            view = other.views[j]
+            i = self.append(other.names[j], other.tags[j], view, other.capacity[j], other.storage[j], other.initial[j], other.factor[j])
+            self.spill[i], self.release[i] = other.spill[j], other.release[j]
+            for attribute in ['policies', 'data', 'generators', 'rngs']:
+                if j in getattr(other, attribute):
+                    getattr(self, attribute)[i] = getattr(other, attribute)[j]
+            view._store, view._index = self, i
+        for j in range(0, other.size):
+            for k in other.senders_of(j):
+                self.add_sender(offset + j, offset + k)
+        return offset
+
+    def fork(self) -> 'NodeStore':
+        '''
+        Copy of the store with new views, for an independent branch of a system. Arrays are copied (a memory copy),
+        policies and inflow data are shared (they are replaced, not modified, by node updates), generators are
+        copied (some hold state) and random streams are left empty (to be restored from a snapshot).
+        '''
+        forked = NodeStore(0)
+        forked.size, forked.names = self.size, list(self.names)
+        for attribute in ['tags', 'capacity', 'factor', 'storage', 'initial', 'spill', 'release', 'indptr', 'indices']:
+            setattr(forked, attribute, getattr(self, attribute).copy())
+        forked._added, forked._removed = {i: list(s) for i, s in self._added.items()}, set(self._removed)
+        forked.policies, forked.data = dict(self.policies), dict(self.data)
+        forked.generators = {i: {season: copy.copy(g) for season, g in genies.items()} for i, genies in self.generators.items()}
+        forked.rngs = {i: {} for i in self.rngs}
+        for i, view in enumerate(self.views):
+            cls = type(view).__bases__[0] if getattr(type(view), '_instrumented', False) else type(view)
+            new = object.__new__(cls)
+            new._store, new._index = forked, i
+            forked.views.append(new)
+        return forked
+
+    def nbytes(self) -> int:
+        '''Bytes used by the typed arrays.'''
+        return sum(a.nbytes for a in [self.tags, self.capacity, self.factor, self.storage, self.initial, self.spill, self.release, self.indptr, self.indices])
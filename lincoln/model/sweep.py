@@ -0,0 +1,161 @@
+'''
+Parameter sweeps: ensemble summaries (see: analytics.Summary) of many variants of one system.
+
+The configuration file is parsed, validated and compiled once. Each variant only swaps parameter vectors into a
+copy of the compiled BatchSystem (the network, order and policies are shared), so a variant costs its simulation,
+not a rebuild. A variant is a dictionary of "node.parameter" keys:
+
+    {'lincoln_dam.capacity': 20, 'lincoln_dam.initial': 5, 'inflow.parameters': [[2, 14]]}
+
+where capacity is a storage (or outflow) node parameter, initial a storage node parameter, factor a transfer node
+parameter and parameters is the list of (per season) generator parameters of an inflow node. Results are cached by a hash of the variant's full parameter vectors and the
+simulation settings, in memory and (optionally) as files in a cache directory, so repeated or overlapping sweeps
+only simulate the variants they have not seen (even if they were named differently, ex: the base capacity).
+'''
+
+import os
+import json
+import pickle
+import hashlib
+import itertools
+import numpy as np
+
+from pathlib import Path
+from dataclasses import dataclass, field, replace
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Union
+
+from lincoln.model import system, analytics
+from lincoln.model.node import Tag, InflowNode, StorageNode, TransferNode, OutflowNode
+from lincoln.model.policies import Policy, CallablePolicy
+from lincoln.model.ensemble import BatchSystem
+from lincoln.model.analytics import Summary
+from lincoln.utilities import exception_handler, atomic_write
+
+PARAMETERS = {'capacity': [Tag.storage, Tag.outflow], 'initial': [Tag.storage], 'factor': [Tag.transfer], 'parameters': [Tag.inflow]}
+'''Parameters that can be swept, and the types of node they belong to.'''
+
+class SweepError(Exception):
+    pass
+
+@dataclass
+class Sweep:
+    data: Dict[str, Any]
+    '''Configuration file data, the base system (workers compile it once each).'''
+    batch: BatchSystem
+    seasons: List[str]
+    runs: int
+    seed: int
+    demand: Optional[Dict[str, float]] = None
+    release: Optional[Union[float, Dict[str, float]]] = None
+    directory: Optional[Path] = None
+    '''Directory to cache results in, results are only cached in memory if None.'''
+    cache: Dict[str, Summary] = field(default_factory=lambda: {}, repr=False)
+    simulated: int = 0
+    '''Number of variants simulated (not found in the cache).'''
+
+    @staticmethod
+    def compile(data: Dict[str, Any], seasons: List[str], runs: int, seed: int, demand: Optional[Dict[str, float]] = None,
+                release: Optional[Union[float, Dict[str, float]]] = None, directory: Optional[Path] = None) -> 'Sweep':
+        '''Builds and validates the system once, for all the variants.'''
+        if directory is not None:
+            directory.mkdir(parents=True, exist_ok=True)
+        return Sweep(data, BatchSystem.compile(system.factory(data)), seasons, runs, seed, demand, release, directory)
+
+    @exception_handler(SweepError, 15)
+    def apply(self, variant: Dict[str, Any]) -> BatchSystem:
+        '''Copy of the compiled system, with the variant's parameters swapped in.'''
+        capacity, initial, factor, inflows = self.batch.capacity.copy(), self.batch.initial.copy(), self.batch.factor.copy(), dict(self.batch.inflows)
+        for key, value in variant.items():
+            name, _, parameter = key.rpartition('.')
+            if name not in self.batch.names or parameter not in PARAMETERS:
+                raise SweepError(f'The sweep parameter: {key} must be a node name and one of: {list(PARAMETERS)}, ex: lincoln_dam.capacity.')
+            i = self.batch.names.index(name)
+            if self.batch.tags[i] not in PARAMETERS[parameter]:
+                raise SweepError(f'The sweep parameter: {key} only applies to {" or ".join(tag.value for tag in PARAMETERS[parameter])} nodes, {name} is a {self.batch.tags[i].value} node.')
+            if parameter == 'parameters':
+                inflows[i] = {**inflows[i], 'parameters': value}
+            else:
+                {'capacity': capacity, 'initial': initial, 'factor': factor}[parameter][i] = value
+        # the node validation, without building nodes.
+        for i in np.flatnonzero(factor != self.batch.factor):
+            TransferNode.validate_data({'factor': factor[i]})
+        for i in np.flatnonzero((capacity != self.batch.capacity) | (initial != self.batch.initial)):
+            if self.batch.tags[i] == Tag.outflow:
+                OutflowNode.validate_data({'capacity': capacity[i]})
+                continue
+            StorageNode.validate_data({'initial': initial[i], 'capacity': capacity[i]})
+            if initial[i] > capacity[i]:
+                raise SweepError(f'The {self.batch.names[i]} initial storage: {initial[i]} is larger than its capacity: {capacity[i]}.')
+        for i in inflows:
+            if inflows[i] is not self.batch.inflows[i]:
+                InflowNode.validate_data(inflows[i])
+                InflowNode._build_generators(inflows[i])
+        return replace(self.batch, capacity=capacity, initial=initial, factor=factor, inflows=inflows)
+
+    def key(self, batch: BatchSystem) -> str:
+        '''Hash of everything that determines a variant's summary.'''
+        content = dict(names=batch.names, senders=[s.tolist() for s in batch.senders], policies={i: _policy_key(p) for i, p in batch.policies.items()},
+                       capacity=batch.capacity.tolist(), initial=batch.initial.tolist(), factor=batch.factor.tolist(), inflows=batch.inflows, seasons=self.seasons,
+                       runs=self.runs, seed=self.seed, demand=self.demand, release=self.release)
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+    def run(self, variants: List[Dict[str, Any]], workers: Optional[int] = None) -> List[Summary]:
+        '''Summarizes each variant (in order), only simulating the variants that are not cached (workers: one per cpu if None).'''
+        batches = [self.apply(variant) for variant in variants]
+        keys = [self.key(batch) for batch in batches]
+        # each distinct variant is simulated once, even if it appears several times.
+        missing = {k: (variant, batch) for k, variant, batch in zip(keys, variants, batches) if self.lookup(k) is None}
+        if missing:
+            if workers == 1:
+                results = [self.summarize(batch) for _, batch in missing.values()]
+            else:
+                workers = workers if workers else os.cpu_count() or 1
+                # variants (not compiled systems) are sent to the workers, which each compile the system once.
+                with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker, initargs=(self.data, self.seasons, self.runs, self.seed, self.demand, self.release)) as pool:
+                    results = list(pool.map(_summarize, [variant for variant, _ in missing.values()], chunksize=max(1, len(missing) // (workers * 4))))
+            for k, summary in zip(missing, results):
+                self.store(k, summary)
+            self.simulated += len(missing)
+        return [self.cache[k] for k in keys]
+
+    def summarize(self, batch: BatchSystem) -> Summary:
+        '''Simulates a variant of the system (see: Sweep.apply), without the cache.'''
+        return analytics.summarize_block(batch, self.seasons, self.runs, self.seed, self.demand, self.release)
+
+    def lookup(self, key: str) -> Optional[Summary]:
+        if key not in self.cache and self.directory is not None:
+            try:
+                with self.directory.joinpath(key).open('rb') as f:
+                    self.cache[key] = pickle.load(f)
+            # a missing or unreadable result is simulated again.
+            except Exception:
+                return None
+        return self.cache.get(key)
+
+    def store(self, key: str, summary: Summary) -> None:
+        self.cache[key] = summary
+        if self.directory is not None:
+            # overlapping sweeps never read a partial result.
+            atomic_write(self.directory.joinpath(key), pickle.dumps(summary, protocol=pickle.HIGHEST_PROTOCOL))
+
+def _policy_key(policy: Policy) -> Any:
+    '''The policy's configuration data, the same in every process (a repr can hold memory addresses).'''
+    if isinstance(policy, CallablePolicy) and not policy.path:
+        # a function that was not imported by path can only be identified within this process.
+        return repr(policy)
+    return policy.serialize()
+
+def grid(values: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    '''Every combination of the parameter values, ex: {'dam.capacity': [10, 20], 'dam.initial': [0, 5]} -> 4 variants.'''
+    return [dict(zip(values, combination)) for combination in itertools.product(*values.values())]
+
+_SWEEP: Optional[Sweep] = None
+'''The worker process' compiled system.'''
+
+def _start_worker(data: Dict[str, Any], seasons: List[str], runs: int, seed: int, demand, release) -> None:
+    global _SWEEP
+    _SWEEP = Sweep.compile(data, seasons, runs, seed, demand, release)
+
+def _summarize(variant: Dict[str, Any]) -> Summary:
+    return _SWEEP.summarize(_SWEEP.apply(variant))
@@ -2,118 +2,458 @@
 System of nodes.
 '''
 
+import numpy as np
+
+from collections import deque
 from dataclasses import dataclass, field
-from typing import List, Dict, Any
+from typing import List, Dict, Tuple, Callable, Optional, Any
 
 from lincoln.utilities import exception_handler
-from lincoln.model import node
+from lincoln.model import node, snapshot, validator
 from lincoln.model.node import Node
+from lincoln.model.store import NodeStore
+from lincoln.model.instrument import Profiler
+from lincoln.model.snapshot import Snapshot, SnapshotError
 
 class SystemValidationError(Exception):
     pass
     
 @dataclass
 class Network:
-    '''Describes direction of flow between system nodes.'''
+    '''Describes direction of flow between system nodes, stored in compressed sparse row (CSR) form.'''
     names: List[str]
     '''Node names in order their data appears as row or columns in matrix.'''
-    matrix: List[List[str]]
-    '''A square mxm matrix that describes the connection between system nodes. Entry is 1 if matrix row node is connected to matrix column node, 0 otherwise.'''
- 
+    indptr: np.ndarray
+    '''Row pointers, the receivers of node i are: indices[indptr[i]:indptr[i + 1]].'''
+    indices: np.ndarray
+    '''Receiving node indices, grouped by sending node.'''
+
+    @property
+    def matrix(self) -> List[List[int]]:
+        '''A square mxm matrix that describes the connection between system nodes. Entry is 1 if matrix row node is connected to matrix column node, 0 otherwise.'''
+        matrix = [[0] * len(self.names) for _ in self.names]
+        for row, col in self.pairs():
+            matrix[row][col] = 1
+        return matrix
+    @property
+    def edges(self) -> List[Tuple[str, str]]:
+        '''(sender, receiver) node name pairs.'''
+        return [(self.names[row], self.names[col]) for row, col in self.pairs()]
+
+    def pairs(self) -> List[Tuple[int, int]]:
+        '''(sender, receiver) node index pairs.'''
+        indptr, indices = self.indptr.tolist(), self.indices.tolist()
+        return [(row, col) for row in range(0, len(self.names)) for col in indices[indptr[row]:indptr[row + 1]]]
+
+    def add_node(self, name: str) -> int:
+        self.names.append(name)
+        self.indptr = np.append(self.indptr, self.indptr[-1])
+        return len(self.names) - 1
+    def remove_node(self, i: int) -> None:
+        '''Removes a node without connections, renumbering the nodes after it.'''
+        self.names.pop(i)
+        self.indptr = np.delete(self.indptr, i + 1)
+        self.indices = np.where(self.indices > i, self.indices - 1, self.indices)
+    def add_edge(self, row: int, col: int) -> None:
+        self.indices = np.insert(self.indices, self.indptr[row + 1], col)
+        self.indptr[row + 1:] += 1
+    def remove_edge(self, row: int, col: int) -> None:
+        start = self.indptr[row]
+        self.indices = np.delete(self.indices, start + self.indices[start:self.indptr[row + 1]].tolist().index(col))
+        self.indptr[row + 1:] -= 1
+
+    @staticmethod
+    def load(data: Dict[str, Any]) -> 'Network':
+        '''Builds the network from the configuration file "system" data, using its "edges" list or dense "matrix".'''
+        if 'edges' in data:
+            return Network.from_edges(data['node_order'], data['edges'])
+        return Network.from_matrix(data['node_order'], data['matrix'])
+    @staticmethod
+    def from_matrix(names: List[str], matrix: List[List[int]]) -> 'Network':
+        rows, cols = [], []
+        for row in range(0, len(matrix)):
+            for col, entry in enumerate(matrix[row]):
+                if entry == 1:
+                    rows.append(row)
+                    cols.append(col)
+        return Network._from_pairs(names, rows, cols)
+    @staticmethod
+    def from_edges(names: List[str], edges: List[List[str]]) -> 'Network':
+        ids = {name: i for i, name in enumerate(names)}
+        pairs = dict.fromkeys((ids[sender], ids[receiver]) for sender, receiver in edges) # drops repeated edges.
+        return Network._from_pairs(names, [row for row, _ in pairs], [col for _, col in pairs])
+    @staticmethod
+    def _from_pairs(names: List[str], rows: List[int], cols: List[int]) -> 'Network':
+        rows, cols = np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)
+        order = np.argsort(rows, kind='stable')
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(names)))]).astype(np.intp)
+        return Network(list(names), indptr, cols[order])
+
+@dataclass
+class Plan:
+    '''Network compiled for evaluation: integer node ids, adjacency lists and a topological (upstream to downstream) evaluation order.'''
+    names: List[str]
+    '''Node names, indexed by node id (the node's position in the network).'''
+    ids: Dict[str, int]
+    senders: List[List[int]]
+    '''Ids of the nodes that send flow to each node.'''
+    receivers: List[List[int]]
+    '''Ids of the nodes that receive flow from each node.'''
+    order: List[int]
+    '''Node ids ordered so that every sender is evaluated before its receivers.'''
+    positions: List[int] = field(default_factory=lambda: [])
+    '''Position of each node id in the order.'''
+    version: int = 0
+    '''Edit counter, incremented by every node or edge edit (ex: for views to know when to redraw the network).'''
+
+    def __post_init__(self):
+        if len(self.positions) != len(self.order):
+            self.positions = [0] * len(self.order)
+            for p, i in enumerate(self.order):
+                self.positions[i] = p
+
+    @staticmethod
+    @exception_handler(SystemValidationError, 4)
+    def compile(network: Network) -> 'Plan':
+        m = len(network.names)
+        senders, receivers = [[] for _ in range(0, m)], [[] for _ in range(0, m)]
+        for row, col in network.pairs():
+            senders[col].append(row)
+            receivers[row].append(col)
+        # Kahn's algorithm: O(V + E).
+        indegree = [len(s) for s in senders]
+        queue = deque(i for i in range(0, m) if indegree[i] == 0)
+        order = []
+        while queue:
+            i = queue.popleft()
+            order.append(i)
+            for j in receivers[i]:
+                indegree[j] -= 1
+                if indegree[j] == 0:
+                    queue.append(j)
+        if len(order) != m:
+            cycle = [network.names[i] for i in range(0, m) if indegree[i] > 0]
+            raise SystemValidationError(f'The system network contains a cycle through the nodes: {cycle}, flows can not be ordered from upstream to downstream.')
+        return Plan(list(network.names), {name: i for i, name in enumerate(network.names)}, senders, receivers, order)
+
+    def add_node(self, name: str) -> int:
+        '''Adds an unconnected node (at the end of the order), returns its id.'''
+        i = len(self.names)
+        self.version += 1
+        self.names.append(name)
+        self.ids[name] = i
+        self.senders.append([])
+        self.receivers.append([])
+        self.positions.append(len(self.order))
+        self.order.append(i)
+        return i
+    def remove_node(self, i: int) -> None:
+        '''Removes an unconnected node, renumbering the nodes after it (linear in the size of the plan).'''
+        renumber = lambda ids: [j - 1 if j > i else j for j in ids]
+        self.version += 1
+        self.names.pop(i)
+        self.ids = {name: j for j, name in enumerate(self.names)}
+        self.senders = [renumber(s) for s in self.senders[:i] + self.senders[i + 1:]]
+        self.receivers = [renumber(r) for r in self.receivers[:i] + self.receivers[i + 1:]]
+        self.order = renumber([j for j in self.order if j != i])
+        self.positions = []
+        self.__post_init__()
+
+    def add_edge(self, i: int, j: int) -> None:
+        '''
+        Connects sender i to receiver j, reordering only the nodes between them in the order if needed.
+
+        Uses the Pearce-Kelly dynamic topological sort: if i already precedes j the order is unchanged, otherwise
+        the nodes downstream of j and upstream of i in the region of the order between them are swapped.
+        '''
+        lower, upper = self.positions[j], self.positions[i]
+        if lower <= upper:
+            downstream = self._region(j, self.receivers, lambda k: self.positions[k] <= upper)
+            if i in downstream:
+                raise SystemValidationError(f'Connecting {self.names[i]} to {self.names[j]} creates a cycle, flows can not be ordered from upstream to downstream.')
+            upstream = self._region(i, self.senders, lambda k: self.positions[k] >= lower)
+            nodes = sorted(upstream, key=self.positions.__getitem__) + sorted(downstream, key=self.positions.__getitem__)
+            for k, p in zip(nodes, sorted(self.positions[k] for k in nodes)):
+                self.order[p], self.positions[k] = k, p
+        self.senders[j].append(i)
+        self.receivers[i].append(j)
+        self.version += 1
+    def remove_edge(self, i: int, j: int) -> None:
+        '''Disconnects sender i from receiver j, the order remains valid.'''
+        self.senders[j].remove(i)
+        self.receivers[i].remove(j)
+        self.version += 1
+
+    @staticmethod
+    def _region(i: int, edges: List[List[int]], inside: Callable[[int], bool]) -> List[int]:
+        '''Nodes reached from i through the edges, without leaving the inside of a region of the order.'''
+        found, stack = {i}, [i]
+        while stack:
+            for k in edges[stack.pop()]:
+                if k not in found and inside(k):
+                    found.add(k)
+                    stack.append(k)
+        return list(found)
+
+@dataclass
+class FlowCache:
+    '''Flows sent downstream by each node, keyed by (node name, round). Entries are dropped when the round advances.'''
+    round: int = 0
+    flows: Dict[Tuple[str, int], int] = field(default_factory=lambda: {})
+    last: Dict[str, int] = field(default_factory=lambda: {})
+    '''Flows of the last completed round, by node name (ex: for a view of the round just played).'''
+
+    def __contains__(self, name: str) -> bool:
+        return (name, self.round) in self.flows
+    def __getitem__(self, name: str) -> int:
+        return self.flows[(name, self.round)]
+    def __setitem__(self, name: str, flow: int) -> None:
+        self.flows[(name, self.round)] = flow
+
+    def discard(self, name: str) -> None:
+        self.flows.pop((name, self.round), None)
+    def advance(self) -> None:
+        self.last = {name: flow for (name, _), flow in self.flows.items()}
+        self.round += 1
+        self.flows = {}
+
 @dataclass
 class System:
     network: Network
     nodes: Dict[str, Node] = field(default_factory=lambda: {})
+    plan: Plan = None
+    '''Compiled evaluation order, set by the system.factory.'''
+    cache: FlowCache = field(default_factory=FlowCache)
+    '''Flows computed in the current round, each node is evaluated (and updates its storage) once per round.'''
+    profiler: Optional[Profiler] = None
+    '''Per node instrumentation, None unless enabled by System.profile.'''
+    store: Optional[NodeStore] = None
+    '''Node state arrays, the nodes are views into the store (index = plan id), set by the system.factory.'''
+    _shared: bool = field(default=False, repr=False)
+    '''True if the network and plan are shared with the system this one was forked from (copied before any edit).'''
+
+    @property
+    def round(self) -> int:
+        '''Index of the current (not yet completed) round.'''
+        return self.cache.round
+
+    def seed(self, seed: Optional[int], run: int = 0) -> None:
+        '''Seeds the inflow node random streams for a single run, so the run can be reproduced (seed=None for fresh, unreproducible, streams).'''
+        for i, name in enumerate(self.network.names):
+            if self.nodes[name].tag == node.Tag.inflow:
+                self.nodes[name].seed(seed, run, i)
+
+    def snapshot(self) -> Snapshot:
+        '''Captures the storages, round, flows computed this round (and in the last completed round) and inflow stream states.'''
+        m, store = self.store.size, self.store
+        flow, last = np.full(m, np.nan), np.full(m, np.nan)
+        for i, name in enumerate(self.plan.names):
+            if name in self.cache:
+                flow[i] = self.cache[name]
+            if name in self.cache.last:
+                last[i] = self.cache.last[name]
+        streams = []
+        for i in sorted(store.rngs):
+            for j, season in enumerate(store.data[i]['seasons']):
+                if season in store.rngs[i]:
+                    streams.append(snapshot.pack_stream(i, j, store.rngs[i][season], getattr(store.generators[i][season], 'state', None)))
+        arrays = [a[:m].copy() for a in [store.storage, store.spill, store.release]] + [flow, last]
+        for a in arrays:
+            a.flags.writeable = False
+        return Snapshot(self.round, snapshot.names_key(self.plan.names), *arrays, np.array(streams, dtype=snapshot.STREAM))
+    @exception_handler(SnapshotError, 12)
+    def restore(self, state: Snapshot) -> None:
+        '''Returns the system to a snapshot taken from a system with the same nodes.'''
+        m, store = self.store.size, self.store
+        if state.key != snapshot.names_key(self.plan.names) or len(state.storage) != m:
+            raise SnapshotError('The snapshot was taken from a system with different nodes.')
+        store.storage[:m], store.spill[:m], store.release[:m] = state.storage, state.spill, state.release
+        self.cache = FlowCache(state.round, last={self.plan.names[i]: state.last[i].item() for i in np.flatnonzero(~np.isnan(state.last))})
+        for i in np.flatnonzero(~np.isnan(state.flow)):
+            self.cache[self.plan.names[i]] = state.flow[i].item()
+        for record in state.streams:
+            i = int(record['node'])
+            season = store.data[i]['seasons'][int(record['season'])]
+            store.rngs[i][season] = snapshot.unpack_stream(record)
+            if not np.isnan(record['generator']):
+                store.generators[i][season].state = record['generator'].item()
+    def fork(self, state: Optional[Snapshot] = None) -> 'System':
+        '''
+        New, independent, system in the state of the snapshot (the current state by default).
+        
+        Only the node state (arrays, views and generators) is copied. The network and plan are shared until
+        either system is edited, so many branches can be forked cheaply from one snapshot. Branches continue
+        the same random streams, reseed them (ex: branch.seed(seed, run=k)) for independent inflows.
+        '''
+        state = self.snapshot() if state is None else state
+        store = self.store.fork()
+        forked = System(self.network, {name: store.views[self.plan.ids[name]] for name in self.nodes}, self.plan, store=store, _shared=True)
+        store.system = forked
+        self._shared = True
+        forked.restore(state)
+        return forked
+    def _own(self) -> None:
+        '''Copies the network and plan before editing them, if they are shared with a fork.'''
+        if self._shared:
+            self.network = Network(list(self.network.names), self.network.indptr.copy(), self.network.indices.copy())
+            plan = self.plan
+            self.plan = Plan(list(plan.names), dict(plan.ids), [list(s) for s in plan.senders], [list(r) for r in plan.receivers], list(plan.order), list(plan.positions), plan.version)
+            self._shared = False
 
-    @staticmethod
     @exception_handler(SystemValidationError, 4)
-    def validate_keys(data: Dict[str, Any]):
-        keys = ['node', 'system', 'node_order', 'matrix']
-        for i in range(0, 2):
-            if keys[i] not in data:
-                raise SystemValidationError(f'The configuration file data is missing the required: \"{keys[i]}\" key.')
-        for i in range(2, len(keys)):
-            if keys[i] not in data[keys[1]]:
-                raise SystemValidationError(f'The configuration file \"system\" data is missing the required: \"{keys[i]}\" key.')
-    
-    @staticmethod
+    def add_node(self, name: str, data: Dict[str, Any]) -> Node:
+        '''Adds an unconnected node, built from node configuration data (ex: {'tag': 'outlet'}).'''
+        if name in self.plan.ids:
+            raise SystemValidationError(f'The system already contains a {name} node.')
+        if data.get('tag') not in [tag.value for tag in node.Tag]:
+            raise SystemValidationError(f'The {name} node tag: {data.get("tag")} must be one of: {[tag.value for tag in node.Tag]}.')
+        self._own()
+        new_node = node.build(name, data, self.store)
+        self.network.add_node(name)
+        self.plan.add_node(name)
+        self.nodes[name] = new_node
+        if self.profiler is not None:
+            self.profiler.attach(name, new_node)
+        return new_node
     @exception_handler(SystemValidationError, 4)
-    def validate_data(data: Dict[str, Any]) -> None:
-        #l = [len(self.matrix)] + [len(self.matrix[i]) for i in range(0, len(self.matrix))] + [len(self.names)]
-        if len(set([len(data['system']['matrix'])] + [len(data['system']['matrix'][i]) for i in range(0, len(data['system']['matrix']))] + [len(data['system']['node_order'])])) != 1:
-            raise SystemValidationError(f'The system network matrix in the configuration file data must be square (i.e. mxm), with m cooresponding to the number of nodes named in the \"node_order\" data. The current matrix contains: {len(data["system"]["matrix"])} rows, with {[len(data["system"]["matrix"][i]) for i in range(0, len(data["system"]["matrix"]))]} entries in each row. {len(data["system"]["node_order"])} nodes are identified in the \"node_order\" data.')
+    def remove_node(self, name: str) -> Node:
+        '''Removes a node and its connections, returns the (now stand alone) node. Renumbers the nodes after it.'''
+        if name not in self.plan.ids:
+            raise SystemValidationError(f'The system does not contain a {name} node.')
+        i = self.plan.ids[name]
+        for j in list(self.plan.senders[i]):
+            self.remove_edge(self.plan.names[j], name)
+        for j in list(self.plan.receivers[i]):
+            self.remove_edge(name, self.plan.names[j])
+        removed = self.nodes.pop(name)
+        Profiler.detach(removed)
+        self._own()
+        self.network.remove_node(i)
+        self.plan.remove_node(i)
+        self.store.remove(i)
+        self.cache.discard(name)
+        return removed
 
-    @staticmethod
-    @exception_handler(SystemValidationError, 4)    
-    def validate_nodes(data: Dict[str, Any]):
-        node_names = data['system']['node_order']
-        for name in node_names:
-            if name not in data['node']:
-                raise SystemValidationError(f'The {name} node is named in the configuration file \"system\" \"node_order\" data but is not found in the configuration file \"node\" data.')
-        for name in data['node']:
-            if name not in node_names:
-                raise SystemValidationError(f'The configuration file \"node\" data contains a {name} node that is not named in the configuration file \"system\" \"node_order\" data.')
-
-    # def diagram(self):
-    #     layers = []
-    #     is_top_layer: bool = True
-    #     is_not_finished: bool = False
-    #     while is_not_finished:
-    #         current_layer = []
-    #         if is_top_layer:
-    #             current_layer = [k for k, v in self.nodes.items() if v.tag == node.Tag.inflow]
-    #         else:
-    #             last_layer = layers[-1]
-    #             for k, v in self.nodes.items():
-    #                 for i in v.#senders.
-    #                     if i in last_layer
-    #             current_layer = [k for k, v in self.nodes.items() if ]
-
-def factory(data: Dict[str, Any]):
-    #TODO: #3 A recursive solution system node generation would be better.
-    senders = {}
+    @exception_handler(SystemValidationError, 4)
+    def add_edge(self, sender: str, receiver: str) -> None:
+        '''
+        Connects the sender to the receiver. Only the part of the evaluation order between the two nodes is reordered,
+        flows already computed this round are kept (each node is still evaluated once per round).
+        '''
+        i, j = self._ids(sender, receiver)
+        if j in self.plan.receivers[i]:
+            return
+        if self.nodes[receiver].tag == node.Tag.inflow:
+            raise SystemValidationError(f'The {receiver} inflow node can not receive flow from {sender}.')
+        self._own()
+        self.plan.add_edge(i, j)
+        self.network.add_edge(i, j)
+        self.store.add_sender(j, i)
+    @exception_handler(SystemValidationError, 4)
+    def remove_edge(self, sender: str, receiver: str) -> None:
+        i, j = self._ids(sender, receiver)
+        if j not in self.plan.receivers[i]:
+            raise SystemValidationError(f'The {sender} node does not send flow to the {receiver} node.')
+        self._own()
+        self.plan.remove_edge(i, j)
+        self.network.remove_edge(i, j)
+        self.store.remove_sender(j, i)
+    @exception_handler(SystemValidationError, 4)
+    def update_node(self, name: str, **changes) -> None:
+        '''Changes node parameters (ex: system.update_node('dam', capacity=20, policy={'type': 'fixed', 'release': 2})).'''
+        self._ids(name)
+        self.nodes[name].update(changes)
+
+    def _ids(self, *names: str) -> List[int]:
+        for name in names:
+            if name not in self.plan.ids:
+                raise SystemValidationError(f'The system does not contain a {name} node.')
+        return [self.plan.ids[name] for name in names]
+
+    def profile(self, enable: bool = True) -> None:
+        '''Enables (restarting the counters) or disables per node timing, call count and flow instrumentation.'''
+        for v in self.nodes.values():
+            Profiler.detach(v)
+        self.profiler = Profiler() if enable else None
+        if enable:
+            for k, v in self.nodes.items():
+                self.profiler.attach(k, v)
+    def profile_table(self) -> List[Dict[str, Any]]:
+        '''One row of instrumentation counters per node, empty if profiling is not enabled.'''
+        return self.profiler.table() if self.profiler is not None else []
+
+    def step(self, season: str = '') -> Dict[str, int]:
+        '''
+        Completes the current round and advances to the next, returns the flow leaving the system at each outlet node.
+        
+        Nodes are evaluated in a single upstream to downstream pass over the compiled plan (no recursion),
+        nodes already evaluated this round by System.request are not evaluated again.
+        '''
+        for i in self.plan.order:
+            self._evaluate(i, season)
+        outflows = {name: self.cache[name] for name, v in self.nodes.items() if v.tag == node.Tag.outlet}
+        self.cache.advance()
+        return outflows
+
+    def request(self, name: str, season: str = '') -> int:
+        '''Returns the flow sent downstream by a node in the current round, evaluating only the nodes upstream of it.'''
+        for i in self._upstream(self.plan.ids[name]):
+            self._evaluate(i, season)
+        return self.cache[name]
+
+    def _evaluate(self, i: int, season: str) -> None:
+        names = self.plan.names
+        if names[i] not in self.cache:
+            self.cache[names[i]] = self.nodes[names[i]].route(sum(self.cache[names[j]] for j in self.plan.senders[i]), season)
+
+    def _upstream(self, i: int) -> List[int]:
+        '''Ids of node i and every node upstream of it, senders first (iterative post-order depth first search).'''
+        order, visited, stack = [], {i}, [(i, iter(self.plan.senders[i]))]
+        while stack:
+            j, senders = stack[-1]
+            k = next(senders, None)
+            if k is None:
+                order.append(stack.pop()[0])
+            elif k not in visited:
+                visited.add(k)
+                stack.append((k, iter(self.plan.senders[k])))
+        return order
+
+    def diagram(self) -> List[List[str]]:
+        '''
+        Node names in layers, for drawing the network: each node is one layer below its lowest sender (the longest
+        path from an inflow node), so flow always runs down the layers. One pass over the evaluation order, O(V + E).
+        '''
+        layer = [0] * len(self.plan.names)
+        for i in self.plan.order:
+            layer[i] = max((layer[j] + 1 for j in self.plan.senders[i]), default=0)
+        layers: List[List[str]] = [[] for _ in range(0, max(layer, default=-1) + 1)]
+        for i in self.plan.order:
+            layers[layer[i]].append(self.plan.names[i])
+        return layers
+
+def factory(data: Dict[str, Any]) -> System:
+    '''Builds the system nodes in evaluation order, connecting each node to its (already built) senders.'''
     validate(data)
-    system = System(Network(data['system']['node_order'], data['system']['matrix']))
-    while len(system.nodes) != len(system.network.names):
-        new_layer = _add_layer(system, senders, data)
-        system.nodes.update(new_layer)
-        senders = new_layer
+    system = System(Network.load(data['system']))
+    system.plan = Plan.compile(system.network)
+    names = system.plan.names
+    # one node store for the system, built in network order so store indices are plan ids.
+    system.store = NodeStore(len(names))
+    for name in names:
+        node.build(name, data['node'][name], system.store)
+    system.store.set_senders(system.plan.senders)
+    system.store.system = system
+    system.nodes = {names[i]: system.store.views[i] for i in system.plan.order}
     return system
 
+@exception_handler(SystemValidationError, 4)
 def validate(data: Dict[str, Any]) -> None:
-    System.validate_keys(data)
-    System.validate_data(data)
-    System.validate_nodes(data)
-
-def _add_layer(system: System, senders: Dict[str, Node], data: Dict[str, Any]) -> Dict[str, Node]:
-    return _add_receiver_nodes(system, senders, data) if senders else _add_inflow_nodes(system, data)
-
-def _add_inflow_nodes(system: System, data: Dict[str, Any]) -> Dict[str, Node]:
-    recievers = [sum([system.network.matrix[row][col] for row in range(0, len(system.network.matrix))]) for col in range(0, len(system.network.matrix[0]))]
-    return {system.network.names[i]: node.factory(**data['node'][system.network.names[i]]) for i in range(0, len(recievers)) if recievers[i] == 0}
-
-def _add_receiver_nodes(system: System, senders: Dict[str, Node], data: Dict[str, Any]):
-    new_nodes = {}
-    for k, v in senders.items():                                    # iterate through last layer
-        row = system.network.matrix[system.network.names.index(k)]  # row of sender node name
-        for col in range(0, len(row)):      
-            if row[col] == 1:               # sender-receiver entry
-                node_name = system.network.names[col]              # receiver node name
-                if node_name in system.nodes:                      # node already added
-                    # this is ugly.
-                    system.nodes[node_name].add_sender({k: v})
-                else:                                              # new node
-                    if node_name not in new_nodes:
-                        new_nodes[node_name] = node.factory(**data['node'][node_name])
-                    new_nodes[node_name].add_sender({k: v})
-                    # if node_name in new_nodes:                     # existing new node
-                    #     new_nodes[node_name].add_sender({k: v})
-                    # else:                                          # add node to new list
-                    #     #data['node'][node_name]['senders'] = [k]
-                    #     new_nodes[node_name] = node.factory(**data['node'][node_name])                     
-    return new_nodes
+    '''Raises a SystemValidationError listing every problem found in the configuration file data.'''
+    problems = validator.check(data)
+    if problems:
+        raise SystemValidationError('\n'.join(problems))
 
-        
 # def identify_inflows(node_names: List[str], matrix: List[List[int]]) -> List[str]:
 #     '''
 #     Identifies columns in matrix, that receive no inflows (and therefore are inflow nodes).
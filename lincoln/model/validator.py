@@ -0,0 +1,133 @@
+'''
+Single pass validation of the configuration file system data.
+
+Every problem is collected (rather than exiting on the first one), in time linear in the number of nodes and
+network connections (matrix entries for a dense matrix), so large configurations validate quickly and a bad
+network (e.g. with a cycle) is reported instead of being built.
+'''
+
+from collections import deque
+from typing import List, Dict, Any
+
+from lincoln.model.node import Tag
+
+def check(data: Dict[str, Any]) -> List[str]:
+    '''
+    Returns a description of each problem in the configuration file data, an empty list if it is valid.
+
+    Checks the required keys, that the "node_order" names agree with the "node" data, the network shape,
+    the node tags, that no node sends flow to an inflow node or receives flow from an outlet node,
+    that the network has no cycles, that every node is reachable from an inflow node and that every path
+    ends at an outlet node. The network checks are skipped if the names or shape are not valid.
+    '''
+    for key in ['node', 'system']:
+        if key not in data:
+            return [f'The configuration file data is missing the required: \"{key}\" key.']
+    if 'node_order' not in data['system']:
+        return ['The configuration file \"system\" data is missing the required: \"node_order\" key.']
+    if 'matrix' not in data['system'] and 'edges' not in data['system']:
+        return ['The configuration file \"system\" data must contain a network \"matrix\" or \"edges\" key.']
+    problems = []
+    names = data['system']['node_order']
+    ids: Dict[str, int] = {}
+    for i, name in enumerate(names):
+        if name in ids:
+            problems.append(f'The {name} node is named more than once in the configuration file \"system\" \"node_order\" data.')
+        ids.setdefault(name, i)
+        if name not in data['node']:
+            problems.append(f'The {name} node is named in the configuration file \"system\" \"node_order\" data but is not found in the configuration file \"node\" data.')
+    for name in data['node']:
+        if name not in ids:
+            problems.append(f'The configuration file \"node\" data contains a {name} node that is not named in the configuration file \"system\" \"node_order\" data.')
+    receivers = _receivers(data['system'], names, ids, problems)
+    if problems:
+        return problems
+    tags = [data['node'][name].get('tag') for name in names]
+    return _tags(names, tags, receivers) + _cycles(names, receivers) + _reachability(names, tags, receivers)
+
+def _receivers(system: Dict[str, Any], names: List[str], ids: Dict[str, int], problems: List[str]) -> List[List[int]]:
+    '''Receiving node indices of each node, appends any shape or name problems.'''
+    m = len(names)
+    receivers: List[List[int]] = [[] for _ in range(0, m)]
+    if 'edges' in system:
+        for edge in system['edges']:
+            if len(edge) != 2 or edge[0] not in ids or edge[1] not in ids:
+                problems.append(f'The system network edge: {edge} in the configuration file data must be a [sender, receiver] pair of nodes named in the \"node_order\" data.')
+            else:
+                receivers[ids[edge[0]]].append(ids[edge[1]])
+        return receivers
+    matrix = system['matrix']
+    if len(matrix) != m:
+        problems.append(f'The system network matrix in the configuration file data contains: {len(matrix)} rows, it must have one row for each of the {m} nodes named in the \"node_order\" data.')
+    for row, entries in enumerate(matrix):
+        if len(entries) != m:
+            problems.append(f'Row {row} of the system network matrix in the configuration file data contains: {len(entries)} entries, it must have one entry for each of the {m} nodes named in the \"node_order\" data.')
+        elif row < m:
+            for col, entry in enumerate(entries):
+                if entry == 1:
+                    receivers[row].append(col)
+                elif entry != 0:
+                    problems.append(f'The system network matrix entry: {entry} in row {row}, column {col} of the configuration file data must be 0 or 1.')
+    return receivers
+
+def _tags(names: List[str], tags: List[Any], receivers: List[List[int]]) -> List[str]:
+    '''Unknown node tags, connections into inflow nodes and connections out of outlet nodes.'''
+    problems, known = [], [t.value for t in Tag]
+    for name, tag in zip(names, tags):
+        if tag not in known:
+            problems.append(f'The {name} node tag: {tag} in the configuration file data must be one of: {known}.')
+    for i, r in enumerate(receivers):
+        if tags[i] == Tag.outlet.value and r:
+            problems.append(f'The {names[i]} outlet node sends flow to the nodes: {[names[j] for j in r]}, outlet nodes must be the downstream most nodes.')
+        for j in r:
+            if tags[j] == Tag.inflow.value:
+                problems.append(f'The {names[j]} inflow node receives flow from the {names[i]} node, inflow nodes must be the upstream most nodes.')
+    return problems
+
+def _cycles(names: List[str], receivers: List[List[int]]) -> List[str]:
+    '''Kahn's algorithm, nodes never released from the queue are in (or downstream of) a cycle.'''
+    indegree = [0] * len(names)
+    for r in receivers:
+        for j in r:
+            indegree[j] += 1
+    queue, visited = deque(i for i in range(0, len(names)) if indegree[i] == 0), 0
+    while queue:
+        i = queue.popleft()
+        visited += 1
+        for j in receivers[i]:
+            indegree[j] -= 1
+            if indegree[j] == 0:
+                queue.append(j)
+    if visited == len(names):
+        return []
+    return [f'The system network contains a cycle, flow can not be routed through nodes: {[names[i] for i in range(0, len(names)) if indegree[i] > 0]}.']
+
+def _reachability(names: List[str], tags: List[Any], receivers: List[List[int]]) -> List[str]:
+    '''Nodes that no inflow node sends flow to, and nodes that do not send flow to an outlet node.'''
+    senders: List[List[int]] = [[] for _ in range(0, len(names))]
+    for i, r in enumerate(receivers):
+        for j in r:
+            senders[j].append(i)
+    problems = []
+    downstream = _search([i for i, tag in enumerate(tags) if tag == 'inflow'], receivers)
+    upstream = _search([i for i, tag in enumerate(tags) if tag == 'outlet'], senders)
+    unreached = [names[i] for i in range(0, len(names)) if not downstream[i]]
+    if unreached:
+        problems.append(f'The nodes: {unreached} do not receive flow from any inflow node.')
+    stranded = [names[i] for i in range(0, len(names)) if not upstream[i]]
+    if stranded:
+        problems.append(f'The nodes: {stranded} do not send flow to any outlet node.')
+    return problems
+
+def _search(sources: List[int], edges: List[List[int]]) -> List[bool]:
+    '''Breadth first search, returns True for each node reached from the sources.'''
+    reached = [False] * len(edges)
+    for i in sources:
+        reached[i] = True
+    queue = deque(sources)
+    while queue:
+        for j in edges[queue.popleft()]:
+            if not reached[j]:
+                reached[j] = True
+                queue.append(j)
+    return reached
@@ -1,7 +1,6 @@
 '''Basic utilities used thoughout the application'''
-import typer
-from rich import print
-
+import os
+from pathlib import Path
 from functools import wraps
 
 def exception_handler(exception: Exception, exit_code: int = 1):
@@ -26,8 +25,25 @@ def exception_handler(exception: Exception, exit_code: int = 1):
             try: # try to run funcion without exception
                 return f(*args, **kwargs)
             except exception as e: # raised exception    
+                # imported here, so modules using the annotation (e.g. the model) do not import the cli libraries.
+                import typer
+                from rich import print
                 print(f'[bold red]{type(e).__name__}:[/bold red] {str(e)}') # should print exception and message
                 raise typer.Exit(code=exit_code)
         return wrapper
     return decorator
+
+def atomic_write(path: Path, data: bytes) -> None:
+    '''
+    Writes the file through a temporary file and os.replace, which is atomic: readers (and resumed games) see the
+    old or the new contents, never a partially written file. The temporary file is named after the process, so
+    processes writing the same path do not overwrite each other's temporary file.
+    '''
+    temporary = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        temporary.write_bytes(data)
+        os.replace(temporary, path)
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
     
@@ -0,0 +1,135 @@
+'''
+Live terminal dashboard of a system: the network diagram (see: System.diagram) and each node's storage, inflow,
+spill, release and outflow in the last completed round.
+
+The dashboard is built to follow fast (headless) runs without slowing them down:
+    - updates are throttled, a call to Dashboard.update between refreshes only checks the clock.
+    - at a refresh, the node values are read from the node store arrays and compared (as arrays) with the values
+      last drawn, and only the rows of the nodes that changed are formatted again.
+    - the diagram is drawn once, and again only if the network is edited.
+    - large systems show at most max_rows nodes (those that changed most recently) and an abbreviated diagram,
+      so drawing the terminal does not grow with the size of the system.
+
+ex:
+    with Dashboard(system) as dashboard:
+        for season in seasons:
+            system.step(season)
+            dashboard.update()
+'''
+
+import time
+import numpy as np
+
+from dataclasses import dataclass, field
+from typing import List, Tuple, Optional, Any
+
+from rich.live import Live
+from rich.panel import Panel
+from rich.table import Table
+from rich.console import Console, Group
+
+from lincoln.model.node import Tag, TAGS
+from lincoln.model.system import System
+
+COLUMNS = ['storage', 'inflow', 'spill', 'release', 'outflow']
+'''Node values shown, one column each.'''
+
+@dataclass
+class Dashboard:
+    system: System
+    fps: float = 4
+    '''Maximum refreshes per second.'''
+    max_rows: int = 40
+    '''Maximum node rows (and diagram layers) shown.'''
+    console: Optional[Console] = None
+    live: Optional[Live] = field(default=None, repr=False)
+    values: Optional[np.ndarray] = field(default=None, repr=False)
+    '''(nodes, COLUMNS) values last drawn, in diagram order.'''
+    rows: List[Tuple[str, ...]] = field(default_factory=lambda: [], repr=False)
+    '''Formatted table row of each node, in diagram order.'''
+    order: List[int] = field(default_factory=lambda: [], repr=False)
+    '''Store index of each row.'''
+    layers: List[int] = field(default_factory=lambda: [], repr=False)
+    types: List[str] = field(default_factory=lambda: [], repr=False)
+    stamps: Optional[np.ndarray] = field(default=None, repr=False)
+    '''Render count at which each row last changed.'''
+    renders: int = 0
+    diagram: Optional[Panel] = field(default=None, repr=False)
+    _plan: Any = field(default=None, repr=False)
+    _version: int = field(default=-1, repr=False)
+    '''Plan edit counter (see: Plan.version) when the layout was drawn.'''
+    _drawn: float = field(default=0.0, repr=False)
+    redrawn: int = 0
+    '''Number of rows formatted (for checking how much work the refreshes did).'''
+
+    def __enter__(self) -> 'Dashboard':
+        self.live = Live(self.render(), console=self.console, auto_refresh=False, transient=False)
+        self.live.__enter__()
+        self._drawn = time.perf_counter()
+        return self
+    def __exit__(self, *exception) -> None:
+        # the final state is always drawn, even if it arrived between refreshes.
+        self.live.update(self.render(), refresh=True)
+        self.live.__exit__(*exception)
+
+    def update(self, force: bool = False) -> bool:
+        '''Refreshes the display if the refresh interval has passed (or force), returns True if it was refreshed.'''
+        now = time.perf_counter()
+        if not force and now - self._drawn < 1 / self.fps:
+            return False
+        self._drawn = now
+        if self.live is not None:
+            self.live.update(self.render(), refresh=True)
+        return True
+
+    def render(self) -> Group:
+        '''The diagram and node table, re-formatting only the rows whose values changed since the last render.'''
+        if self._plan is not self.system.plan or self._version != self.system.plan.version:
+            self._layout()
+        values = self._values()
+        changed = np.flatnonzero((values != self.values).any(axis=1)) if self.values is not None else range(0, len(self.order))
+        names = self.system.plan.names
+        for r in changed:
+            i = self.order[r]
+            self.rows[r] = (str(self.layers[r]), names[i], self.types[r], *[f'{v:g}' for v in values[r]])
+        self.redrawn += len(changed)
+        self.values = values
+        self.renders += 1
+        self.stamps[changed] = self.renders
+        shown = range(0, len(self.rows))
+        if len(self.rows) > self.max_rows:
+            # the most recently changed rows, in diagram order.
+            shown = np.sort(np.argsort(-self.stamps, kind='stable')[:self.max_rows])
+        caption = f'{len(shown)} of {len(self.rows)} nodes, the most recently changed' if len(shown) < len(self.rows) else None
+        table = Table(title=f'round {self.system.round}', caption=caption, expand=False)
+        for i, column in enumerate(['layer', 'node', 'type'] + COLUMNS):
+            table.add_column(column, justify='left' if i < 3 else 'right')
+        for r in shown:
+            table.add_row(*self.rows[r])
+        return Group(self.diagram, table)
+
+    def _layout(self) -> None:
+        '''Orders the rows by diagram layer, and draws the diagram.'''
+        layers, ids = self.system.diagram(), self.system.plan.ids
+        self.order = [ids[name] for layer in layers for name in layer]
+        self.layers = [k for k, layer in enumerate(layers) for _ in layer]
+        self.types = [self.system.nodes[name].tag.value for layer in layers for name in layer]
+        self.rows, self.values, self._plan, self._version = [()] * len(self.order), None, self.system.plan, self.system.plan.version
+        self.stamps = np.zeros(len(self.order), dtype=np.int64)
+        lines = ['  '.join([f'{name} ({self.system.nodes[name].tag.value})' for name in layer[:6]] + ([f'+{len(layer) - 6} more'] if len(layer) > 6 else [])) for layer in layers]
+        if len(lines) > self.max_rows:
+            half = self.max_rows // 2
+            lines = lines[:half] + [f'⋮ {len(lines) - 2 * half} more layers'] + lines[-half:]
+        self.diagram = Panel('\n   ↓\n'.join(lines), title='network', expand=False)
+
+    def _values(self) -> np.ndarray:
+        '''(nodes, COLUMNS) values of the last completed round, in diagram order.'''
+        store, plan, last = self.system.store, self.system.plan, self.system.cache.last
+        outflow = np.array([last.get(name, 0) for name in plan.names], dtype=float)
+        inflow = np.array([outflow[s].sum() if s else 0 for s in plan.senders], dtype=float)
+        # inflow nodes generate their flow.
+        m = len(plan.names)
+        generated = store.tags[:m] == TAGS.index(Tag.inflow)
+        inflow[generated] = outflow[generated]
+        values = np.column_stack([store.storage[:m], inflow, store.spill[:m], store.release[:m], outflow])
+        return values[self.order]
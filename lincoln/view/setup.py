@@ -1,33 +1,260 @@
 '''
 Command Line Interface (CLI) for lincoln dam or watershed game.
+
+Only the modules needed at startup are imported here, the model (numpy) and rich printing are imported by
+the commands that use them, so commands like --version stay fast (see: tests/test_startup.py).
 '''
 import typer
-from rich import print
 
 from pathlib import Path
 # typer uses type hints
-from typing import Optional
+from typing import List, Dict, Optional, Any
 
-from lincoln import __app_name__, __version__
-from lincoln.controller import config, model_control
+from lincoln import __app_name__, __version__, SUCCESS, ERRORS, NOT_IMPLEMENTED_ERROR
+from lincoln.utilities import exception_handler
+from lincoln.controller import config
 
 app = typer.Typer()
 
 def setup(directory: Path, tomlfile: Path = None):
-    data = config.init_app(directory, tomlfile)
-    return model_control.load_system(data)
+    from lincoln.controller import cache
+    return cache.load_system(directory, config.init_config_file(directory, tomlfile))
 
 @app.command()
 def new(directory_location: str = typer.Option(config.DEFAULT_DIRECTORY, '--directory', '-d', help='Target location of game directory.'),
         inputfile_location: str = typer.Option(config.DEFAULT_SYSTEM_FILE, '--input', '-i', help='Game configuration file.')) -> None:
     '''Setup new game.'''
+    from rich import print
+    from lincoln.view.dashboard import Dashboard
+    from lincoln.controller.model_control import SNAPSHOT_FILE, LOG_FILE
     system = setup(Path(directory_location), Path(inputfile_location))
-    print(system)  
+    # a new game does not resume (or log after) the last one.
+    for name in [SNAPSHOT_FILE, LOG_FILE]:
+        Path(directory_location).joinpath(name).unlink(missing_ok=True)
+    print(Dashboard(system).render())
     
 @app.command()
-def existing(directory_location: str = typer.Argument(..., help='Location of existing game directory, containing *.toml, and *.json files.')) -> None:
-    '''Load existing game.'''
-    setup(Path(directory_location))
+def existing(directory_location: str = typer.Argument(..., help='Location of existing game directory, containing *.toml, and *.json files.'),
+             rounds: int = typer.Option(0, '--rounds', '-r', help='Number of rounds to play, the game is saved after each round.')) -> None:
+    '''Load existing game, resuming from the last saved round.'''
+    from rich import print
+    from lincoln.model.node import Tag
+    from lincoln.controller.model_control import Game, LOG_FILE
+    from lincoln.controller.game import Scoreboard
+    from lincoln.controller import cache
+    directory = Path(directory_location)
+    # the [game] data is cached with the system, the configuration file is only read if it changed.
+    system, settings = cache.load_game(directory, config.init_config_file(directory))
+    scoreboard = Scoreboard.deserialize(settings) if settings is not None else None
+    game = Game(directory, config.find_config_file(directory), directory.joinpath(LOG_FILE), system, scoreboard)
+    if game.resume():
+        print(f'resuming at round {game.system.round}')
+    try:
+        for _ in range(0, rounds):
+            t = game.system.round
+            outflows = game.play_round()
+            storages = {k: v.storage for k, v in game.system.nodes.items() if v.tag == Tag.storage}
+            print(f'round {t}: storage {storages}, outflow {outflows}')
+            if game.logged != SUCCESS:
+                typer.secho(f'round {t} was not logged to {game.dbfile}: {ERRORS[game.logged]}.', err=True, fg=typer.colors.RED)
+            if game.scoreboard is not None:
+                print(f'score {game.scoreboard.score:g}, {game.scoreboard.status}')
+                if game.scoreboard.status != 'playing':
+                    break
+    finally:
+        game.close()
+
+@app.command()
+def serve(inputfile_location: str = typer.Option(config.DEFAULT_SYSTEM_FILE, '--input', '-i', help='Game configuration file.'),
+          host: str = typer.Option('127.0.0.1', '--host', help='Address to listen on.'),
+          port: int = typer.Option(8765, '--port', '-p', help='Port to listen on.'),
+          directory_location: Optional[str] = typer.Option(None, '--directory', '-d', help='Directory to save sessions in, sessions are not saved by default.')) -> None:
+    '''Host game sessions, played over TCP (one JSON message per line).'''
+    import asyncio
+    from lincoln.model import system
+    from lincoln.controller.server import Server
+    data = config.load_configuration_data(Path(inputfile_location))
+    server = Server(system.factory(data), Path(inputfile_location), Path(directory_location) if directory_location else None, data.get('game'))
+    async def run():
+        listener = await server.start(host, port)
+        typer.echo(f'serving {Path(inputfile_location).name} on {host}:{port}')
+        async with listener:
+            await listener.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+@app.command('ensemble')
+@exception_handler(NotImplementedError, NOT_IMPLEMENTED_ERROR)
+def run_ensemble(inputfile_location: str = typer.Option(config.DEFAULT_SYSTEM_FILE, '--input', '-i', help='Game configuration file.'),
+                 runs: int = typer.Option(100, '--runs', '-n', help='Number of simulated runs.'),
+                 rounds: int = typer.Option(10, '--rounds', '-r', help='Number of rounds in each run.'),
+                 seed: int = typer.Option(0, '--seed', '-s', help='Seed for the inflow random streams.'),
+                 workers: Optional[int] = typer.Option(None, '--workers', '-w', help='Number of worker processes, one per cpu by default.'),
+                 release: Optional[float] = typer.Option(None, '--release', help='Fixed release for every storage node, replaces the node release policies.'),
+                 store_location: Optional[str] = typer.Option(None, '--store', help='Directory to write the traces to (as memory mapped .npy files).'),
+                 summary: bool = typer.Option(False, '--summary', help='Print streaming reliability, resilience, vulnerability and storage metrics, without keeping the traces.'),
+                 demands: List[str] = typer.Option([], '--demand', help='Delivery target of a node for the --summary metrics, as NODE=VALUE (repeatable).')) -> None:
+    '''Simulate an ensemble of headless runs.'''
+    from rich import print
+    from lincoln.model import ensemble
+    data = config.load_configuration_data(Path(inputfile_location))
+    if summary:
+        from lincoln.model import analytics
+        demand = _demands(demands)
+        metrics = analytics.summarize(data, ensemble.cycle_seasons(data, rounds), runs, seed, demand, workers, release)
+        print(_table(f'Summary of {runs} runs x {rounds} rounds', metrics.table()))
+        return
+    store = Path(store_location) if store_location else None
+    traces = ensemble.run_ensemble(data, ensemble.cycle_seasons(data, rounds), runs, seed, workers, release, store)
+    rows = [dict(node=name, **{k: v.mean() for k, v in traces.node(name).items()}) for name in traces.names]
+    print(_table(f'Mean of {runs} runs x {rounds} rounds', rows))
+
+@app.command()
+@exception_handler(NotImplementedError, NOT_IMPLEMENTED_ERROR)
+def sweep(values: List[str] = typer.Option(..., '--set', help='Parameter values to sweep, as NODE.PARAMETER=VALUES with comma separated (JSON) values, ex: --set lincoln_dam.capacity=10,15,20 (repeatable, every combination is simulated).'),
+          inputfile_location: str = typer.Option(config.DEFAULT_SYSTEM_FILE, '--input', '-i', help='Game configuration file.'),
+          runs: int = typer.Option(100, '--runs', '-n', help='Number of simulated runs of each variant.'),
+          rounds: int = typer.Option(10, '--rounds', '-r', help='Number of rounds in each run.'),
+          seed: int = typer.Option(0, '--seed', '-s', help='Seed for the inflow random streams, the same for every variant.'),
+          workers: Optional[int] = typer.Option(None, '--workers', '-w', help='Number of worker processes, one per cpu by default.'),
+          release: Optional[float] = typer.Option(None, '--release', help='Fixed release for every storage node, replaces the node release policies.'),
+          demands: List[str] = typer.Option([], '--demand', help='Delivery target of a node, as NODE=VALUE (repeatable).'),
+          cache_location: Optional[str] = typer.Option(None, '--cache', help='Directory to cache results in, variants simulated by earlier sweeps are not simulated again.')) -> None:
+    '''Simulate every combination of parameter values, with the system built once for all the variants.'''
+    import json
+    from rich import print
+    from lincoln.model import ensemble
+    from lincoln.model.sweep import Sweep, grid
+    try:
+        swept = {k: json.loads(f'[{v}]') for k, v in (s.split('=', 1) for s in values)}
+    except ValueError:
+        typer.echo('Sweep values must be given as NODE.PARAMETER=VALUES, ex: --set lincoln_dam.capacity=10,15,20.', err=True)
+        raise typer.Exit(code=1)
+    demand = _demands(demands)
+    data = config.load_configuration_data(Path(inputfile_location))
+    sweeper = Sweep.compile(data, ensemble.cycle_seasons(data, rounds), runs, seed, demand, release, Path(cache_location) if cache_location else None)
+    variants = grid(swept)
+    summaries = sweeper.run(variants, workers)
+    # the rows of the nodes with a demand (or the storage nodes), for each variant.
+    reported = list(demand) if demand else [name for name, tag in zip(sweeper.batch.names, sweeper.batch.tags) if tag == 'storage']
+    rows = [{**{k: json.dumps(v) for k, v in variant.items()}, **row} for variant, summary in zip(variants, summaries) for row in summary.table() if row['node'] in reported]
+    print(_table(f'Sweep of {len(variants)} variants ({sweeper.simulated} simulated), {runs} runs x {rounds} rounds', rows))
+
+@app.command()
+@exception_handler(NotImplementedError, NOT_IMPLEMENTED_ERROR)
+def coordinate(inputfile_location: str = typer.Option(config.DEFAULT_SYSTEM_FILE, '--input', '-i', help='Game configuration file.'),
+               runs: int = typer.Option(100, '--runs', '-n', help='Number of simulated runs.'),
+               rounds: int = typer.Option(10, '--rounds', '-r', help='Number of rounds in each run.'),
+               seed: int = typer.Option(0, '--seed', '-s', help='Seed for the inflow random streams.'),
+               size: int = typer.Option(1000, '--shard-size', help='Number of runs in each shard.'),
+               release: Optional[float] = typer.Option(None, '--release', help='Fixed release for every storage node, replaces the node release policies.'),
+               demands: List[str] = typer.Option([], '--demand', help='Delivery target of a node, as NODE=VALUE (repeatable).'),
+               host: str = typer.Option('127.0.0.1', '--host', help='Address to listen for workers on.'),
+               port: int = typer.Option(8766, '--port', '-p', help='Port to listen for workers on.'),
+               queue_location: Optional[str] = typer.Option(None, '--queue', '-q', help='Shared directory to queue the shards in, instead of listening for workers.'),
+               retries: int = typer.Option(2, '--retries', help='Failed attempts allowed for each shard.'),
+               timeout: float = typer.Option(600, '--timeout', help='Seconds before a shard claimed by a worker is presumed lost.')) -> None:
+    '''Split an ensemble into shards for workers (see: lincoln work), print the merged summary.'''
+    import asyncio
+    from rich import print
+    from lincoln.model import ensemble
+    from lincoln.controller import shard
+    demand = _demands(demands)
+    data = config.load_configuration_data(Path(inputfile_location))
+    coordinator = shard.Coordinator.split(shard.job(data, ensemble.cycle_seasons(data, rounds), seed, demand, release), runs, size, retries)
+    if queue_location:
+        shard.enqueue(coordinator, Path(queue_location))
+        typer.echo(f'{len(coordinator.shards)} shards queued in: {queue_location}, start workers with: lincoln work --queue {queue_location}')
+        summary = shard.collect(coordinator, Path(queue_location), timeout)
+    else:
+        listening = lambda address: typer.echo(f'{len(coordinator.shards)} shards, start workers with: lincoln work --host {address[0]} --port {address[1]}')
+        summary = asyncio.run(shard.coordinate(coordinator, host, port, listening, timeout))
+    print(_table(f'Summary of {runs} runs x {rounds} rounds ({len(coordinator.shards)} shards)', summary.table()))
+
+@app.command()
+def work(host: str = typer.Option('127.0.0.1', '--host', help='Address of the coordinator.'),
+         port: int = typer.Option(8766, '--port', '-p', help='Port of the coordinator.'),
+         queue_location: Optional[str] = typer.Option(None, '--queue', '-q', help='Shared directory to take shards from, instead of connecting to a coordinator.')) -> None:
+    '''Summarize ensemble shards for a coordinator (see: lincoln coordinate), until every shard is done.'''
+    from lincoln.controller import shard
+    count = shard.work_queue(Path(queue_location)) if queue_location else shard.work(host, port)
+    typer.echo(f'{count} shards summarized.')
+
+@app.command()
+def simulate(inputfile_location: str = typer.Option(config.DEFAULT_SYSTEM_FILE, '--input', '-i', help='Game configuration file.'),
+             rounds: int = typer.Option(10, '--rounds', '-r', help='Number of rounds.'),
+             seed: Optional[int] = typer.Option(None, '--seed', '-s', help='Seed for the inflow random streams.'),
+             release: Optional[float] = typer.Option(None, '--release', help='Fixed release for every storage node, replaces the node release policies.'),
+             profile: bool = typer.Option(False, '--profile', help='Print per node timing, call counts and flow totals.'),
+             dashboard: bool = typer.Option(False, '--dashboard', help='Show a live dashboard of the network, instead of a line per round.'),
+             fps: float = typer.Option(4, '--fps', help='Maximum dashboard refreshes per second.')) -> None:
+    '''Simulate a single game, round by round.'''
+    from rich import print
+    from lincoln.model import system, ensemble
+    from lincoln.model.node import Tag
+    from lincoln.model.policies import FixedRelease
+    data = config.load_configuration_data(Path(inputfile_location))
+    game = system.factory(data)
+    game.seed(seed)
+    if release is not None:
+        for v in game.nodes.values():
+            if v.tag == Tag.storage:
+                v.policy = FixedRelease(release)
+    game.profile(profile)
+    seasons = ensemble.cycle_seasons(data, rounds)
+    if dashboard:
+        from lincoln.view.dashboard import Dashboard
+        with Dashboard(game, fps) as view:
+            for season in seasons:
+                game.step(season)
+                view.update()
+    else:
+        for t, season in enumerate(seasons):
+            outflows = game.step(season)
+            storages = {k: v.storage for k, v in game.nodes.items() if v.tag == Tag.storage}
+            print(f'round {t} {season}'.strip() + f': storage {storages}, outflow {outflows}')
+    if profile:
+        print(_table(f'Profile of {rounds} rounds', game.profile_table()))
+
+@app.command()
+def solve(node_name: str = typer.Argument(..., help='Storage node to solve a release policy for.'),
+          inputfile_location: str = typer.Option(config.DEFAULT_SYSTEM_FILE, '--input', '-i', help='Game configuration file.'),
+          target: float = typer.Option(..., '--target', '-t', help='Target release each round, shortages are penalized by their square.'),
+          spill_penalty: float = typer.Option(0, '--spill-penalty', help='Penalty for each unit of spill.'),
+          discount: float = typer.Option(0.95, '--discount', help='Discount factor for future rounds, on the range (0, 1).')) -> None:
+    '''Solve for an optimal release policy (stochastic dynamic programming), printed as a node "policy" table.'''
+    import json
+    from rich import print
+    from lincoln.model import system, optimize
+    game = system.factory(config.load_configuration_data(Path(inputfile_location)))
+    if node_name not in game.nodes:
+        typer.echo(f'There is no {node_name} node in: {inputfile_location}.', err=True)
+        raise typer.Exit(code=1)
+    solution = optimize.solve(game.nodes[node_name], optimize.Objective({}, target, spill_penalty), discount)
+    rows = [dict(available=a * solution.policy.step, **{season or 'release': r[a] for season, r in solution.policy.releases.items()}) for a in range(0, len(next(iter(solution.policy.releases.values()))))]
+    print(_table(f'{node_name} releases', rows))
+    data = solution.policy.serialize()
+    typer.echo(f'policy = {{type = "table", step = {json.dumps(data["step"])}, releases = {{{", ".join(f"{json.dumps(k)} = {json.dumps(v)}" for k, v in data["releases"].items())}}}}}')
+
+def _table(title: str, rows: List[Dict[str, Any]]):
+    '''Rich table with a column for each key of the (dictionary) rows.'''
+    from rich.table import Table
+    table = Table(title=title)
+    for i, column in enumerate(rows[0].keys() if rows else []):
+        table.add_column(column, justify='left' if i == 0 else 'right')
+    for row in rows:
+        table.add_row(*[f'{v:.4g}' if isinstance(v, float) else str(v) for v in row.values()])
+    return table
+
+def _demands(demands: List[str]) -> Dict[str, float]:
+    '''Parses the --demand NODE=VALUE options, exits if one is not valid.'''
+    try:
+        return {k: float(v) for k, v in (d.split('=', 1) for d in demands)}
+    except ValueError:
+        typer.echo('Demands must be given as NODE=VALUE, ex: --demand lincoln_dam=5.', err=True)
+        raise typer.Exit(code=1)
 
 def _version_callback(value: bool) -> None:
     if value:
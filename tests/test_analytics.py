@@ -0,0 +1,30 @@
+'''
+Tests streaming ensemble metrics.
+'''
+
+import numpy as np
+from pathlib import Path
+
+from lincoln.controller import config
+from lincoln.model import analytics, ensemble, system
+
+def test_streaming_metrics_match_traces():
+    data = config.load_configuration_data(Path('lincoln/examples/lincoln.toml'))
+    data['node']['lincoln_dam']['policy'] = {'type': 'fixed', 'release': 6}
+    seasons = ensemble.cycle_seasons(data, 20)
+    demand = {'lincoln_dam': 6}
+    summary = analytics.summarize(data, seasons, 300, 7, demand, workers=1, block=64)
+    assert summary.table() == analytics.summarize(data, seasons, 300, 7, demand, workers=2, block=64).table()
+    merged = analytics.summarize(data, seasons, 300, 7, demand, workers=1, block=300).table()
+    assert all(np.isclose(a[k], b[k]) for a, b in zip(summary.table(), merged) for k in a if a[k] is not None and k != 'node')
+
+    traces = ensemble.simulate(system.factory(data), seasons, 300, 7)
+    dam, row = traces.node('lincoln_dam'), summary.table()[1]
+    failed = dam['release'] < 6
+    assert row['reliability'] == 1 - failed.mean()
+    assert row['resilience'] == (failed[:, :-1] & ~failed[:, 1:]).sum() / failed.sum()
+    assert np.isclose(row['vulnerability'], (6 - dam['release'])[failed].mean())
+    assert row['spill_frequency'] == (dam['spill'] > 0).mean()
+    assert np.isclose(row['storage_mean'], dam['storage'].mean()) and np.isclose(row['storage_std'], dam['storage'].std())
+    for q in [0.05, 0.5, 0.95]:
+        assert np.isclose(row[f'storage_p{round(100 * q)}'], np.quantile(dam['storage'], q, method='lower'), rtol=0.01)
@@ -0,0 +1,13 @@
+'''
+Smoke tests the benchmark suite.
+'''
+
+from benchmarks import bench
+
+def test_benchmarks_report_and_compare():
+    results = bench.run(sizes=[3], runs=[4], workers=[1])
+    assert [r['benchmark'] for r in results['results']] == ['build', 'step', 'ensemble']
+    assert all(r['seconds'] > 0 for r in results['results'])
+    slower = {'results': [dict(r, seconds=r['seconds'] * 2) for r in results['results']]}
+    assert len(bench.compare(slower, results, tolerance=0.1)) == 3
+    assert bench.compare(results, slower, tolerance=0.1) == []
@@ -0,0 +1,49 @@
+'''
+Tests the compiled system cache.
+'''
+
+import shutil
+import pytest
+from pathlib import Path
+
+from lincoln.controller import cache, config
+from lincoln.utilities import atomic_write
+
+def test_cache_is_invalidated_by_config_changes(tmp_path):
+    config_file = tmp_path.joinpath('lincoln.toml')
+    shutil.copy(Path('lincoln/examples/lincoln.toml'), config_file)
+    built = cache.load_system(tmp_path, config_file)
+    assert cache.read_cache(tmp_path, cache.content_hash(config_file)) is not None
+    cached = cache.load_system(tmp_path, config_file)
+    assert cached.plan == built.plan
+    assert cached.nodes['lincoln_dam'].serialize() == built.nodes['lincoln_dam'].serialize()
+
+    # a corrupt (here truncated) cache is rebuilt.
+    data = tmp_path.joinpath(cache.CACHE_FILE).read_bytes()
+    tmp_path.joinpath(cache.CACHE_FILE).write_bytes(data[:len(data) // 2])
+    assert cache.read_cache(tmp_path, cache.content_hash(config_file)) is None
+    assert cache.load_system(tmp_path, config_file).plan == built.plan
+    config_file.write_text(config_file.read_text().replace('capacity = 15', 'capacity = 20'))
+    assert cache.read_cache(tmp_path, cache.content_hash(config_file)) is None
+    assert cache.load_system(tmp_path, config_file).nodes['lincoln_dam'].capacity == 20
+
+def test_game_data_is_cached_with_the_system(tmp_path, monkeypatch):
+    config_file = tmp_path.joinpath('lincoln.toml')
+    config_file.write_text(Path('lincoln/examples/lincoln.toml').read_text() + '\n[game]\nrounds = 4\n')
+    built, game = cache.load_game(tmp_path, config_file)
+    assert game == {'rounds': 4}
+    # a cache hit does not read the configuration file.
+    monkeypatch.setattr(config, 'load_configuration_data', lambda _: pytest.fail('the configuration file was read'))
+    cached, game = cache.load_game(tmp_path, config_file)
+    assert game == {'rounds': 4} and cached.plan == built.plan
+
+def test_atomic_write_replaces_the_file(tmp_path):
+    path = tmp_path.joinpath('state')
+    atomic_write(path, b'old')
+    atomic_write(path, b'new')
+    assert path.read_bytes() == b'new'
+    tmp_path.joinpath('folder').mkdir()
+    with pytest.raises(IsADirectoryError):
+        atomic_write(tmp_path.joinpath('folder'), b'')
+    # the temporary files are gone, after a success or a failure.
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['folder', 'state']
@@ -0,0 +1,49 @@
+'''
+Tests the live dashboard view.
+'''
+
+import io
+import tomli
+from rich.console import Console
+
+from lincoln.model import system
+from lincoln.model.policies import FixedRelease
+from lincoln.view.dashboard import Dashboard
+
+def test_dashboard_redraws_only_changed_nodes():
+    with open('lincoln/examples/tuolumne.toml', 'rb') as f:
+        game = system.factory(tomli.load(f))
+    assert game.diagram() == [['hetch_hetchy_inflow', 'don_pedro_inflow'], ['hetch_hetchy'], ['san_joaquin_pipeline'], ['don_pedro_rescaler'], ['don_pedro'], ['outlet']]
+    for name in ['hetch_hetchy', 'don_pedro']:
+        game.nodes[name].policy = FixedRelease(0)
+    game.seed(3)
+    console = Console(file=io.StringIO(), width=150)
+    with Dashboard(game, fps=1e-6, console=console) as view:
+        assert view.redrawn == 7
+        for _ in range(0, 50):
+            game.step('winter')
+            # throttled, nothing is drawn between refreshes.
+            assert not view.update()
+        view.update(force=True)
+        drawn = view.redrawn
+        # nothing changed, then only one node changed.
+        view.update(force=True)
+        assert view.redrawn == drawn
+        game.nodes['don_pedro'].storage = 0
+        view.update(force=True)
+        assert view.redrawn == drawn + 1
+    row = view.rows[view.order.index(game.plan.ids['don_pedro'])]
+    assert row[1] == 'don_pedro' and row[3] == '0'
+    assert 'round 50' in console.file.getvalue()
+
+def test_dashboard_follows_network_edits():
+    with open('lincoln/examples/tuolumne.toml', 'rb') as f:
+        game = system.factory(tomli.load(f))
+    with Dashboard(game, fps=1e-6, console=Console(file=io.StringIO(), width=150)) as view:
+        assert view.layers[view.order.index(game.plan.ids['outlet'])] == 5
+        # the same nodes, a different network.
+        game.remove_edge('don_pedro', 'outlet')
+        game.add_edge('hetch_hetchy', 'outlet')
+        view.update(force=True)
+        assert view.layers[view.order.index(game.plan.ids['outlet'])] == 2
+        assert 'hetch_hetchy (storage)\n   ↓\nsan_joaquin_pipeline (outflow)  outlet (outlet)' in view.diagram.renderable
@@ -0,0 +1,29 @@
+'''
+Tests game results storage.
+'''
+
+import numpy as np
+
+from lincoln import SUCCESS
+from lincoln.data import database
+
+def test_log_resumes_after_partial_record(tmp_path):
+    path = tmp_path.joinpath('game.jsonl')
+    with database.LogWriter(path, flush_every=2) as log:
+        for i in range(0, 5):
+            assert log.write({'round': i, 'storage': np.int64(i)}) == SUCCESS
+    with path.open('a') as f:
+        f.write('{"round": 5, "sto') # crash mid write.
+    assert [r['round'] for r in database.read_log(path)] == [0, 1, 2, 3, 4]
+    assert database.last_record(path) == {'round': 4, 'storage': 4}
+    with database.LogWriter(path) as log:
+        log.write({'round': 5, 'storage': 5})
+    assert [r['round'] for r in database.read_log(path, start=3)] == [3, 4, 5]
+    assert database.last_record(path)['round'] == 5
+
+def test_write_db_reports_success(tmp_path):
+    path = tmp_path.joinpath('db.json')
+    assert database.init_database(path) == SUCCESS
+    handler = database.DBHandler(path)
+    assert handler.write_db([{'round': 0}]).error == SUCCESS
+    assert handler.read_db() == database.DB([{'round': 0}], SUCCESS)
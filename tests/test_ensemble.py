@@ -0,0 +1,74 @@
+'''
+Tests batch (ensemble) simulation against the scalar node send() chain.
+'''
+
+import tomli
+import numpy as np
+
+from lincoln.model import system, ensemble
+from lincoln.model.policies import FixedRelease, ZoneTable
+
+with open('lincoln/examples/lincoln.toml', 'rb') as f:
+    DATA = tomli.load(f)
+
+def test_batch_matches_scalar():
+    seasons, runs, seed = [''] * 10, 5, 42
+    policy = ZoneTable([0, 5, 10], [0, 4, 8])
+    batch = system.factory(DATA)
+    batch.nodes['lincoln_dam'].policy = policy
+    traces = ensemble.simulate(batch, seasons, runs, seed)
+    for r in range(0, runs):
+        scalar = system.factory(DATA)
+        scalar.nodes['lincoln_dam'].policy = policy
+        scalar.seed(seed, run=r)
+        for t, season in enumerate(seasons):
+            outflows = scalar.step(season)
+            assert outflows['outlet'] == traces.node('outlet')['outflow'][r, t]
+            assert scalar.nodes['lincoln_dam'].storage == traces.node('lincoln_dam')['storage'][r, t]
+
+def test_transfer_and_outflow_batch_matches_scalar():
+    with open('lincoln/examples/tuolumne.toml', 'rb') as f:
+        data = tomli.load(f)
+    seasons, runs, seed = ['winter', 'summer'] * 5, 4, 7
+    traces = ensemble.simulate(system.factory(data), seasons, runs, seed, release=1)
+    for r in range(0, runs):
+        scalar = system.factory(data)
+        for name in ['hetch_hetchy', 'don_pedro']:
+            scalar.nodes[name].policy = FixedRelease(1)
+        scalar.seed(seed, run=r)
+        for t, season in enumerate(seasons):
+            assert scalar.step(season)['outlet'] == traces.node('outlet')['outflow'][r, t]
+            assert scalar.nodes['san_joaquin_pipeline'].release == traces.node('san_joaquin_pipeline')['release'][r, t] <= 2
+            assert scalar.nodes['don_pedro'].storage == traces.node('don_pedro')['storage'][r, t]
+    rescaler = traces.node('don_pedro_rescaler')
+    assert (rescaler['outflow'] == 0.5 * rescaler['inflow']).all()
+
+def test_batch_is_reproducible():
+    seasons = [''] * 4
+    a = ensemble.simulate(system.factory(DATA), seasons, 3, 7, release=2)
+    b = ensemble.simulate(system.factory(DATA), seasons, 3, 7, release=2)
+    assert np.array_equal(a.storage, b.storage)
+    # water balance: inflow = storage change + outflow.
+    dam = a.node('lincoln_dam')
+    previous = np.concatenate([np.full((3, 1), 3.0), dam['storage'][:, :-1]], axis=1)
+    assert np.allclose(dam['inflow'], dam['storage'] - previous + dam['outflow'])
+
+def test_ensemble_is_independent_of_workers():
+    seasons = ensemble.cycle_seasons(DATA, 6)
+    serial = ensemble.run_ensemble(DATA, seasons, 25, 3, workers=1, release=2)
+    pooled = ensemble.run_ensemble(DATA, seasons, 25, 3, workers=3, release=2)
+    single = ensemble.simulate(system.factory(DATA), seasons, 25, 3, release=2)
+    for variable in ensemble.VARIABLES:
+        assert np.array_equal(getattr(serial, variable), getattr(pooled, variable))
+        assert np.array_equal(getattr(serial, variable), getattr(single, variable))
+
+def test_ensemble_writes_into_trace_store(tmp_path):
+    seasons = ensemble.cycle_seasons(DATA, 5)
+    traces = ensemble.run_ensemble(DATA, seasons, 12, 3, workers=1, release=2)
+    store = ensemble.run_ensemble(DATA, seasons, 12, 3, workers=2, release=2, store=tmp_path.joinpath('traces'), block=5)
+    assert np.array_equal(store.read('storage'), traces.storage)
+    assert np.array_equal(store.read('outflow', runs=slice(4, 9), rounds=[1, 3], nodes=['outlet']), traces.outflow[4:9, [1, 3]][..., [2]])
+    assert np.array_equal(store.read('storage', runs=[0, 2, 5], rounds=[1, 3]), traces.storage[np.ix_([0, 2, 5], [1, 3])])
+    assert store.read('storage', runs=[0, 2], rounds=[1, 3], nodes=['lincoln_dam']).shape == (2, 2, 1)
+    assert np.array_equal(store.node('lincoln_dam')['spill'], traces.node('lincoln_dam')['spill'])
+    assert sum(b.shape[0] for _, b in store.blocks('release', size=5)) == 12
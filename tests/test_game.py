@@ -0,0 +1,82 @@
+'''
+Tests incremental game scoring.
+'''
+
+import json
+import tomli
+
+from lincoln import SUCCESS, DB_WRITE_ERROR
+from lincoln.model import system
+from lincoln.model.policies import FixedRelease
+from lincoln.controller.game import Scoreboard
+from lincoln.data import database
+from lincoln.controller.model_control import Game, SCORE_FILE, LOG_FILE
+from tests.test_system import chain
+
+def test_running_aggregates_match_history():
+    river = system.factory(chain(2))
+    river.seed(0)
+    board = Scoreboard.deserialize({
+        'mode': 'rounds', 'rounds': 30,
+        'rules': [{'node': 'dam_1', 'variable': 'storage', 'comparison': '>=', 'value': 5, 'points': 2}],
+        'objectives': [{'node': 'outlet', 'variable': 'outflow', 'aggregate': 'total', 'comparison': '>=', 'value': 25}]})
+    storages, outflows = [], []
+    for _ in range(0, 30):
+        assert board.status == 'playing'
+        outflow = river.step()
+        board.update(river, outflow)
+        storages.append(river.nodes['dam_1'].storage)
+        outflows.append(outflow['outlet'])
+    i = river.plan.ids['dam_1']
+    assert board.aggregates.get('min', 'storage', i) == min(storages)
+    assert board.aggregates.get('mean', 'storage', i) == sum(storages) / 30
+    assert board.score == 2 * sum(s >= 5 for s in storages)
+    assert board.status == ('won' if sum(outflows) >= 25 else 'lost')
+
+def test_anti_objective_ends_survival_game():
+    river = system.factory(chain(1))
+    river.seed(0)
+    board = Scoreboard.deserialize({'mode': 'survival', 'anti_objectives': [{'node': 'dam_0', 'variable': 'spill', 'aggregate': 'count', 'comparison': '>=', 'value': 2}]})
+    spills = 0
+    while board.update(river, river.step()) == 'playing':
+        spills += river.nodes['dam_0'].spill > 0
+    assert spills == 1 and board.status == 'lost'
+
+def test_every_node_type_scores_its_outflow():
+    with open('lincoln/examples/tuolumne.toml', 'rb') as f:
+        river = system.factory(tomli.load(f))
+    for name in ['hetch_hetchy', 'don_pedro']:
+        river.nodes[name].policy = FixedRelease(1)
+    river.seed(0)
+    board = Scoreboard.deserialize({'rules': [{'node': 'don_pedro_inflow', 'variable': 'outflow', 'comparison': '>', 'value': 0}]})
+    sent = {name: 0.0 for name in ['don_pedro_inflow', 'don_pedro_rescaler', 'san_joaquin_pipeline']}
+    for season in ['winter', 'summer'] * 3:
+        board.update(river, river.step(season))
+        for name in sent:
+            sent[name] += river.cache.last[name]
+    for name, total in sent.items():
+        assert board.aggregates.get('total', 'outflow', river.plan.ids[name]) == total
+    assert sent['don_pedro_inflow'] > 0 and board.score == board.rules[0].hits > 0
+
+def test_resumed_game_continues_the_score(tmp_path):
+    scoring = {'rules': [{'node': 'dam_0', 'variable': 'release', 'comparison': '>=', 'value': 1}],
+               'objectives': [{'node': 'outlet', 'variable': 'outflow', 'aggregate': 'total', 'comparison': '>=', 'value': 10}]}
+    played = Game(tmp_path, tmp_path, None, system.factory(chain(1)), Scoreboard.deserialize(scoring))
+    played.system.seed(2)
+    for _ in range(0, 3):
+        played.play_round()
+    resumed = Game(tmp_path, tmp_path, None, system.factory(chain(1)), Scoreboard.deserialize(scoring))
+    assert resumed.resume()
+    # the last round's flows and the scoreboard progress are restored, not pickled.
+    assert resumed.system.cache.last == played.system.cache.last != {}
+    assert json.loads(tmp_path.joinpath(SCORE_FILE).read_text()) == resumed.scoreboard.progress() == played.scoreboard.progress()
+    assert resumed.scoreboard.rules[0].hits == played.scoreboard.rules[0].hits
+
+def test_failed_round_log_writes_are_reported(tmp_path):
+    game = Game(None, tmp_path, tmp_path, system.factory(chain(1))) # the log path is a directory.
+    game.play_round()
+    assert game.logged == DB_WRITE_ERROR and game.system.round == 1
+    game.dbfile = tmp_path.joinpath(LOG_FILE)
+    game.play_round()
+    game.close()
+    assert game.logged == SUCCESS and [r['round'] for r in database.read_log(game.dbfile)] == [1]
@@ -0,0 +1,35 @@
+'''
+Tests the inflow generator registry.
+'''
+
+import pytest
+import numpy as np
+
+from lincoln.model import generators
+
+PARAMETERS = {'uniform': [2, 12], 'normal': [5, 2], 'lognormal': [1, 0.5], 'gamma': [2, 3], 'ar1': [5, 2, 0.6]}
+
+@pytest.mark.parametrize('name', PARAMETERS.keys())
+def test_array_draws_match_single_draws(name):
+    array = generators.build(name, PARAMETERS[name])(rng=generators.stream(1, 2, 3), size=20)
+    single = generators.build(name, PARAMETERS[name])
+    rng = generators.stream(1, 2, 3)
+    assert np.array_equal(array, [single(rng=rng) for _ in range(0, 20)])
+
+def test_draw_is_seeded_and_vectorized():
+    draws = generators.draw('gamma', [2, 3], size=10**6, seed=1)
+    assert draws.shape == (10**6,)
+    assert np.array_equal(draws, generators.draw('gamma', [2, 3], size=10**6, seed=1))
+
+def test_resample_and_register(tmp_path):
+    series = tmp_path.joinpath('series.csv')
+    series.write_text('1\n2\n3\n')
+    assert set(generators.draw('resample', [str(series)], size=100, seed=0)) == {1, 2, 3}
+
+    @generators.register('constant')
+    def constant_generator(value, rng=None, size=None):
+        return value if size is None else np.full(size, value)
+    assert generators.build('constant', [4])() == 4
+    with pytest.raises(KeyError):
+        generators.build('not_a_generator', [])
+    generators.REGISTRY.pop('constant')
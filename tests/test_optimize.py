@@ -0,0 +1,38 @@
+'''
+Tests the stochastic dynamic programming release policy solver.
+'''
+
+import time
+import numpy as np
+from pathlib import Path
+
+from lincoln.controller import config
+from lincoln.model import system, ensemble, optimize, policies
+
+def shortfall(game, policy, data):
+    game.nodes['lincoln_dam'].policy = policy
+    traces = ensemble.simulate(game, ensemble.cycle_seasons(data, 40), 1000, 0)
+    dam = traces.node('lincoln_dam')
+    return (np.maximum(0, 7 - dam['release']) ** 2 + dam['spill']).mean()
+
+def test_solved_policy_beats_fixed_release():
+    data = config.load_configuration_data(Path('lincoln/examples/lincoln.toml'))
+    game = system.factory(data)
+    start = time.perf_counter()
+    solution = optimize.solve(game.nodes['lincoln_dam'], optimize.Objective({}, 7, spill_penalty=1))
+    assert time.perf_counter() - start < 1
+    assert optimize.solve(game.nodes['lincoln_dam'], optimize.Objective({}, 7, spill_penalty=1)) is solution
+    assert len(solution.policy.releases['']) == 16
+    assert policies.factory(solution.policy.serialize()) == solution.policy
+    assert shortfall(game, solution.policy, data) < shortfall(game, policies.FixedRelease(7), data)
+
+def test_solution_cache_is_bounded(monkeypatch):
+    game = system.factory(config.load_configuration_data(Path('lincoln/examples/lincoln.toml')))
+    monkeypatch.setattr(optimize, 'CACHE_SIZE', 2)
+    monkeypatch.setattr(optimize, '_CACHE', optimize.OrderedDict())
+    first = optimize.solve(game.nodes['lincoln_dam'], optimize.Objective({}, 3))
+    for target in [4, 5, 3]:
+        optimize.solve(game.nodes['lincoln_dam'], optimize.Objective({}, target))
+    assert len(optimize._CACHE) == 2
+    # the least recently used solution was dropped, and solved again.
+    assert optimize.solve(game.nodes['lincoln_dam'], optimize.Objective({}, 3)) is not first
@@ -0,0 +1,27 @@
+'''
+Tests headless storage node release policies.
+'''
+
+import numpy as np
+
+from lincoln.model import node, policies
+
+def test_policies_from_node_data():
+    data = {'tag': 'storage', 'initial': 3, 'capacity': 15, 'policy': {'type': 'rule_curve', 'targets': {'winter': 5}, 'target': 10}}
+    dam = node.factory(**data)
+    assert isinstance(dam.policy, policies.RuleCurve)
+    assert dam.policy.release(12, 0, 'winter') == 7
+    assert dam.policy.release(12, 0, 'summer') == 2
+    assert policies.factory(dam.policy.serialize()) == dam.policy
+
+def test_zone_table_is_vectorized():
+    table = policies.factory({'type': 'zones', 'storages': [0, 5, 10], 'releases': [0, 1, 3]})
+    available = np.array([0, 4, 5, 9, 10, 15])
+    assert table.release(available, 0).tolist() == [0, 0, 1, 1, 3, 3]
+    assert [table.release(a, 0) for a in available] == [0, 0, 1, 1, 3, 3]
+
+def test_storage_node_send_without_prompt():
+    dam = node.StorageNode(storage=3, capacity=5, _initial=3, policy=policies.FixedRelease(10))
+    dam.add_sender({'inflow': node.OutletNode()})  # sends no flow
+    assert dam.send() == 3 # limited to the available storage
+    assert dam.storage == 0
@@ -0,0 +1,75 @@
+'''
+Tests the asyncio game server.
+'''
+
+import json
+import asyncio
+from pathlib import Path
+
+from lincoln.controller import config
+from lincoln.controller.server import Server
+from lincoln.model import system
+
+async def client(port: int, releases):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    async def ask(message):
+        writer.write(json.dumps(message).encode() + b'\n')
+        return json.loads(await reader.readline())
+    session = await ask({'op': 'new'})
+    rounds = []
+    reply = await ask({'op': 'play', 'rounds': len(releases)})
+    for amount in releases:
+        assert reply['decide'] == 'lincoln_dam' and reply['available'] >= 0
+        await asyncio.sleep(0.01) # a slow player does not hold up the other sessions.
+        reply = await ask({'op': 'release', 'amount': amount})
+        rounds.append(reply)
+        if len(rounds) < len(releases):
+            reply = json.loads(await reader.readline())
+    writer.write(b'{"op": "quit"}\n')
+    writer.close()
+    return session['session'], rounds
+
+def test_sessions_are_played_concurrently():
+    config_file = Path('lincoln/examples/lincoln.toml')
+    server = Server(system.factory(config.load_configuration_data(config_file)), config_file)
+    async def main():
+        listener = await server.start()
+        port = listener.sockets[0].getsockname()[1]
+        results = await asyncio.gather(*[client(port, [0, 1, 2]) for _ in range(0, 50)])
+        listener.close()
+        return results
+    results = asyncio.run(main())
+    assert len(set(session for session, _ in results)) == len(server.games) == 50
+    for _, rounds in results:
+        assert [r['round'] for r in rounds] == [0, 1, 2]
+    assert all(game.system.round == 3 for game in server.games.values())
+
+def test_invalid_decisions_and_game_errors_are_reported():
+    config_file = Path('lincoln/examples/lincoln.toml')
+    data = config.load_configuration_data(config_file)
+    async def main(server, amounts):
+        listener = await server.start()
+        reader, writer = await asyncio.open_connection('127.0.0.1', listener.sockets[0].getsockname()[1])
+        async def ask(message):
+            writer.write(json.dumps(message).encode() + b'\n')
+            return json.loads(await reader.readline())
+        await ask({'op': 'new'})
+        assert 'decide' in await ask({'op': 'play'})
+        replies = []
+        for k, amount in enumerate(amounts):
+            replies.append(await ask({'op': 'release', 'amount': amount}))
+            if 'error' in replies[-1] and k < len(amounts) - 1:
+                assert 'decide' in json.loads(await reader.readline()) # asked again.
+        closed = 'error' in replies[-1] and await reader.readline() == b''
+        writer.close()
+        listener.close()
+        return replies, closed
+    # NaN, Infinity and booleans are not release amounts.
+    server = Server(system.factory(data), config_file)
+    replies, _ = asyncio.run(main(server, [float('nan'), float('inf'), True, 1]))
+    assert all('error' in r for r in replies[:3]) and replies[-1]['round'] == 0
+    assert replies[-1]['storage']['lincoln_dam'] == server.games['1'].system.nodes['lincoln_dam'].storage >= 0
+    # a game that fails (scoring a node that is not in the system) replies with the error and closes the connection.
+    scoring = {'rules': [{'node': 'nope', 'variable': 'storage', 'comparison': '>', 'value': 0}]}
+    replies, closed = asyncio.run(main(Server(system.factory(data), config_file, scoring=scoring), [1]))
+    assert 'nope' in replies[-1]['error'] and closed
@@ -0,0 +1,87 @@
+'''
+Tests sharded ensembles, with worker processes standing in for machines.
+'''
+
+import os
+import json
+import time
+import socket
+import asyncio
+import multiprocessing
+
+import tomli
+
+from lincoln.model import analytics
+from lincoln.controller import shard
+
+with open('lincoln/examples/lincoln.toml', 'rb') as f:
+    DATA = tomli.load(f)
+SEASONS, DEMAND = [''] * 12, {'lincoln_dam': 6}
+
+def expected():
+    return analytics.summarize(DATA, SEASONS, 250, 5, DEMAND, workers=1, release=6, block=40).table()
+
+def test_tcp_shards_are_retried_and_merged():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    workers = [multiprocessing.Process(target=shard.work, args=('127.0.0.1', port)) for _ in range(0, 3)]
+    async def main():
+        coordinator = shard.Coordinator.split(shard.job(DATA, SEASONS, 5, DEMAND, 6), 250, 40)
+        task = asyncio.create_task(shard.coordinate(coordinator, '127.0.0.1', port))
+        await asyncio.sleep(0.2)
+        # a worker that takes a shard and disconnects.
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'{"op": "ready"}\n')
+        assert json.loads(await reader.readline())['shard'] == 0
+        writer.close()
+        # closed before forking the workers, which would otherwise hold the connection open.
+        await writer.wait_closed()
+        for worker in workers:
+            worker.start()
+        summary = await task
+        assert coordinator.shards[0].attempts == 1
+        return summary
+    assert asyncio.run(main()).table() == expected()
+    for worker in workers:
+        worker.join()
+
+def test_tcp_shards_of_stalled_workers_are_retried():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    workers = [multiprocessing.Process(target=shard.work, args=('127.0.0.1', port)) for _ in range(0, 2)]
+    async def main():
+        coordinator = shard.Coordinator.split(shard.job(DATA, SEASONS, 5, DEMAND, 6), 250, 40)
+        task = asyncio.create_task(shard.coordinate(coordinator, '127.0.0.1', port, timeout=0.5))
+        await asyncio.sleep(0.2)
+        # a worker that takes a shard and hangs, with its connection open.
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'{"op": "ready"}\n')
+        assert json.loads(await reader.readline())['shard'] == 0
+        for worker in workers:
+            worker.start()
+        summary = await task
+        assert coordinator.shards[0].attempts == 1
+        # the stalled worker was disconnected.
+        assert await reader.read() == b''
+        writer.close()
+        return summary
+    assert asyncio.run(main()).table() == expected()
+    for worker in workers:
+        worker.join()
+
+def test_queue_shards_are_retried_and_merged(tmp_path):
+    coordinator = shard.Coordinator.split(shard.job(DATA, SEASONS, 5, DEMAND, 6), 250, 40)
+    shard.enqueue(coordinator, tmp_path)
+    # a shard claimed by a worker that died.
+    claim = tmp_path.joinpath(shard.CLAIMED, '3.json')
+    os.rename(tmp_path.joinpath(shard.QUEUE, '3.json'), claim)
+    os.utime(claim, (time.time() - 60, time.time() - 60))
+    workers = [multiprocessing.Process(target=shard.work_queue, args=(tmp_path,)) for _ in range(0, 2)]
+    for worker in workers:
+        worker.start()
+    assert shard.collect(coordinator, tmp_path, timeout=30).table() == expected()
+    for worker in workers:
+        worker.join()
+    assert not any(tmp_path.joinpath(shard.QUEUE).iterdir()) and not any(tmp_path.joinpath(shard.FAILED).iterdir())
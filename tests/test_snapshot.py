@@ -0,0 +1,64 @@
+'''
+Tests system snapshots, restores and forks.
+'''
+
+import shutil
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+from lincoln.model import system
+from lincoln.model.snapshot import Snapshot
+from lincoln.view import setup
+from lincoln.data import database
+from lincoln.controller.model_control import LOG_FILE
+from tests.test_system import chain
+
+def river():
+    data = chain(2)
+    data['node']['inflow'].update({'seasons': ['wet', 'dry'], 'generators': ['ar1', 'uniform'], 'parameters': [[6, 2, 0.5], [0, 4]]})
+    return system.factory(data)
+
+def play(game, rounds):
+    return [game.step(['wet', 'dry'][game.round % 2]) for _ in range(0, rounds)]
+
+def test_restored_system_continues_identically():
+    game = river()
+    game.seed(5)
+    play(game, 3)
+    game.request('dam_0', 'dry') # part way through a round.
+    data = game.snapshot().to_bytes()
+    expected = play(game, 4)
+    restored = river()
+    restored.restore(Snapshot.from_bytes(data))
+    assert restored.round == 3
+    assert play(restored, 4) == expected
+
+def test_forks_are_independent():
+    game = river()
+    game.seed(1)
+    play(game, 2)
+    state = game.snapshot()
+    a, b = game.fork(state), game.fork(state)
+    assert play(a, 3) == play(b, 3) == play(game, 3)
+    assert a.nodes['dam_0']._store is not game.store and a.plan is game.plan
+    b.add_node('canal', {'tag': 'outlet'})
+    b.add_edge('dam_0', 'canal')
+    assert 'canal' not in game.plan.ids and 'canal' not in a.nodes
+    assert list(game.nodes['dam_0'].senders.keys()) == list(a.nodes['dam_0'].senders.keys()) == ['inflow']
+    assert ('dam_0', 'canal') in b.network.edges and ('dam_0', 'canal') not in game.network.edges
+
+def test_existing_game_resumes(tmp_path):
+    config_file = tmp_path.joinpath('lincoln.toml')
+    shutil.copy(Path('lincoln/examples/lincoln.toml'), config_file)
+    text = config_file.read_text().replace('capacity = 15', 'capacity = 15\n    policy = {type = "fixed", release = 2}')
+    config_file.write_text(text)
+    runner = CliRunner()
+    result = runner.invoke(setup.app, ['existing', str(tmp_path), '--rounds', '2'])
+    assert result.exit_code == 0 and 'round 1:' in result.stdout
+    result = runner.invoke(setup.app, ['existing', str(tmp_path), '--rounds', '1'])
+    assert result.exit_code == 0 and 'resuming at round 2' in result.stdout and 'round 2:' in result.stdout
+    # every round played is logged, across runs of the game.
+    rounds = list(database.read_log(tmp_path.joinpath(LOG_FILE)))
+    assert [r['round'] for r in rounds] == [0, 1, 2]
+    assert set(rounds[-1]['storage']) == {'lincoln_dam'} and 'outlet' in rounds[-1]['outflow']
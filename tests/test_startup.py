@@ -0,0 +1,29 @@
+'''
+Import-time regression checks (python -X importtime), CLI startup should only load what a command needs.
+'''
+
+import sys
+import subprocess
+
+def imported_modules(code: str) -> dict:
+    '''Runs code in a new interpreter, returns: {module: cumulative import time (us)}.'''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                modules[name.strip()] = int(cumulative)
+    return modules
+
+def test_cli_startup_does_not_import_the_model():
+    modules = imported_modules('from lincoln.view import setup')
+    # rich itself is not checked: typer (typer.core and typer.rich_utils) imports it at startup whenever it is
+    # installed, only the parts of it that lincoln alone uses (the live dashboard) can be kept out.
+    for module in ['numpy', 'tomli', 'lincoln.model.system', 'lincoln.model.ensemble', 'lincoln.controller.cache', 'lincoln.view.dashboard', 'rich.live']:
+        assert module not in modules, f'{module} is imported at cli startup.'
+
+def test_model_does_not_import_the_cli():
+    modules = imported_modules('from lincoln.model import system, ensemble')
+    for module in ['typer', 'rich', 'click']:
+        assert module not in modules, f'{module} is imported by the model.'
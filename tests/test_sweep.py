@@ -0,0 +1,37 @@
+'''
+Tests parameter sweeps against systems built from modified configuration data.
+'''
+
+import copy
+import tomli
+
+from dataclasses import replace
+
+from lincoln.model import analytics, ensemble, sweep
+from lincoln.model.policies import CallablePolicy
+
+with open('lincoln/examples/lincoln.toml', 'rb') as f:
+    DATA = tomli.load(f)
+
+def test_variants_match_rebuilt_systems(tmp_path):
+    seasons, demand = [''] * 12, {'lincoln_dam': 6}
+    sweeper = sweep.Sweep.compile(DATA, seasons, 50, 3, demand, 6, tmp_path)
+    variants = sweep.grid({'lincoln_dam.capacity': [10, 20], 'inflow.parameters': [[[2, 12]], [[0, 16]]]})
+    summaries = sweeper.run(variants)
+    assert sweeper.simulated == 4
+    for variant, summary in zip(variants, summaries):
+        data = copy.deepcopy(DATA)
+        data['node']['lincoln_dam']['capacity'] = variant['lincoln_dam.capacity']
+        data['node']['inflow']['parameters'] = variant['inflow.parameters']
+        assert summary.table() == analytics.summarize(data, seasons, 50, 3, demand, workers=1, release=6).table()
+    # capacity 20 with the base inflows is cached on disk, the base system ({} or capacity 15) is simulated once.
+    again = sweep.Sweep.compile(DATA, seasons, 50, 3, demand, 6, tmp_path)
+    assert again.run([{'lincoln_dam.capacity': 20}, {}, {'lincoln_dam.capacity': 15}])[0].table() == summaries[2].table()
+    assert again.simulated == 1
+
+def test_callable_policy_keys_do_not_depend_on_the_process():
+    sweeper = sweep.Sweep.compile(DATA, [''] * 4, 5, 3, release=6)
+    i = sweeper.batch.names.index('lincoln_dam')
+    # the same imported function, as loaded by two processes (different function objects).
+    a, b = [replace(sweeper.batch, policies={**sweeper.batch.policies, i: CallablePolicy(lambda *_: 1, 'policies:half')}) for _ in range(0, 2)]
+    assert sweeper.key(a) == sweeper.key(b)
@@ -0,0 +1,154 @@
+'''
+Tests system construction and evaluation.
+'''
+
+import sys
+import pytest
+import typer
+
+from lincoln.model import system, node, validator
+
+def chain(n: int):
+    '''Configuration data for: inflow -> n storage nodes -> outlet.'''
+    names = ['inflow'] + [f'dam_{i}' for i in range(0, n)] + ['outlet']
+    nodes = {'inflow': {'tag': 'inflow', 'seasons': [''], 'generators': ['uniform'], 'parameters': [[2, 12]]}}
+    nodes.update({name: {'tag': 'storage', 'initial': 0, 'capacity': 10, 'policy': {'type': 'fixed', 'release': 1}} for name in names[1:-1]})
+    nodes['outlet'] = {'tag': 'outlet'}
+    matrix = [[1 if col == row + 1 else 0 for col in range(0, len(names))] for row in range(0, len(names))]
+    return {'node': nodes, 'system': {'node_order': names, 'matrix': matrix}}
+
+def test_long_chain_has_no_recursion_limit():
+    n = sys.getrecursionlimit() + 100
+    river = system.factory(chain(n))
+    river.seed(1)
+    assert list(river.nodes.keys())[0] == 'inflow'
+    assert river.step() == {'outlet': 1}
+    assert river.step() == {'outlet': 1}
+
+def test_cycle_is_rejected():
+    data = chain(2)
+    data['system']['matrix'][2][1] = 1 # dam_1 -> dam_0
+    with pytest.raises(typer.Exit):
+        system.factory(data)
+
+def test_validator_reports_every_problem():
+    data = chain(2)
+    data['system']['matrix'][2][1] = 1 # dam_1 -> dam_0
+    data['system']['matrix'][2][3] = 0 # dam_1 -/> outlet
+    data['node']['extra'] = {'tag': 'outlet'}
+    problems = validator.check(data)
+    assert len(problems) == 1 and 'extra' in problems[0]
+    del data['node']['extra']
+    problems = validator.check(data)
+    assert any('cycle' in p and 'dam_0' in p for p in problems)
+    assert any('outlet' in p and 'dam_1' in p for p in problems)
+
+def test_validator_checks_node_tags():
+    data = chain(1)
+    data['node']['dam_0']['tag'] = 'reservoir'
+    data['system']['matrix'][2][0] = 1 # outlet -> inflow
+    problems = validator.check(data)
+    assert any('reservoir' in p for p in problems)
+    assert any('inflow node receives flow from the outlet' in p for p in problems)
+    assert any('outlet outlet node sends flow' in p for p in problems)
+    with pytest.raises(typer.Exit):
+        system.factory(data)
+
+def test_validator_finds_cycle_in_large_network():
+    data = chain(2000)
+    data['system'] = {'node_order': data['system']['node_order'], 'edges': [list(edge) for edge in system.Network.load(data['system']).edges]}
+    data['system']['edges'].append(['dam_1999', 'dam_0'])
+    problems = validator.check(data)
+    assert len(problems) == 1 and 'cycle' in problems[0]
+
+def test_shared_upstream_node_is_evaluated_once_per_round():
+    names = ['inflow', 'dam_a', 'dam_b', 'outlet']
+    data = chain(2)
+    data['node'] = {'inflow': data['node']['inflow'], 'dam_a': data['node']['dam_0'], 'dam_b': data['node']['dam_1'], 'outlet': data['node']['outlet']}
+    data['system'] = {'node_order': names, 'matrix': [[0, 1, 1, 0], [0, 0, 0, 1], [0, 0, 0, 1], [0, 0, 0, 0]]}
+    diamond = system.factory(data)
+    diamond.profile()
+    diamond.request('dam_a')
+    diamond.request('dam_b')
+    assert diamond.profile_table()[0]['calls'] == 1
+    diamond.step()
+    diamond.step()
+    assert {row['node']: row['calls'] for row in diamond.profile_table()} == {'inflow': 2, 'dam_a': 2, 'dam_b': 2, 'outlet': 2}
+    assert diamond.round == 2
+
+def test_edge_list_matches_matrix():
+    data = chain(3)
+    matrix = system.Network.load(data['system'])
+    data['system'] = {'node_order': data['system']['node_order'], 'edges': [list(edge) for edge in matrix.edges]}
+    edges = system.Network.load(data['system'])
+    assert edges.edges == matrix.edges == [('inflow', 'dam_0'), ('dam_0', 'dam_1'), ('dam_1', 'dam_2'), ('dam_2', 'outlet')]
+    assert edges.matrix == chain(3)['system']['matrix']
+    assert list(system.factory(data).nodes.keys()) == data['system']['node_order']
+
+def test_profile_counts_each_node():
+    river = system.factory(chain(3))
+    river.seed(0)
+    river.step()
+    assert river.profile_table() == []
+    river.profile()
+    for _ in range(0, 4):
+        river.step()
+    table = {row['node']: row for row in river.profile_table()}
+    assert all(row['calls'] == 4 for row in table.values())
+    assert table['inflow']['outflow'] == table['dam_0']['inflow']
+    assert table['dam_2']['release'] + table['dam_2']['spill'] == table['outlet']['inflow']
+    river.profile(False)
+    assert type(river.nodes['inflow']) is node.InflowNode
+
+def test_nodes_are_views_of_one_store():
+    river = system.factory(chain(3))
+    assert all(v._store is river.store for v in river.nodes.values())
+    assert river.store.names == river.plan.names
+    river.nodes['dam_1'].storage = 4
+    assert river.store.storage[river.plan.ids['dam_1']] == 4
+    assert list(river.nodes['outlet'].senders.keys()) == ['dam_2']
+    river.nodes['outlet'].remove_sender('dam_2')
+    assert river.nodes['outlet'].senders == {}
+
+def test_node_connections_edit_the_system():
+    river = system.factory(chain(3))
+    outlet = river.nodes['outlet']
+    outlet.remove_sender('dam_2')
+    assert river.plan.senders[river.plan.ids['outlet']] == []
+    assert river.step() == {'outlet': 0}
+    outlet.add_sender({'dam_1': river.nodes['dam_1']})
+    assert [river.plan.names[j] for j in river.plan.senders[river.plan.ids['outlet']]] == ['dam_1']
+    assert river.store.names == river.plan.names
+    with pytest.raises(typer.Exit):
+        outlet.add_sender({'canal': node.OutletNode()})
+
+def test_edits_of_unknown_nodes_and_tags_are_rejected():
+    river = system.factory(chain(1))
+    for edit in [lambda: river.update_node('nope', capacity=3), lambda: river.add_node('canal', {'tag': 'reservoir'})]:
+        with pytest.raises(typer.Exit) as e:
+            edit()
+        assert e.value.exit_code == 4
+    assert 'canal' not in river.plan.ids
+
+def test_edited_system_matches_rebuilt_system():
+    canal = {'tag': 'storage', 'initial': 2, 'capacity': 5, 'policy': {'type': 'fixed', 'release': 3}}
+    edited = system.factory(chain(2))
+    edited.add_node('canal', canal)
+    edited.add_edge('inflow', 'canal')
+    edited.add_edge('canal', 'dam_1')
+    edited.update_node('dam_0', capacity=4)
+    assert edited.plan.positions[edited.plan.ids['canal']] < edited.plan.positions[edited.plan.ids['dam_1']]
+    data = chain(2)
+    data['node']['canal'], data['node']['dam_0']['capacity'] = canal, 4
+    data['system'] = {'node_order': data['system']['node_order'] + ['canal'], 'edges': [list(edge) for edge in edited.network.edges]}
+    rebuilt = system.factory(data)
+    edited.seed(3)
+    rebuilt.seed(3)
+    assert [edited.step() for _ in range(0, 5)] == [rebuilt.step() for _ in range(0, 5)]
+    with pytest.raises(typer.Exit):
+        edited.add_edge('dam_1', 'canal')
+    removed = edited.remove_node('canal')
+    assert removed.storage == rebuilt.nodes['canal'].storage and removed.senders == {}
+    assert edited.network.edges == [('inflow', 'dam_0'), ('dam_0', 'dam_1'), ('dam_1', 'outlet')]
+    assert list(edited.nodes['dam_1'].senders.keys()) == ['dam_0']
+    assert edited.round == 5 and list(edited.step().keys()) == ['outlet']